@@ -0,0 +1,82 @@
+"""
+Benchmark: end-to-end latency of /api/prompts/chat, sequential vs pipelined.
+
+LLM calls are replaced by a fake that sleeps for a fixed latency, so the
+numbers reflect how many round trips sit on the critical path rather than
+network conditions.
+
+Usage (from backend/):
+    python benchmarks/bench_chat_pipeline.py [--latency 0.4] [--requests 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/bench.db")
+# Measure the pipeline itself: every request must reach the (fake) LLM
+os.environ["RESPONSE_CACHE_BACKEND"] = "none"
+os.environ["SEMANTIC_CACHE_ENABLED"] = "false"
+
+import asyncio
+from fastapi.testclient import TestClient
+
+import main
+from services import prompt_agent
+
+
+def make_fake_create_message(latency: float):
+    async def fake_create_message(**kwargs):
+        await asyncio.sleep(latency)
+        system = kwargs.get("system", "")
+        if "reasoning engine" in system:
+            text = '[{"step": "Understanding", "thought": "Benchmark", "icon": "🧠"}]'
+        elif "Generate 3 brief" in system:
+            text = "Add examples\nSpecify output format\nMention constraints"
+        else:
+            text = "**Task:** Benchmark prompt\n**Output Format:** text"
+        return SimpleNamespace(content=[SimpleNamespace(text=text)])
+    return fake_create_message
+
+
+def run(client: TestClient, mode: str, requests: int) -> list:
+    timings = []
+    for i in range(requests):
+        payload = {
+            "user_input": f"write a REST API in python for a todo app #{i}",
+            "settings": {"mode": "direct", "execution_mode": mode},
+        }
+        start = time.perf_counter()
+        response = client.post("/api/prompts/chat", json=payload)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.text
+    return timings
+
+
+def main_bench():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.4, help="simulated seconds per LLM call")
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args()
+
+    prompt_agent.create_message = make_fake_create_message(args.latency)
+
+    with TestClient(main.app) as client:
+        results = {mode: run(client, mode, args.requests) for mode in ("sequential", "pipelined")}
+
+    print(f"Simulated LLM latency: {args.latency:.2f}s, {args.requests} requests per mode")
+    for mode, timings in results.items():
+        timings.sort()
+        mean = sum(timings) / len(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        print(f"  {mode:<10} mean={mean * 1000:7.1f} ms  p95={p95 * 1000:7.1f} ms")
+
+    speedup = sum(results["sequential"]) / sum(results["pipelined"])
+    print(f"  speedup: {speedup:.2f}x")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,225 @@
+"""
+Micro-benchmark: _generate_prompt throughput, legacy vs precompiled formatters.
+
+The legacy path re-parses the template with str.format and rebuilds the
+target-AI and expertise tables (nine lambdas, four config dicts) on every
+call; the current path renders a precompiled template and applies formatter
+objects built once at import. Outputs are checked for equality over every
+task type / target AI / expertise combination before timing.
+
+Usage (from backend/):
+    python benchmarks/bench_generate_prompt.py [--calls 20000]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.prompt_agent import intelligent_agent, LANGUAGE_NAMES
+from services.prompt_templates import TEMPLATES, DEFAULT_TEMPLATE
+from services.prompt_formatters import target_formatters, expertise_formatters
+
+
+# --- Legacy reference: formatting as it was done per call -------------------
+
+def legacy_format_for_target_ai(content: str, target_ai: str, domain: str) -> str:
+    """Format the prompt specifically for the target AI model."""
+
+    # AI-specific prompt structures
+    ai_formats = {
+        "ChatGPT (GPT-4)": {
+            "prefix": "You are an expert assistant. ",
+            "style": "structured",
+            "features": ["Uses markdown formatting", "Appreciates step-by-step requests", "Works well with examples"],
+            "wrapper": lambda c: f"{c}\n\nPlease structure your response with clear headings and bullet points where appropriate."
+        },
+        "ChatGPT (GPT-3.5)": {
+            "prefix": "You are a helpful assistant. ",
+            "style": "concise",
+            "features": ["Prefers shorter prompts", "Direct instructions work best", "Less context needed"],
+            "wrapper": lambda c: f"{c}\n\nKeep your response focused and concise."
+        },
+        "Claude": {
+            "prefix": "",
+            "style": "detailed",
+            "features": ["Excels with nuanced instructions", "Handles long contexts well", "Thoughtful analysis"],
+            "wrapper": lambda c: f"I'd like your help with the following task.\n\n{c}\n\nPlease think through this carefully and provide a thorough response."
+        },
+        "Claude (Opus)": {
+            "prefix": "",
+            "style": "analytical",
+            "features": ["Best for complex reasoning", "Handles ambiguity well", "Deep analysis"],
+            "wrapper": lambda c: f"I have a complex task that requires careful analysis.\n\n{c}\n\nPlease approach this systematically, considering multiple perspectives and edge cases."
+        },
+        "Gemini": {
+            "prefix": "",
+            "style": "conversational",
+            "features": ["Good with multimodal tasks", "Natural conversation flow", "Web-aware"],
+            "wrapper": lambda c: f"{c}\n\nProvide a comprehensive and well-organized response."
+        },
+        "Gemini Pro": {
+            "prefix": "",
+            "style": "professional",
+            "features": ["Advanced reasoning", "Code generation", "Detailed explanations"],
+            "wrapper": lambda c: f"Task:\n{c}\n\nPlease provide a detailed, professional-quality response with explanations where helpful."
+        },
+        "Llama": {
+            "prefix": "[INST] ",
+            "suffix": " [/INST]",
+            "style": "instruction",
+            "features": ["Instruction-tuned format", "Clear delimiters help", "Concise prompts preferred"],
+            "wrapper": lambda c: f"[INST] {c} [/INST]"
+        },
+        "Mistral": {
+            "prefix": "<s>[INST] ",
+            "suffix": " [/INST]",
+            "style": "instruction",
+            "features": ["Instruction format", "Efficient with shorter prompts", "Good at coding"],
+            "wrapper": lambda c: f"<s>[INST] {c} [/INST]"
+        },
+        "Copilot": {
+            "prefix": "",
+            "style": "code-focused",
+            "features": ["Code-optimized", "Comment-driven generation", "Context from files"],
+            "wrapper": lambda c: f"// Task: {c}\n// Please provide working code with comments explaining the implementation."
+        }
+    }
+
+    # Get format for target AI (default to ChatGPT style)
+    ai_config = ai_formats.get(target_ai, ai_formats["ChatGPT (GPT-4)"])
+
+    # Apply the wrapper function
+    formatted = ai_config["wrapper"](content)
+
+    return formatted
+
+def legacy_adjust_for_expertise(content: str, expertise: str, domain: str) -> str:
+    """Adjust the prompt's complexity and vocabulary based on expertise level."""
+
+    expertise_configs = {
+        "Beginner": {
+            "instruction": "Explain in simple terms that a beginner can understand.",
+            "vocabulary": "simple",
+            "detail_level": "step-by-step with explanations",
+            "assumptions": "Assume no prior knowledge.",
+            "examples": "Include simple examples and analogies.",
+            "prefix": "I'm new to this topic. "
+        },
+        "Intermediate": {
+            "instruction": "Provide a balanced explanation suitable for someone with basic knowledge.",
+            "vocabulary": "standard technical terms with brief explanations",
+            "detail_level": "moderate detail",
+            "assumptions": "Assume familiarity with basic concepts.",
+            "examples": "Include practical examples.",
+            "prefix": ""
+        },
+        "Professional": {
+            "instruction": "Provide a professional-level response.",
+            "vocabulary": "industry-standard terminology",
+            "detail_level": "comprehensive with best practices",
+            "assumptions": "Assume professional working knowledge.",
+            "examples": "Include production-ready examples where applicable.",
+            "prefix": ""
+        },
+        "Expert": {
+            "instruction": "Provide an expert-level response with advanced insights.",
+            "vocabulary": "advanced technical terminology",
+            "detail_level": "in-depth with edge cases and optimizations",
+            "assumptions": "Assume deep expertise in the field.",
+            "examples": "Focus on advanced patterns, optimizations, and trade-offs.",
+            "prefix": "As an expert in this field, I need "
+        }
+    }
+
+    config = expertise_configs.get(expertise, expertise_configs["Professional"])
+
+    # Build expertise-specific additions
+    expertise_section = f"\n\n**Response Requirements:**"
+    expertise_section += f"\n- {config['instruction']}"
+    expertise_section += f"\n- Use {config['vocabulary']}"
+    expertise_section += f"\n- {config['assumptions']}"
+
+    if expertise == "Beginner":
+        expertise_section += f"\n- {config['examples']}"
+        expertise_section += "\n- Avoid jargon or explain it when necessary"
+        expertise_section += "\n- Break down complex concepts into digestible parts"
+
+    elif expertise == "Expert":
+        expertise_section += f"\n- {config['examples']}"
+        expertise_section += "\n- Discuss performance implications and trade-offs"
+        expertise_section += "\n- Include considerations for scale and edge cases"
+
+    # Add prefix if needed (skip if AI already adds its own opener)
+    if config["prefix"] and not content.startswith("I'd like") and not content.startswith("I have"):
+        content = config["prefix"] + content
+
+    return content + expertise_section
+
+
+def legacy_generate_prompt(domain, task_type, user_request, context, language="Python", settings=None):
+    settings = settings or {}
+    target_ai = settings.get("target_ai", "ChatGPT (GPT-4)")
+    expertise = settings.get("expertise_level", "Professional")
+    output_language = settings.get("language", "English")
+    if not language or language == "general":
+        language = "Python"
+
+    template = TEMPLATES.get(task_type, TEMPLATES[DEFAULT_TEMPLATE])
+    try:
+        base_content = template.format(
+            language=LANGUAGE_NAMES.get(language, language.capitalize()),
+            user_request=user_request,
+            context=context if context else "No additional context provided."
+        )
+    except KeyError:
+        base_content = template.replace("{user_request}", user_request)
+        base_content = base_content.replace("{context}", context if context else "No additional context provided.")
+        base_content = base_content.replace("{language}", LANGUAGE_NAMES.get(language, language.capitalize()))
+
+    optimized = legacy_format_for_target_ai(base_content, target_ai, domain)
+    optimized = legacy_adjust_for_expertise(optimized, expertise, domain)
+    if output_language != "English":
+        optimized += f"\n\n**Important:** Respond entirely in {output_language}."
+    return optimized
+
+
+# --- Benchmark --------------------------------------------------------------
+
+def make_cases():
+    cases = []
+    for task_type, target_ai, expertise in itertools.product(TEMPLATES, target_formatters, expertise_formatters):
+        settings = {"target_ai": target_ai, "expertise_level": expertise, "language": "English"}
+        cases.append(("coding", task_type, f"Help me with {task_type.replace('_', ' ')}", "", "python", settings))
+    return cases
+
+
+def time_calls(func, cases, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(*cases[i % len(cases)])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20000)
+    args = parser.parse_args()
+
+    cases = make_cases()
+    for case in cases:
+        assert legacy_generate_prompt(*case) == intelligent_agent._generate_prompt(*case), case
+
+    legacy = time_calls(legacy_generate_prompt, cases, args.calls)
+    current = time_calls(intelligent_agent._generate_prompt, cases, args.calls)
+
+    print(f"{len(cases)} task/target/expertise combinations verified identical, {args.calls} calls each")
+    print(f"  legacy      {args.calls / legacy:10,.0f} prompts/s  ({legacy / args.calls * 1e6:6.2f} us/call)")
+    print(f"  precompiled {args.calls / current:10,.0f} prompts/s  ({current / args.calls * 1e6:6.2f} us/call)")
+    print(f"  speedup: {legacy / current:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Micro-benchmark: request analysis over large attached contexts.
+
+Compares the legacy per-keyword substring scans (re-run by every detector,
+with intent detected twice per request) against the compiled single-pass
+classifier in services/keyword_classifier.py. Results are checked for
+equality before timing.
+
+Usage (from backend/):
+    python benchmarks/bench_keyword_classifier.py [--sizes 1000 20000 200000] [--rounds 20]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import keyword_classifier as kc
+
+
+# --- Legacy reference: what every request used to run ---------------------
+
+def legacy_intent(user_input, context):
+    text = user_input.lower().strip()
+    if any(text.startswith(g) or text == g for g in kc.greetings):
+        return "conversation"
+    for pattern in kc.casual_patterns:
+        if re.search(pattern, text):
+            return "conversation"
+    for pattern in kc.life_patterns:
+        if re.search(pattern, text):
+            return "question"
+    if sum(1 for kw in kc.prompt_keywords if kw in text) >= 1:
+        return "prompt_optimization"
+    if sum(1 for kw in kc.tech_keywords if kw in text) >= 2:
+        return "prompt_optimization"
+    if context:
+        if any(p in text for p in kc.doc_question_patterns):
+            return "question"
+        return "prompt_optimization"
+    return "conversation"
+
+
+def legacy_domain(user_input, context):
+    text = (user_input + " " + context).lower()
+    scores = {"coding": 0, "research": 0, "data_science": 0, "general": 0}
+    scores["coding"] += sum(1 for kw in kc.coding_keywords if kw in text)
+    if re.search(r'```|def |class |function |const |let |var |import |from ', text):
+        scores["coding"] += 3
+    scores["research"] += sum(1 for kw in kc.research_keywords if kw in text)
+    scores["data_science"] += sum(1 for kw in kc.ds_keywords if kw in text)
+    scores["data_science"] += 3 * sum(1 for kw in kc.ml_specific if kw in text)
+    best = max(scores.values())
+    return next((d for d, s in scores.items() if s == best), "general") if best else "general"
+
+
+def legacy_language(text):
+    text = text.lower()
+    for lang, keywords in kc.language_keywords.items():
+        for kw in keywords:
+            if kw in text:
+                return lang
+    return "python"
+
+
+def legacy_complexity(user_input, context):
+    text = user_input + " " + context
+    word_count = len(text.split())
+    score = sum(1 for ind in kc.complex_indicators if ind in text.lower())
+    if word_count > 200 or score >= 3:
+        return "high"
+    if word_count > 50 or score >= 1:
+        return "medium"
+    return "low"
+
+
+def legacy_request(user_input, context):
+    legacy_intent(user_input, context)  # _generate_thinking
+    intent = legacy_intent(user_input, context)  # process_message
+    domain = legacy_domain(user_input, context)
+    task = kc.detect_task_type(user_input, domain)
+    return intent, domain, task, legacy_language(user_input + " " + context), legacy_complexity(user_input, context)
+
+
+def compiled_request(user_input, context):
+    kc._classify_cache.clear()
+    kc.user_keywords.cache_clear()
+    kc.classify(user_input, context)  # _generate_thinking
+    result = kc.classify(user_input, context)  # process_message / _analyze_input
+    task = kc.detect_task_type(user_input, result["domain"])
+    return result["intent"], result["domain"], task, result["language"], result["complexity"]
+
+
+# --- Benchmark --------------------------------------------------------------
+
+def make_context(size: int, seed: int = 42) -> str:
+    """Code + prose mix, roughly like an attached source file or PDF extract."""
+    rng = random.Random(seed)
+    words = ("the of and to in is that for it as with was on be by this are from or have "
+             "an they which one you were all we when there can more if out so said what "
+             "about other into than them these some her would make like him time has two "
+             "value result return self items index config request response handler").split()
+    code = ["    for item in items:", "        total += item.value", "    return total",
+            "if result is None:", "    raise ValueError(msg)", "x = compute(a, b)"]
+    parts, length = [], 0
+    while length < size:
+        line = rng.choice(code) if rng.random() < 0.3 else " ".join(rng.choice(words) for _ in range(12))
+        parts.append(line)
+        length += len(line) + 1
+    return "\n".join(parts)[:size]
+
+
+def time_it(func, args, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(*args)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 20_000, 200_000, 1_000_000])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    user_input = "Review this code and suggest how to optimize the data pipeline for performance"
+    print(f"{'context chars':>14} {'legacy ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for size in args.sizes:
+        context = make_context(size)
+        assert legacy_request(user_input, context) == compiled_request(user_input, context)
+        legacy_ms = time_it(legacy_request, (user_input, context), args.rounds)
+        compiled_ms = time_it(compiled_request, (user_input, context), args.rounds)
+        print(f"{size:>14,} {legacy_ms:>10.2f} {compiled_ms:>12.2f} {legacy_ms / compiled_ms:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
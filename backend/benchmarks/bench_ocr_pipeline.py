@@ -0,0 +1,148 @@
+"""
+Benchmark: OCR throughput and accuracy per preset, against full-image OCR.
+
+Builds a synthetic corpus of phone-sized screenshots with known text (chat
+bubbles in light and dark mode, a dense document page, sparse notes) and
+runs services/ocr_pipeline.ocr_image with every preset plus "off" (tesseract
+on the image as uploaded, the previous behaviour). Accuracy is
+1 - character error rate against the ground truth, whitespace-normalised.
+Pass --corpus DIR to use your own images instead: every image needs a
+same-named .txt file holding its ground truth.
+
+Requires the tesseract binary.
+
+Usage (from backend/):
+    python benchmarks/bench_ocr_pipeline.py [--images 6] [--corpus DIR] [--workers 2]
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFont
+import pytesseract
+
+from services import ocr_pipeline
+
+PHONE_SIZE = (1170, 2532)
+WORDS = (
+    "prompt model python deploy server latency cache token request response "
+    "function database index query upload image review meeting tomorrow "
+    "release branch commit error fixed build stream budget summary"
+).split()
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def chat_screenshot(rng: random.Random, dark: bool):
+    background, bubble, ink = ((18, 18, 18), (45, 45, 48), (235, 235, 235)) if dark else \
+        ((255, 255, 255), (229, 229, 234), (20, 20, 20))
+    image = Image.new("RGB", PHONE_SIZE, background)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=44)
+    lines, y = [], 220
+    while y < PHONE_SIZE[1] - 300:
+        text = _sentence(rng, rng.randint(3, 6))
+        x = 60 if rng.random() < 0.5 else 340
+        width = draw.textlength(text, font=font)
+        draw.rounded_rectangle((x - 30, y - 20, x + width + 30, y + 70), radius=36, fill=bubble)
+        draw.text((x, y), text, fill=ink, font=font)
+        lines.append(text)
+        y += rng.randint(180, 320)
+    return image, "\n".join(lines)
+
+
+def document_page(rng: random.Random):
+    image = Image.new("RGB", PHONE_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=36)
+    lines = [_sentence(rng, 7) for _ in range(40)]
+    for i, text in enumerate(lines):
+        draw.text((60, 120 + i * 56), text, fill="black", font=font)
+    return image, "\n".join(lines)
+
+
+def sparse_note(rng: random.Random):
+    image = Image.new("RGB", PHONE_SIZE, (250, 248, 240))
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=52)
+    lines = [_sentence(rng, 4) for _ in range(3)]
+    for i, text in enumerate(lines):
+        draw.text((80, 400 + i * 700), text, fill=(40, 40, 40), font=font)
+    return image, "\n".join(lines)
+
+
+def synthetic_corpus(count: int):
+    rng = random.Random(7)
+    makers = [
+        lambda: chat_screenshot(rng, dark=False),
+        lambda: chat_screenshot(rng, dark=True),
+        lambda: document_page(rng),
+        lambda: sparse_note(rng),
+    ]
+    return [makers[i % len(makers)]() for i in range(count)]
+
+
+def load_corpus(directory: str):
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        truth_path = os.path.splitext(path)[0] + ".txt"
+        if path.endswith(".txt") or not os.path.exists(truth_path):
+            continue
+        with open(truth_path, encoding="utf-8") as f:
+            corpus.append((Image.open(path), f.read()))
+    return corpus
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def accuracy(text: str, truth: str) -> float:
+    text, truth = " ".join(text.split()), " ".join(truth.split())
+    if not truth:
+        return 1.0 if not text else 0.0
+    return max(0.0, 1.0 - edit_distance(text, truth) / len(truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--images", type=int, default=8)
+    parser.add_argument("--corpus", help="directory of images with .txt ground truth")
+    parser.add_argument("--workers", type=int, default=ocr_pipeline.OCR_TILE_WORKERS)
+    args = parser.parse_args()
+
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        sys.exit("tesseract is not installed - this benchmark needs the tesseract binary")
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.images)
+    print(f"{len(corpus)} images, {args.workers} tile workers")
+    print(f"  {'preset':<10} {'s/image':>8} {'images/s':>9} {'accuracy':>9}")
+    baseline = None
+    for preset in ["off", *ocr_pipeline.OCR_PRESETS]:
+        scores = []
+        start = time.perf_counter()
+        for image, truth in corpus:
+            scores.append(accuracy(ocr_pipeline.ocr_image(image, preset, args.workers), truth))
+        elapsed = (time.perf_counter() - start) / len(corpus)
+        baseline = baseline or elapsed
+        print(f"  {preset:<10} {elapsed:8.2f} {1 / elapsed:9.2f} {sum(scores) / len(scores):9.3f}"
+              f"   ({baseline / elapsed:.1f}x vs off)")
+
+
+if __name__ == "__main__":
+    main()
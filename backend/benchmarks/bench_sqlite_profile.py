@@ -0,0 +1,126 @@
+"""
+Benchmark: concurrent /history reads and /chat writes on SQLite, default vs performance profile.
+
+Reader threads run the history query (latest sessions by created_at) while
+writer threads insert a prompt session and its version per transaction, the
+way chat persistence does. The default profile uses the driver defaults
+(rollback journal, synchronous=FULL); the performance profile applies the
+pragmas from database.sqlite_pragmas() (WAL, synchronous=NORMAL, ...).
+
+Usage (from backend/):
+    python benchmarks/bench_sqlite_profile.py [--seconds 5] [--readers 8] [--writers 2]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, configure_sqlite_engine, sqlite_pragmas
+from database.models import PromptSession, PromptVersion
+
+
+def make_engine(path: str, profile: str, threads: int):
+    engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={"check_same_thread": False},
+        pool_size=threads,
+        max_overflow=0
+    )
+    configure_sqlite_engine(engine, sqlite_pragmas(profile))
+    Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def seed(Session, rows: int) -> None:
+    db = Session()
+    for i in range(rows):
+        session = PromptSession(user_id=1, domain="coding", task_type="code_generation",
+                                raw_prompt=f"seed prompt {i} " * 10, quality_score=80)
+        db.add_all([session, PromptVersion(session=session, label="v1", optimized_prompt="x" * 500, rating=0)])
+    db.commit()
+    db.close()
+
+
+def run_profile(profile: str, seconds: float, readers: int, writers: int) -> dict:
+    path = os.path.join(tempfile.mkdtemp(), f"{profile}.db")
+    engine = make_engine(path, profile, readers + writers)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    seed(Session, 2000)
+
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def reader():
+        db = Session()
+        while not stop.is_set():
+            try:
+                db.query(PromptSession).order_by(PromptSession.created_at.desc()).limit(20).all()
+                db.rollback()
+                with lock:
+                    counts["reads"] += 1
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    counts["errors"] += 1
+        db.close()
+
+    def writer(n: int):
+        db = Session()
+        i = 0
+        while not stop.is_set():
+            try:
+                session = PromptSession(user_id=1, domain="coding", task_type="debugging",
+                                        raw_prompt=f"writer {n} prompt {i}", quality_score=75)
+                db.add_all([session, PromptVersion(session=session, label="v1", optimized_prompt="y" * 500, rating=0)])
+                db.commit()
+                i += 1
+                with lock:
+                    counts["writes"] += 1
+            except OperationalError:
+                db.rollback()
+                with lock:
+                    counts["errors"] += 1
+        db.close()
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {name: value / seconds for name, value in counts.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    args = parser.parse_args()
+
+    results = {profile: run_profile(profile, args.seconds, args.readers, args.writers)
+               for profile in ("default", "performance")}
+
+    print(f"{args.readers} readers / {args.writers} writers, {args.seconds:.0f}s per profile")
+    for profile, r in results.items():
+        print(f"  {profile:<12} reads/s={r['reads']:9.1f}  writes/s={r['writes']:8.1f}  lock errors/s={r['errors']:6.1f}")
+    for kind in ("reads", "writes"):
+        base = results["default"][kind]
+        if base:
+            print(f"  {kind} speedup: {results['performance'][kind] / base:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
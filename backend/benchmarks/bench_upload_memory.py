@@ -0,0 +1,116 @@
+"""
+Benchmark: peak RSS of upload processing, legacy whole-file read vs streaming.
+
+The legacy path read the whole upload into memory (`await file.read()`) and
+wrapped it in io.BytesIO for the extractors. The streaming path in
+services/file_processor.py hands the spooled upload to the extractors as a
+file and decodes text in chunks. Each case runs in a fresh subprocess so its
+peak RSS (ru_maxrss) is its own; the numbers reported are the growth over the
+RSS right before processing.
+
+Usage (from backend/):
+    python benchmarks/bench_upload_memory.py [--size-mb 40]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from services import file_processor as fp
+
+# Starlette spools multipart uploads past 1 MB, the same way
+STARLETTE_SPOOL_MAX_SIZE = 1024 * 1024
+
+
+def make_text(path: str, size_mb: int) -> None:
+    line = "def handler(request):  # ünïcödé içi\n".encode()
+    with open(path, "wb") as f:
+        for _ in range(size_mb * 1024 * 1024 // len(line)):
+            f.write(line)
+
+
+def make_pdf(path: str, size_mb: int) -> None:
+    """A few text pages plus a large embedded attachment (never needed for text extraction)."""
+    from PyPDF2 import PdfWriter
+    writer = PdfWriter()
+    for _ in range(5):
+        writer.add_blank_page(width=612, height=792)
+    writer.add_attachment("data.bin", os.urandom(size_mb * 1024 * 1024))
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def upload_from(path: str, content_type: str) -> UploadFile:
+    spool = tempfile.SpooledTemporaryFile(max_size=STARLETTE_SPOOL_MAX_SIZE)
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            spool.write(chunk)
+    spool.seek(0)
+    return UploadFile(spool, filename=os.path.basename(path), headers=Headers({"content-type": content_type}))
+
+
+async def legacy_process(file: UploadFile) -> str:
+    file_content = await file.read()
+    if file.content_type == "application/pdf":
+        return fp.extract_text_from_pdf(file_content)
+    return file_content.decode("utf-8")
+
+
+def peak_rss_kb() -> int:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_case(mode: str, path: str, content_type: str) -> None:
+    # Limits off for the benchmark - only memory is measured
+    fp.UPLOAD_MAX_BYTES = fp.UPLOAD_MAX_TEXT_BYTES = 1 << 40
+    file = upload_from(path, content_type)
+    before = peak_rss_kb()
+    if mode == "legacy":
+        text = asyncio.run(legacy_process(file))
+    else:
+        text, _ = asyncio.run(fp.process_file(file))
+    print(peak_rss_kb() - before, len(text))
+
+
+def measure(mode: str, path: str, content_type: str):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--case", mode, path, content_type],
+        capture_output=True, text=True, check=True
+    ).stdout.split()
+    return int(out[-2]) / 1024, int(out[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=40)
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        run_case(*args.case)
+        return
+
+    workdir = tempfile.mkdtemp()
+    cases = [("text", os.path.join(workdir, "big.py"), "text/x-python", make_text)]
+    if fp.PDF_SUPPORT:
+        cases.append(("pdf", os.path.join(workdir, "big.pdf"), "application/pdf", make_pdf))
+
+    print(f"{args.size_mb} MB uploads, peak RSS growth while processing")
+    for name, path, content_type, make in cases:
+        make(path, args.size_mb)
+        legacy_mb, legacy_chars = measure("legacy", path, content_type)
+        stream_mb, stream_chars = measure("streaming", path, content_type)
+        assert legacy_chars == stream_chars, f"{name}: extracted text differs"
+        print(f"  {name:<5} legacy={legacy_mb:8.1f} MB  streaming={stream_mb:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
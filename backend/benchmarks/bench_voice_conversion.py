@@ -0,0 +1,145 @@
+"""
+Benchmark: voice upload decoding, legacy temp-file path vs in-memory pipes.
+
+The legacy path (the previous routers/voice.py) wrote the upload to a temp
+file, ran ffmpeg with blocking subprocess.run to write a second WAV file and
+read it back with sr.AudioFile, all inside the async handler. The pipe path
+is services/audio_converter: ffmpeg as an asyncio subprocess over stdin/stdout,
+bounded by VOICE_FFMPEG_CONCURRENCY. Requests arrive at a fixed --rate per
+second (open loop), and latency is measured from each request's scheduled
+arrival, so time spent queued behind a blocked event loop counts. The
+benchmark reports requests/s, latency percentiles, and the worst event-loop
+stall seen by a 10 ms heartbeat task, i.e. how long every other request on
+the worker was blocked. Speech recognition itself (a network
+service) is not part of the measurement.
+
+Requires ffmpeg (imageio-ffmpeg or system) and SpeechRecognition.
+
+Usage (from backend/):
+    python benchmarks/bench_voice_conversion.py [--requests 60] [--rate 30] [--seconds 5] [--format webm]
+"""
+import argparse
+import asyncio
+import math
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech_recognition as sr
+
+from services import audio_converter as ac
+
+FORMATS = {"webm": ["-c:a", "libopus"], "ogg": ["-c:a", "libopus"], "mp3": ["-c:a", "libmp3lame"]}
+
+
+def make_clip(seconds: float, fmt: str) -> bytes:
+    """Speech-like test tone (modulated harmonics at 48 kHz), encoded the way a browser recorder would."""
+    rate = 48000
+    samples = bytearray()
+    for i in range(int(seconds * rate)):
+        t = i / rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 3 * t)
+        value = sum(math.sin(2 * math.pi * f * t) / k for k, f in enumerate((180, 360, 720), 1))
+        samples += struct.pack("<h", int(9000 * envelope * value))
+    with tempfile.TemporaryDirectory() as workdir:
+        source, target = os.path.join(workdir, "in.wav"), os.path.join(workdir, f"out.{fmt}")
+        with wave.open(source, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(bytes(samples))
+        subprocess.run([ac.FFMPEG_PATH, "-y", "-loglevel", "error", "-i", source, *FORMATS[fmt], target], check=True)
+        with open(target, "rb") as f:
+            return f.read()
+
+
+async def legacy_decode(data: bytes, suffix: str) -> sr.AudioData:
+    """The previous handler: temp file in, blocking ffmpeg, WAV file out, sr.AudioFile."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
+        tmp_file.write(data)
+        tmp_path = tmp_file.name
+    wav_path = tmp_path.replace(suffix, ".wav")
+    try:
+        cmd = [ac.FFMPEG_PATH, '-y', '-i', tmp_path, '-ar', '16000', '-ac', '1', '-f', 'wav', wav_path]
+        subprocess.run(cmd, capture_output=True, timeout=30, check=True)
+        with sr.AudioFile(wav_path) as source:
+            return sr.Recognizer().record(source)
+    finally:
+        for path in (tmp_path, wav_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+async def pipe_decode(data: bytes, suffix: str) -> sr.AudioData:
+    decoded = await ac.audio_converter.decode(data, suffix)
+    return sr.AudioData(decoded.frames, decoded.sample_rate, decoded.sample_width)
+
+
+async def heartbeat(stalls: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        stalls.append(time.perf_counter() - start - 0.01)
+
+
+async def run(decode, data: bytes, suffix: str, requests: int, rate: float):
+    latencies, stalls, sizes = [], [], set()
+    stop = asyncio.Event()
+
+    async def request(arrival: float):
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+        audio = await decode(data, suffix)
+        latencies.append(time.perf_counter() - arrival)
+        sizes.add(len(audio.frame_data))
+
+    monitor = asyncio.create_task(heartbeat(stalls, stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(request(start + i / rate) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await monitor
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000,
+        "stall": max(stalls) * 1000 if stalls else 0.0,
+        "frames": sizes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=30.0, help="arrivals per second")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--format", choices=sorted(FORMATS), default="webm")
+    args = parser.parse_args()
+
+    if not ac.FFMPEG_PATH:
+        sys.exit("ffmpeg not found - install imageio-ffmpeg or a system ffmpeg")
+
+    data = make_clip(args.seconds, args.format)
+    suffix = f".{args.format}"
+    print(f"{args.seconds:g}s {args.format} clip ({len(data) / 1024:.0f} KB), {args.requests} requests, "
+          f"{args.rate:g}/s arriving, ffmpeg slots={ac.audio_converter.concurrency}")
+    results = {}
+    for name, decode in (("legacy", legacy_decode), ("pipe", pipe_decode)):
+        result = asyncio.run(run(decode, data, suffix, args.requests, args.rate))
+        results[name] = result
+        print(f"  {name:<7} {result['rps']:7.1f} req/s   p50={result['p50']:7.1f} ms   "
+              f"p95={result['p95']:7.1f} ms   worst loop stall={result['stall']:7.1f} ms")
+    # Resampling paths differ slightly (WAV header vs raw PCM); lengths must agree closely
+    legacy_frames, pipe_frames = max(results["legacy"]["frames"]), max(results["pipe"]["frames"])
+    assert abs(legacy_frames - pipe_frames) <= 0.01 * legacy_frames, "decoded audio length differs"
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,78 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import asyncio
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./lukthan.db")
 
+# Connection pool sizing (environment overridable)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+# SQLite connection profile: "performance" (WAL + tuned pragmas) or "default" (driver defaults)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "performance")
+SQLITE_PERFORMANCE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", "-65536")),  # negative = KiB (64 MB)
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", "268435456")),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", "MEMORY"),
+}
+# Seconds between background WAL checkpoints / PRAGMA optimize (0 disables)
+SQLITE_MAINTENANCE_INTERVAL = int(os.getenv("SQLITE_MAINTENANCE_INTERVAL", "600"))
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# Async drivers for the same database: aiosqlite locally, asyncpg for PostgreSQL
+ASYNC_DRIVERS = {
+    "sqlite://": "sqlite+aiosqlite://",
+    "postgresql://": "postgresql+asyncpg://",
+    "postgres://": "postgresql+asyncpg://",
+}
+
+
+def _async_url(url: str) -> str:
+    for prefix, async_prefix in ASYNC_DRIVERS.items():
+        if url.startswith(prefix):
+            return async_prefix + url[len(prefix):]
+    return url
+
+
+def _pool_options(url: str) -> dict:
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": not url.startswith("sqlite"),
+    }
+
+
+def sqlite_pragmas(profile: str = SQLITE_PROFILE) -> dict:
+    """Pragmas applied to every new SQLite connection for a profile."""
+    return dict(SQLITE_PERFORMANCE_PRAGMAS) if profile == "performance" else {}
+
+
+def configure_sqlite_engine(sync_engine, pragmas: dict) -> None:
+    """Apply pragmas on connect (pass async_engine.sync_engine for async engines)."""
+    if not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
 engine = create_engine(
     DATABASE_URL,
     connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {}
@@ -12,6 +80,16 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for request handlers - DB I/O no longer blocks the event loop
+ASYNC_DATABASE_URL = _async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_options(ASYNC_DATABASE_URL))
+
+if IS_SQLITE and ":memory:" not in DATABASE_URL:
+    configure_sqlite_engine(engine, sqlite_pragmas())
+    configure_sqlite_engine(async_engine.sync_engine, sqlite_pragmas())
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -21,6 +99,70 @@ def get_db():
     finally:
         db.close()
 
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def close_async_db():
+    await async_engine.dispose()
+
+
+async def sqlite_maintenance(checkpoint_mode: str = "PASSIVE") -> None:
+    """Checkpoint the WAL into the main database file and refresh query planner stats."""
+    if not IS_SQLITE:
+        return
+    async with async_engine.connect() as conn:
+        if SQLITE_PROFILE == "performance":
+            await conn.exec_driver_sql(f"PRAGMA wal_checkpoint({checkpoint_mode})")
+        await conn.exec_driver_sql("PRAGMA optimize")
+
+
+async def run_sqlite_maintenance() -> None:
+    """Background loop started by the app lifespan."""
+    while True:
+        await asyncio.sleep(SQLITE_MAINTENANCE_INTERVAL)
+        try:
+            await sqlite_maintenance()
+        except Exception as e:
+            print(f"[LUKTHAN] SQLite maintenance failed (non-fatal): {e}")
+
 def init_db():
     from . import models
+    if IS_SQLITE and SQLITE_PROFILE == "performance":
+        _enable_incremental_vacuum()
     Base.metadata.create_all(bind=engine)
+    migrate_db()
+    from .search import init_search_index
+    init_search_index(engine)
+
+
+def _enable_incremental_vacuum():
+    """Switch a new (still empty) SQLite database to auto_vacuum=INCREMENTAL so retention can shrink it."""
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 0 or inspect(conn).get_table_names():
+            return
+        conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        # The mode only takes effect after a VACUUM - instant on an empty file
+        conn.exec_driver_sql("VACUUM")
+
+
+def migrate_db():
+    """Add columns and indexes that were introduced after a table was first created."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+                    print(f"[LUKTHAN] Migrated: added {table.name}.{column.name}")
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(bind=conn)
+                    print(f"[LUKTHAN] Migrated: added index {index.name}")
@@ -0,0 +1,158 @@
+"""Async equivalents of database.crud for request handlers (AsyncSession)."""
+from typing import Dict, List
+from sqlalchemy import select, delete, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from .models import User, PromptSession, PromptVersion, PromptTemplate
+from .crud import version_listeners, notify_sessions_deleted
+
+
+async def create_user(db: AsyncSession, username: str, email: str, role: str):
+    db_user = User(username=username, email=email, role=role)
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(User, user_id)
+
+async def create_prompt_session(db: AsyncSession, user_id: int, domain: str, task_type: str, raw_prompt: str, quality_score: float, settings_key: str = None):
+    db_prompt_session = PromptSession(user_id=user_id, domain=domain, task_type=task_type, raw_prompt=raw_prompt, quality_score=quality_score, settings_key=settings_key)
+    db.add(db_prompt_session)
+    await db.commit()
+    await db.refresh(db_prompt_session)
+    return db_prompt_session
+
+async def get_prompt_session(db: AsyncSession, session_id: int):
+    return await db.get(PromptSession, session_id)
+
+async def create_prompt_version(db: AsyncSession, session_id: int, label: str, optimized_prompt: str, was_copied: bool, rating: int):
+    db_prompt_version = PromptVersion(session_id=session_id, label=label, optimized_prompt=optimized_prompt, was_copied=was_copied, rating=rating)
+    db.add(db_prompt_version)
+    await db.commit()
+    # Listeners read version.session, which can't lazy-load on an AsyncSession
+    await db.refresh(db_prompt_version, attribute_names=["session"])
+    for listener in version_listeners:
+        try:
+            listener(db_prompt_version)
+        except Exception as e:
+            print(f"[LUKTHAN] Version listener error (non-fatal): {e}")
+    return db_prompt_version
+
+async def get_prompt_versions(db: AsyncSession, session_id: int):
+    result = await db.execute(
+        select(PromptVersion)
+        .where(PromptVersion.session_id == session_id)
+        .order_by(PromptVersion.created_at, PromptVersion.id)
+    )
+    return result.scalars().all()
+
+async def get_prompt_templates(db: AsyncSession):
+    result = await db.execute(select(PromptTemplate))
+    return result.scalars().all()
+
+
+async def get_recent_sessions(db: AsyncSession, limit: int = 20, before=None):
+    """
+    Get recent prompt sessions ordered by creation date (newest first).
+    Pass before=(created_at, id) of the last row seen to get the next page (keyset pagination).
+    """
+    query = select(PromptSession).order_by(PromptSession.created_at.desc(), PromptSession.id.desc())
+    if before is not None:
+        query = query.where(tuple_(PromptSession.created_at, PromptSession.id) < tuple_(*before))
+    result = await db.execute(query.limit(limit))
+    return result.scalars().all()
+
+
+async def get_history_page(db: AsyncSession, limit: int = 20, before=None, preview_chars: int = 100):
+    """
+    Projection of recent sessions for history lists (one query).
+    raw_prompt is cut to preview_chars in SQL; `truncated` says whether it was longer.
+    Pass before=(created_at, id) of the last row seen to get the next page.
+    """
+    query = (
+        select(
+            PromptSession.id,
+            func.substr(PromptSession.raw_prompt, 1, preview_chars).label("raw_prompt"),
+            (func.length(PromptSession.raw_prompt) > preview_chars).label("truncated"),
+            PromptSession.domain,
+            PromptSession.task_type,
+            PromptSession.quality_score,
+            PromptSession.created_at
+        )
+        .order_by(PromptSession.created_at.desc(), PromptSession.id.desc())
+    )
+    if before is not None:
+        query = query.where(tuple_(PromptSession.created_at, PromptSession.id) < tuple_(*before))
+    result = await db.execute(query.limit(limit))
+    return result.all()
+
+
+async def get_latest_versions(db: AsyncSession, session_ids: List[int], preview_chars: int = 200) -> Dict[int, object]:
+    """Latest version of each given session in one query (row_number window), keyed by session id."""
+    if not session_ids:
+        return {}
+    ranked = (
+        select(
+            PromptVersion.id,
+            PromptVersion.session_id,
+            PromptVersion.label,
+            func.substr(PromptVersion.optimized_prompt, 1, preview_chars).label("optimized_prompt"),
+            PromptVersion.created_at,
+            func.row_number().over(
+                partition_by=PromptVersion.session_id,
+                order_by=PromptVersion.id.desc()
+            ).label("position")
+        )
+        .where(PromptVersion.session_id.in_(session_ids))
+        .subquery()
+    )
+    result = await db.execute(select(ranked).where(ranked.c.position == 1))
+    return {row.session_id: row for row in result.all()}
+
+
+async def get_session_with_versions(db: AsyncSession, session_id: int):
+    """Get a session with all its versions (one joined query)."""
+    result = await db.execute(
+        select(PromptSession)
+        .options(joinedload(PromptSession.prompt_versions))
+        .where(PromptSession.id == session_id)
+    )
+    session = result.unique().scalar_one_or_none()
+    if session:
+        return {"session": session, "versions": session.prompt_versions}
+    return None
+
+
+async def get_sessions_with_latest_version(db: AsyncSession):
+    """Get (session, latest version) pairs for every session that has a version."""
+    latest = (
+        select(PromptVersion.session_id, func.max(PromptVersion.id).label("version_id"))
+        .group_by(PromptVersion.session_id)
+        .subquery()
+    )
+    result = await db.execute(
+        select(PromptSession, PromptVersion)
+        .join(latest, latest.c.session_id == PromptSession.id)
+        .join(PromptVersion, PromptVersion.id == latest.c.version_id)
+    )
+    return result.all()
+
+
+async def delete_session(db: AsyncSession, session_id: int):
+    """Delete a session and its versions."""
+    await db.execute(delete(PromptVersion).where(PromptVersion.session_id == session_id))
+    await db.execute(delete(PromptSession).where(PromptSession.id == session_id))
+    await db.commit()
+    notify_sessions_deleted([session_id])
+    return True
+
+
+async def clear_all_sessions(db: AsyncSession):
+    """Clear all sessions and versions, in bounded chunks so writers aren't locked out."""
+    from .retention import delete_all, incremental_vacuum
+    await delete_all()
+    await incremental_vacuum()
+    notify_sessions_deleted(None)
+    return True
@@ -1,6 +1,33 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, tuple_
+from typing import Callable, List, Optional
 from .models import User, PromptSession, PromptVersion, PromptTemplate
 
+# Callbacks notified after a prompt version is written (e.g. the semantic index)
+version_listeners: List[Callable[[PromptVersion], None]] = []
+
+
+def add_version_listener(listener: Callable[[PromptVersion], None]):
+    """Register a callback run after create_prompt_version commits."""
+    version_listeners.append(listener)
+
+
+# Callbacks notified with the ids of deleted sessions (None = every session)
+delete_listeners: List[Callable[[Optional[List[int]]], None]] = []
+
+
+def add_delete_listener(listener: Callable[[Optional[List[int]]], None]):
+    """Register a callback run after sessions are deleted."""
+    delete_listeners.append(listener)
+
+
+def notify_sessions_deleted(session_ids: Optional[List[int]]):
+    for listener in delete_listeners:
+        try:
+            listener(session_ids)
+        except Exception as e:
+            print(f"[LUKTHAN] Delete listener error (non-fatal): {e}")
+
 def create_user(db: Session, username: str, email: str, role: str):
     db_user = User(username=username, email=email, role=role)
     db.add(db_user)
@@ -11,8 +38,8 @@ def create_user(db: Session, username: str, email: str, role: str):
 def get_user(db: Session, user_id: int):
     return db.query(User).filter(User.id == user_id).first()
 
-def create_prompt_session(db: Session, user_id: int, domain: str, task_type: str, raw_prompt: str, quality_score: float):
-    db_prompt_session = PromptSession(user_id=user_id, domain=domain, task_type=task_type, raw_prompt=raw_prompt, quality_score=quality_score)
+def create_prompt_session(db: Session, user_id: int, domain: str, task_type: str, raw_prompt: str, quality_score: float, settings_key: str = None):
+    db_prompt_session = PromptSession(user_id=user_id, domain=domain, task_type=task_type, raw_prompt=raw_prompt, quality_score=quality_score, settings_key=settings_key)
     db.add(db_prompt_session)
     db.commit()
     db.refresh(db_prompt_session)
@@ -26,6 +53,11 @@ def create_prompt_version(db: Session, session_id: int, label: str, optimized_pr
     db.add(db_prompt_version)
     db.commit()
     db.refresh(db_prompt_version)
+    for listener in version_listeners:
+        try:
+            listener(db_prompt_version)
+        except Exception as e:
+            print(f"[LUKTHAN] Version listener error (non-fatal): {e}")
     return db_prompt_version
 
 def get_prompt_versions(db: Session, session_id: int):
@@ -35,25 +67,51 @@ def get_prompt_templates(db: Session):
     return db.query(PromptTemplate).all()
 
 
-def get_recent_sessions(db: Session, limit: int = 20):
-    """Get recent prompt sessions ordered by creation date."""
-    return db.query(PromptSession).order_by(PromptSession.created_at.desc()).limit(limit).all()
+def get_recent_sessions(db: Session, limit: int = 20, before=None):
+    """
+    Get recent prompt sessions ordered by creation date (newest first).
+    Pass before=(created_at, id) of the last row seen to get the next page (keyset pagination).
+    """
+    query = db.query(PromptSession).order_by(PromptSession.created_at.desc(), PromptSession.id.desc())
+    if before is not None:
+        query = query.filter(tuple_(PromptSession.created_at, PromptSession.id) < tuple_(*before))
+    return query.limit(limit).all()
 
 
 def get_session_with_versions(db: Session, session_id: int):
-    """Get a session with all its versions."""
-    session = db.query(PromptSession).filter(PromptSession.id == session_id).first()
+    """Get a session with all its versions (one joined query)."""
+    session = (
+        db.query(PromptSession)
+        .options(joinedload(PromptSession.prompt_versions))
+        .filter(PromptSession.id == session_id)
+        .first()
+    )
     if session:
-        versions = db.query(PromptVersion).filter(PromptVersion.session_id == session_id).all()
-        return {"session": session, "versions": versions}
+        return {"session": session, "versions": session.prompt_versions}
     return None
 
 
+def get_sessions_with_latest_version(db: Session):
+    """Get (session, latest version) pairs for every session that has a version."""
+    latest = (
+        db.query(PromptVersion.session_id, func.max(PromptVersion.id).label("version_id"))
+        .group_by(PromptVersion.session_id)
+        .subquery()
+    )
+    return (
+        db.query(PromptSession, PromptVersion)
+        .join(latest, latest.c.session_id == PromptSession.id)
+        .join(PromptVersion, PromptVersion.id == latest.c.version_id)
+        .all()
+    )
+
+
 def delete_session(db: Session, session_id: int):
     """Delete a session and its versions."""
     db.query(PromptVersion).filter(PromptVersion.session_id == session_id).delete()
     db.query(PromptSession).filter(PromptSession.id == session_id).delete()
     db.commit()
+    notify_sessions_deleted([session_id])
     return True
 
 
@@ -62,4 +120,5 @@ def clear_all_sessions(db: Session):
     db.query(PromptVersion).delete()
     db.query(PromptSession).delete()
     db.commit()
+    notify_sessions_deleted(None)
     return True
\ No newline at end of file
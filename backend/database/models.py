@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, DateTime, Boolean, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from . import Base
@@ -25,10 +25,17 @@ class PromptSession(Base):
     task_type = Column(String(100))
     raw_prompt = Column(Text)
     quality_score = Column(Integer)
+    settings_key = Column(String(16), nullable=True)  # Hash of target AI / expertise / language
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="prompt_sessions")
-    prompt_versions = relationship("PromptVersion", back_populates="session")
+    prompt_versions = relationship("PromptVersion", back_populates="session", order_by="PromptVersion.id")
+
+    __table_args__ = (
+        # Per-user history and the global keyset-paginated history feed
+        Index("ix_prompt_sessions_user_id_created_at", "user_id", "created_at"),
+        Index("ix_prompt_sessions_created_at_id", "created_at", "id"),
+    )
 
 
 class PromptVersion(Base):
@@ -44,6 +51,10 @@ class PromptVersion(Base):
 
     session = relationship("PromptSession", back_populates="prompt_versions")
 
+    __table_args__ = (
+        Index("ix_prompt_versions_session_id_created_at", "session_id", "created_at"),
+    )
+
 
 class PromptTemplate(Base):
     __tablename__ = 'prompt_templates'
@@ -56,3 +67,11 @@ class PromptTemplate(Base):
     base_prompt = Column(Text)
     tags = Column(String(500))
     created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IdSequence(Base):
+    """Next free id per table, handed out in blocks to the write-behind queue."""
+    __tablename__ = 'id_sequences'
+
+    name = Column(String(50), primary_key=True)
+    next_id = Column(Integer, nullable=False)
@@ -0,0 +1,211 @@
+"""
+History retention: age out old prompt sessions in bounded chunks.
+
+Sessions older than RETENTION_MAX_AGE_DAYS, and each user's sessions beyond
+the newest RETENTION_MAX_ROWS_PER_USER, are deleted together with their
+versions. Only ids are read, RETENTION_CHUNK_SIZE sessions at a time, each
+chunk in its own short transaction with a pause in between so chat writers
+are never locked out for long. On SQLite the freed pages are then returned to
+the filesystem with incremental VACUUM.
+"""
+from typing import Any, Dict, List, Optional
+from datetime import datetime, timedelta
+import asyncio
+import os
+import time
+
+from sqlalchemy import select, delete, func
+from . import async_engine, IS_SQLITE
+from .models import PromptSession, PromptVersion
+from .crud import notify_sessions_deleted
+
+# Retention configuration (environment overridable, 0 = no limit)
+RETENTION_MAX_AGE_DAYS = int(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+RETENTION_MAX_ROWS_PER_USER = int(os.getenv("RETENTION_MAX_ROWS_PER_USER", "0"))
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", "500"))
+RETENTION_CHUNK_PAUSE = float(os.getenv("RETENTION_CHUNK_PAUSE", "0.05"))
+# Seconds between scheduled retention runs (0 disables the schedule)
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+
+# Pages released per incremental_vacuum step
+_VACUUM_STEP_PAGES = 2000
+
+
+class RetentionJob:
+    """Progress of the current (or last) retention run."""
+
+    def __init__(self):
+        self.status = "idle"  # idle | running | completed | failed
+        self.phase: Optional[str] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.deleted_sessions = 0
+        self.deleted_versions = 0
+        self.chunks = 0
+        self.vacuumed_pages = 0
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def reset(self) -> None:
+        task = self.task
+        self.__init__()
+        self.task = task
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "status": self.status,
+            "phase": self.phase,
+            "started_at": datetime.utcfromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            "elapsed_seconds": round(end - self.started_at, 2) if self.started_at else 0,
+            "deleted_sessions": self.deleted_sessions,
+            "deleted_versions": self.deleted_versions,
+            "chunks": self.chunks,
+            "vacuumed_pages": self.vacuumed_pages,
+            "error": self.error,
+        }
+
+
+retention_job = RetentionJob()
+
+
+async def _delete_chunk(session_ids: List[int], job: Optional[RetentionJob] = None) -> int:
+    """Delete a chunk of sessions and their versions in one short transaction."""
+    async with async_engine.begin() as conn:
+        versions = await conn.execute(delete(PromptVersion).where(PromptVersion.session_id.in_(session_ids)))
+        sessions = await conn.execute(delete(PromptSession).where(PromptSession.id.in_(session_ids)))
+    notify_sessions_deleted(session_ids)
+    if job is not None:
+        job.deleted_sessions += sessions.rowcount
+        job.deleted_versions += versions.rowcount
+        job.chunks += 1
+    return sessions.rowcount
+
+
+async def _delete_matching(query, chunk_size: int, job: Optional[RetentionJob]) -> int:
+    """Repeatedly select up to chunk_size ids with `query` and delete them until none are left."""
+    deleted = 0
+    while True:
+        async with async_engine.connect() as conn:
+            session_ids = list((await conn.execute(query.limit(chunk_size))).scalars())
+        if not session_ids:
+            return deleted
+        deleted += await _delete_chunk(session_ids, job)
+        # Let queued writers take the lock between chunks
+        await asyncio.sleep(RETENTION_CHUNK_PAUSE)
+
+
+async def delete_older_than(cutoff: datetime, chunk_size: int = RETENTION_CHUNK_SIZE,
+                            job: Optional[RetentionJob] = None) -> int:
+    query = select(PromptSession.id).where(PromptSession.created_at < cutoff).order_by(PromptSession.created_at)
+    return await _delete_matching(query, chunk_size, job)
+
+
+async def trim_per_user(max_rows: int, chunk_size: int = RETENTION_CHUNK_SIZE,
+                        job: Optional[RetentionJob] = None) -> int:
+    """Keep only each user's newest max_rows sessions."""
+    async with async_engine.connect() as conn:
+        over_limit = (await conn.execute(
+            select(PromptSession.user_id)
+            .group_by(PromptSession.user_id)
+            .having(func.count(PromptSession.id) > max_rows)
+        )).scalars().all()
+
+    deleted = 0
+    for user_id in over_limit:
+        owner = PromptSession.user_id.is_(None) if user_id is None else PromptSession.user_id == user_id
+        # Everything after the newest max_rows, served by the (user_id, created_at) index
+        query = (
+            select(PromptSession.id)
+            .where(owner)
+            .order_by(PromptSession.created_at.desc(), PromptSession.id.desc())
+            .offset(max_rows)
+        )
+        deleted += await _delete_matching(query, chunk_size, job)
+    return deleted
+
+
+async def delete_all(chunk_size: int = RETENTION_CHUNK_SIZE, job: Optional[RetentionJob] = None) -> int:
+    query = select(PromptSession.id).order_by(PromptSession.id)
+    return await _delete_matching(query, chunk_size, job)
+
+
+async def incremental_vacuum(job: Optional[RetentionJob] = None) -> int:
+    """Release free pages to the filesystem (SQLite with auto_vacuum=INCREMENTAL only)."""
+    if not IS_SQLITE:
+        return 0
+    released = 0
+    async with async_engine.connect() as conn:
+        if (await conn.exec_driver_sql("PRAGMA auto_vacuum")).scalar() != 2:
+            return 0
+        while True:
+            free_pages = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            if not free_pages:
+                break
+            # The pragma frees one page per step and the sqlite3 cursor only steps it
+            # once, so run it as a script to free the whole step
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({_VACUUM_STEP_PAGES})")
+            remaining = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+            if remaining >= free_pages:
+                break
+            released += free_pages - remaining
+            if job is not None:
+                job.vacuumed_pages = released
+            await asyncio.sleep(RETENTION_CHUNK_PAUSE)
+    return released
+
+
+async def run_retention(max_age_days: int = RETENTION_MAX_AGE_DAYS,
+                        max_rows_per_user: int = RETENTION_MAX_ROWS_PER_USER,
+                        chunk_size: int = RETENTION_CHUNK_SIZE,
+                        job: RetentionJob = retention_job) -> RetentionJob:
+    """Run one retention pass, recording progress on `job`."""
+    if not job.running:
+        # Direct call rather than a task from start_retention
+        job.reset()
+    job.status = "running"
+    job.started_at = time.time()
+    try:
+        if max_age_days > 0:
+            job.phase = "max_age"
+            await delete_older_than(datetime.utcnow() - timedelta(days=max_age_days), chunk_size, job)
+        if max_rows_per_user > 0:
+            job.phase = "max_rows_per_user"
+            await trim_per_user(max_rows_per_user, chunk_size, job)
+        if job.deleted_sessions:
+            job.phase = "vacuum"
+            await incremental_vacuum(job)
+        job.status = "completed"
+        print(f"[LUKTHAN] Retention removed {job.deleted_sessions} sessions in {job.chunks} chunks")
+    except Exception as e:
+        job.status = "failed"
+        job.error = str(e)
+        print(f"[LUKTHAN] Retention failed: {e}")
+    finally:
+        job.phase = None
+        job.finished_at = time.time()
+    return job
+
+
+def start_retention(max_age_days: int = RETENTION_MAX_AGE_DAYS,
+                    max_rows_per_user: int = RETENTION_MAX_ROWS_PER_USER) -> RetentionJob:
+    """Start a retention run in the background (no-op if one is already running)."""
+    if not retention_job.running:
+        retention_job.reset()
+        retention_job.status = "running"
+        retention_job.started_at = time.time()
+        retention_job.task = asyncio.create_task(run_retention(max_age_days, max_rows_per_user))
+    return retention_job
+
+
+async def run_retention_schedule() -> None:
+    """Background loop started by the app lifespan; shares the job (and its running guard) with the admin API."""
+    while True:
+        await asyncio.sleep(RETENTION_INTERVAL)
+        # Waits for an admin-started run instead of starting a second one
+        await start_retention().task
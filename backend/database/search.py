@@ -0,0 +1,200 @@
+"""
+Full-text search over prompt history (SQLite FTS5).
+
+prompt_search holds one row per session (rowid = session id) with the raw
+prompt and the session's optimized versions. Triggers on prompt_sessions and
+prompt_versions keep it in sync, so every write path - the write-behind
+queue, crud, retention - is covered without application code. Queries are
+ranked with bm25 and only the requested page is read. Databases without FTS5
+(PostgreSQL, or SQLite built without it) fall back to an unranked LIKE scan.
+"""
+from typing import Any, Dict, List, Optional
+import os
+import re
+
+from sqlalchemy import select, text, or_, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import IS_SQLITE
+from .models import PromptSession, PromptVersion
+
+SEARCH_TABLE = "prompt_search"
+# bm25 column weights: a hit in the user's own prompt counts more than one in an optimized version
+SEARCH_WEIGHT_RAW_PROMPT = float(os.getenv("SEARCH_WEIGHT_RAW_PROMPT", "2.0"))
+SEARCH_WEIGHT_OPTIMIZED = float(os.getenv("SEARCH_WEIGHT_OPTIMIZED", "1.0"))
+# FTS5 snippet() takes at most 64 tokens
+SEARCH_SNIPPET_TOKENS = min(int(os.getenv("SEARCH_SNIPPET_TOKENS", "16")), 64)
+
+# Matched terms in snippets are wrapped in these markers
+SNIPPET_START = "**"
+SNIPPET_END = "**"
+
+_TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# All versions of a session, newest last, as the optimized_prompt column
+_VERSIONS_TEXT = (
+    "(SELECT group_concat(optimized_prompt, char(10)) FROM "
+    "(SELECT optimized_prompt FROM prompt_versions WHERE session_id = {sid} ORDER BY id))"
+)
+
+_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        raw_prompt, optimized_prompt, domain UNINDEXED, task_type UNINDEXED,
+        tokenize = 'porter unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS prompt_search_session_insert AFTER INSERT ON prompt_sessions BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, raw_prompt, optimized_prompt, domain, task_type)
+        VALUES (new.id, new.raw_prompt, {_VERSIONS_TEXT.format(sid="new.id")}, new.domain, new.task_type);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS prompt_search_session_update
+    AFTER UPDATE OF raw_prompt, domain, task_type ON prompt_sessions BEGIN
+        UPDATE {SEARCH_TABLE} SET raw_prompt = new.raw_prompt, domain = new.domain, task_type = new.task_type
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS prompt_search_session_delete AFTER DELETE ON prompt_sessions BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS prompt_search_version_insert AFTER INSERT ON prompt_versions BEGIN
+        UPDATE {SEARCH_TABLE} SET optimized_prompt = {_VERSIONS_TEXT.format(sid="new.session_id")}
+        WHERE rowid = new.session_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS prompt_search_version_update
+    AFTER UPDATE OF optimized_prompt ON prompt_versions BEGIN
+        UPDATE {SEARCH_TABLE} SET optimized_prompt = {_VERSIONS_TEXT.format(sid="new.session_id")}
+        WHERE rowid = new.session_id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS prompt_search_version_delete AFTER DELETE ON prompt_versions BEGIN
+        UPDATE {SEARCH_TABLE} SET optimized_prompt = {_VERSIONS_TEXT.format(sid="old.session_id")}
+        WHERE rowid = old.session_id;
+    END""",
+]
+
+_BACKFILL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, raw_prompt, optimized_prompt, domain, task_type)
+    SELECT s.id, s.raw_prompt, {_VERSIONS_TEXT.format(sid="s.id")}, s.domain, s.task_type
+    FROM prompt_sessions s
+"""
+
+# Set by init_search_index(); False means the LIKE fallback is used
+fts_enabled = False
+
+
+def init_search_index(engine) -> bool:
+    """Create the FTS5 table and triggers, indexing existing history the first time."""
+    global fts_enabled
+    if not IS_SQLITE:
+        return False
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": SEARCH_TABLE}
+            ).first()
+            for statement in _SCHEMA:
+                conn.exec_driver_sql(statement)
+            if not exists:
+                indexed = conn.exec_driver_sql(_BACKFILL).rowcount
+                print(f"[LUKTHAN] Search index built for {indexed} sessions")
+        fts_enabled = True
+    except Exception as e:
+        print(f"[LUKTHAN] Full-text search unavailable, using LIKE fallback: {e}")
+        fts_enabled = False
+    return fts_enabled
+
+
+def match_expression(query: str, prefix: bool = True) -> Optional[str]:
+    """
+    Turn free text into a safe FTS5 query: every word must match (AND), each
+    quoted so FTS5 operators and punctuation in the input are literal. The last
+    word also matches as a prefix, for search-as-you-type.
+    """
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    if prefix:
+        quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+async def search_history(db: AsyncSession, query: str, domain: Optional[str] = None,
+                         task_type: Optional[str] = None, limit: int = 20, offset: int = 0,
+                         prefix: bool = True) -> List[Dict[str, Any]]:
+    """Best matches first; each row has id, domain, task_type, quality_score, created_at, snippet and score."""
+    if not fts_enabled:
+        return await _search_like(db, query, domain, task_type, limit, offset)
+
+    expression = match_expression(query, prefix)
+    if expression is None:
+        return []
+    filters = ""
+    params = {"expression": expression, "limit": limit, "offset": offset}
+    if domain:
+        filters += " AND domain = :domain"
+        params["domain"] = domain
+    if task_type:
+        filters += " AND task_type = :task_type"
+        params["task_type"] = task_type
+
+    # rank (bm25 with the configured weights) is negative, lower = better. Ranking and
+    # LIMIT run inside FTS5 so only the page's rows are joined and snippeted.
+    result = await db.execute(text(f"""
+        SELECT s.id, s.domain, s.task_type, s.quality_score, s.created_at, m.snippet, m.rank AS score
+        FROM (
+            SELECT rowid,
+                   snippet({SEARCH_TABLE}, -1, :mark_start, :mark_end, '...', {SEARCH_SNIPPET_TOKENS}) AS snippet,
+                   rank
+            FROM {SEARCH_TABLE}
+            WHERE {SEARCH_TABLE} MATCH :expression
+              AND rank MATCH 'bm25({SEARCH_WEIGHT_RAW_PROMPT}, {SEARCH_WEIGHT_OPTIMIZED})'{filters}
+            ORDER BY rank
+            LIMIT :limit OFFSET :offset
+        ) m
+        JOIN prompt_sessions s ON s.id = m.rowid
+        ORDER BY m.rank
+    """).columns(created_at=DateTime), {**params, "mark_start": SNIPPET_START, "mark_end": SNIPPET_END})
+    return [
+        {
+            "id": row.id,
+            "domain": row.domain,
+            "task_type": row.task_type,
+            "quality_score": row.quality_score,
+            "created_at": row.created_at,
+            "snippet": row.snippet,
+            "score": -row.score,
+        }
+        for row in result.all()
+    ]
+
+
+async def _search_like(db: AsyncSession, query: str, domain: Optional[str], task_type: Optional[str],
+                       limit: int, offset: int) -> List[Dict[str, Any]]:
+    """Unranked substring search, newest first (no FTS5)."""
+    terms = _TERM_PATTERN.findall(query)
+    if not terms:
+        return []
+    versions = select(PromptVersion.session_id)
+    statement = select(PromptSession)
+    for term in terms:
+        pattern = f"%{term}%"
+        statement = statement.where(or_(
+            PromptSession.raw_prompt.ilike(pattern),
+            PromptSession.id.in_(versions.where(PromptVersion.optimized_prompt.ilike(pattern)))
+        ))
+    if domain:
+        statement = statement.where(PromptSession.domain == domain)
+    if task_type:
+        statement = statement.where(PromptSession.task_type == task_type)
+    statement = statement.order_by(PromptSession.created_at.desc(), PromptSession.id.desc())
+    result = await db.execute(statement.limit(limit).offset(offset))
+    return [
+        {
+            "id": session.id,
+            "domain": session.domain,
+            "task_type": session.task_type,
+            "quality_score": session.quality_score,
+            "created_at": session.created_at,
+            "snippet": (session.raw_prompt or "")[:200],
+            "score": None,
+        }
+        for session in result.scalars().all()
+    ]
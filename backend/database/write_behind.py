@@ -0,0 +1,233 @@
+"""
+Write-behind persistence for optimized prompts.
+
+Chat handlers enqueue a (session, version) pair and get the session id back
+immediately - ids are pre-allocated in blocks from the id_sequences table, so
+no insert round trip is needed. A background task drains the queue and writes
+each batch of sessions and versions in a single transaction, flushing when
+the batch is full or the flush interval has passed. A failed batch is retried
+once and then written record by record, so one bad row (or a transient lock
+error) costs at most that row, which is logged.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+
+from sqlalchemy import select, func, update, insert, case
+from sqlalchemy.exc import IntegrityError
+from . import AsyncSessionLocal, async_engine
+from .models import PromptSession, PromptVersion, IdSequence
+from .crud import version_listeners
+
+# Write-behind configuration (environment overridable)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "true").lower() in ("true", "1", "t")
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "64"))
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))
+WRITE_BEHIND_ID_BLOCK = int(os.getenv("WRITE_BEHIND_ID_BLOCK", "100"))
+
+# Pause before retrying a failed batch (e.g. SQLite "database is locked")
+_RETRY_DELAY = 0.2
+
+
+class IdAllocator:
+    """Hands out prompt session ids from blocks reserved in the database."""
+
+    def __init__(self, block_size: int):
+        self.block_size = block_size
+        self.next_id = 0
+        self.end_id = 0
+        self.lock = asyncio.Lock()
+
+    async def allocate(self) -> int:
+        async with self.lock:
+            if self.next_id >= self.end_id:
+                self.next_id = await self._reserve_block()
+                self.end_id = self.next_id + self.block_size
+            allocated = self.next_id
+            self.next_id += 1
+            return allocated
+
+    async def _reserve_block(self) -> int:
+        """
+        Advance the sequence by one block in a single UPDATE ... RETURNING, so
+        concurrent workers are serialized by the database (a read-then-write
+        transaction fails with SQLITE_BUSY when two SQLite writers race).
+        """
+        # Never hand out ids below rows inserted outside the queue
+        floor = select(func.coalesce(func.max(PromptSession.id), 0) + 1).scalar_subquery()
+        start = case((IdSequence.next_id > floor, IdSequence.next_id), else_=floor)
+        reserve = (
+            update(IdSequence)
+            .where(IdSequence.name == PromptSession.__tablename__)
+            .values(next_id=start + self.block_size)
+            .returning(IdSequence.next_id)
+        )
+        async with async_engine.begin() as conn:
+            end = (await conn.execute(reserve)).scalar()
+        if end is None:
+            # First block ever: create the sequence row (another worker may win the race)
+            try:
+                async with async_engine.begin() as conn:
+                    await conn.execute(insert(IdSequence).values(name=PromptSession.__tablename__, next_id=1))
+            except IntegrityError:
+                pass
+            async with async_engine.begin() as conn:
+                end = (await conn.execute(reserve)).scalar()
+        return end - self.block_size
+
+
+class WriteBehindQueue:
+    """Batches prompt session/version inserts off the request path."""
+
+    def __init__(self, batch_size: int, flush_interval: float, id_block: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.ids = IdAllocator(id_block)
+        # Records, plus futures queued by join() as "written up to here" markers
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.batches = 0
+        self.retries = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    async def enqueue(self, raw_prompt: str, domain: str, task_type: str, quality_score: float,
+                      settings_key: Optional[str], optimized_prompt: str) -> int:
+        """Queue a session with its first version; returns the session id."""
+        record = {
+            "id": await self.ids.allocate(),
+            "raw_prompt": raw_prompt,
+            "domain": domain,
+            "task_type": task_type,
+            "quality_score": quality_score,
+            "settings_key": settings_key,
+            "optimized_prompt": optimized_prompt,
+        }
+        if self.running:
+            self.queue.put_nowait(record)
+        else:
+            # No background writer (disabled or not started) - write through
+            await self._write([record])
+        return record["id"]
+
+    async def join(self) -> None:
+        """
+        Wait until everything queued before this call is written (read-your-writes
+        for history). Records queued afterwards are not waited for.
+        """
+        if self.running:
+            marker = asyncio.get_running_loop().create_future()
+            self.queue.put_nowait(marker)
+            await marker
+
+    def start(self) -> None:
+        if not self.running:
+            # Created here so the queue belongs to the serving event loop
+            self.queue = asyncio.Queue()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Flush what is queued and stop the writer."""
+        if self.running:
+            await self.queue.join()
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            # A join() marker flushes right away instead of waiting for the interval
+            while len(items) < self.batch_size and not isinstance(items[-1], asyncio.Future):
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            batch = [item for item in items if not isinstance(item, asyncio.Future)]
+            try:
+                if batch:
+                    await self._write(batch)
+            finally:
+                for item in items:
+                    if isinstance(item, asyncio.Future) and not item.done():
+                        item.set_result(None)
+                    self.queue.task_done()
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Insert a batch in one transaction; on failure retry once, then record by record."""
+        try:
+            versions = await self._insert(batch)
+        except Exception as e:
+            print(f"[LUKTHAN] Write-behind batch of {len(batch)} failed, retrying: {e}")
+            self.retries += 1
+            await asyncio.sleep(_RETRY_DELAY)
+            try:
+                versions = await self._insert(batch)
+            except Exception:
+                versions = []
+                for record in batch:
+                    try:
+                        versions += await self._insert([record])
+                    except Exception as e:
+                        self.failed += 1
+                        print(f"[LUKTHAN] Write-behind dropped session {record['id']} "
+                              f"({record['domain']}, {record['raw_prompt'][:60]!r}): {e}")
+
+        self.written += len(versions)
+        self.batches += 1
+        for version in versions:
+            for listener in version_listeners:
+                try:
+                    listener(version)
+                except Exception as e:
+                    print(f"[LUKTHAN] Version listener error (non-fatal): {e}")
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> List[PromptVersion]:
+        versions = []
+        async with AsyncSessionLocal() as db, db.begin():
+            for record in batch:
+                session = PromptSession(
+                    id=record["id"],
+                    user_id=1,  # anonymous user
+                    domain=record["domain"],
+                    task_type=record["task_type"],
+                    raw_prompt=record["raw_prompt"],
+                    quality_score=record["quality_score"],
+                    settings_key=record["settings_key"]
+                )
+                version = PromptVersion(
+                    session=session,
+                    label="v1",
+                    optimized_prompt=record["optimized_prompt"],
+                    was_copied=False,
+                    rating=0
+                )
+                db.add_all([session, version])
+                versions.append(version)
+        return versions
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": WRITE_BEHIND_ENABLED,
+            "running": self.running,
+            "pending": self.queue.qsize() if self.queue else 0,
+            "written": self.written,
+            "batches": self.batches,
+            "retries": self.retries,
+            "failed": self.failed,
+        }
+
+
+write_behind = WriteBehindQueue(WRITE_BEHIND_BATCH_SIZE, WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_ID_BLOCK)
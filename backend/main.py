@@ -3,60 +3,85 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 import os
-import time
-from collections import defaultdict
+import asyncio
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Import routers
-from routers import prompts, files, voice
+from routers import prompts, files, voice, admin
 
 # Import database initialization
-from database import init_db
-
-
-# Simple in-memory rate limiter
-class RateLimiter:
-    def __init__(self, requests_per_minute: int = 30):
-        self.requests_per_minute = requests_per_minute
-        self.requests = defaultdict(list)
-
-    def is_allowed(self, client_ip: str) -> bool:
-        now = time.time()
-        minute_ago = now - 60
-
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if req_time > minute_ago
-        ]
-
-        # Check if under limit
-        if len(self.requests[client_ip]) >= self.requests_per_minute:
-            return False
-
-        # Add new request
-        self.requests[client_ip].append(now)
-        return True
-
-    def get_retry_after(self, client_ip: str) -> int:
-        if not self.requests[client_ip]:
-            return 0
-        oldest_request = min(self.requests[client_ip])
-        return max(0, int(60 - (time.time() - oldest_request)))
+from database import (
+    init_db, SessionLocal, close_async_db,
+    IS_SQLITE, SQLITE_MAINTENANCE_INTERVAL, sqlite_maintenance, run_sqlite_maintenance
+)
+from services.semantic_index import rebuild_index
+from database.write_behind import write_behind, WRITE_BEHIND_ENABLED
+from database.retention import (
+    run_retention_schedule, RETENTION_INTERVAL, RETENTION_MAX_AGE_DAYS, RETENTION_MAX_ROWS_PER_USER
+)
 
+# Shared async LLM client (closed on shutdown)
+from services.llm_client import close_async_client
+from services.conversation_store import conversation_store
 
-rate_limiter = RateLimiter(requests_per_minute=30)
+# Per-route token-bucket rate limiting
+from services.rate_limiter import rate_limiter
+from services.file_processor import UPLOAD_MAX_BYTES, format_size
+from services.extraction_pool import extraction_pool
+from services.extraction_cache import extraction_cache
+from services.audio_converter import audio_converter
+from services.speech_to_text import stt_backend
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Initialize database
     init_db()
+
+    # Load past prompts into the semantic near-duplicate index
+    db = SessionLocal()
+    try:
+        rebuild_index(db)
+    finally:
+        db.close()
+
+    # Background writer for chat persistence
+    if WRITE_BEHIND_ENABLED:
+        write_behind.start()
+
+    # Periodic WAL checkpoint / PRAGMA optimize for SQLite
+    maintenance_task = None
+    if IS_SQLITE and SQLITE_MAINTENANCE_INTERVAL > 0:
+        maintenance_task = asyncio.create_task(run_sqlite_maintenance())
+
+    # Scheduled history retention (only when a limit is configured)
+    retention_task = None
+    if RETENTION_INTERVAL > 0 and (RETENTION_MAX_AGE_DAYS > 0 or RETENTION_MAX_ROWS_PER_USER > 0):
+        retention_task = asyncio.create_task(run_retention_schedule())
+
+    # Load the local speech-to-text model into its worker pool (vosk backend)
+    try:
+        await stt_backend.start()
+    except Exception as e:
+        print(f"[LUKTHAN] Speech-to-text warm-up failed (non-fatal): {e}")
     yield
-    # Shutdown: cleanup if needed
-    pass
+    # Shutdown: flush queued prompt writes
+    await write_behind.stop()
+    extraction_pool.shutdown()
+    stt_backend.shutdown()
+    if maintenance_task:
+        maintenance_task.cancel()
+    if retention_task:
+        retention_task.cancel()
+    try:
+        await sqlite_maintenance("TRUNCATE")
+    except Exception as e:
+        print(f"[LUKTHAN] SQLite maintenance failed (non-fatal): {e}")
+    # Shutdown: release the shared LLM and database connection pools
+    await close_async_client()
+    await close_async_db()
 
 
 app = FastAPI(
@@ -76,8 +101,8 @@ async def rate_limit_middleware(request: Request, call_next):
 
     client_ip = request.client.host if request.client else "unknown"
 
-    if not rate_limiter.is_allowed(client_ip):
-        retry_after = rate_limiter.get_retry_after(client_ip)
+    allowed, retry_after = await rate_limiter.check(client_ip, request.url.path)
+    if not allowed:
         return JSONResponse(
             status_code=429,
             content={
@@ -90,6 +115,23 @@ async def rate_limit_middleware(request: Request, call_next):
     return await call_next(request)
 
 
+# Reject oversized uploads from Content-Length, before the multipart body is read
+# (chunked uploads without it are still capped per file type while processing)
+UPLOAD_MULTIPART_OVERHEAD = 64 * 1024
+
+
+@app.middleware("http")
+async def upload_size_middleware(request: Request, call_next):
+    if request.method == "POST" and request.url.path.startswith("/api/files/"):
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > UPLOAD_MAX_BYTES + UPLOAD_MULTIPART_OVERHEAD:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large: the limit is {format_size(UPLOAD_MAX_BYTES)}"}
+            )
+    return await call_next(request)
+
+
 # Configure CORS - read from environment for production
 allowed_origins = os.getenv("ALLOWED_HOSTS", "http://localhost:3000,http://localhost:5173").split(",")
 app.add_middleware(
@@ -104,6 +146,7 @@ app.add_middleware(
 app.include_router(prompts.router, prefix="/api/prompts", tags=["prompts"])
 app.include_router(files.router, prefix="/api/files", tags=["files"])
 app.include_router(voice.router, prefix="/api/voice", tags=["voice"])
+app.include_router(admin.router, prefix="/api/admin", tags=["admin"])
 
 
 @app.get("/")
@@ -121,4 +164,13 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "conversations": conversation_store.stats(),
+        "rate_limits": rate_limiter.stats(),
+        "write_behind": write_behind.stats(),
+        "extraction": extraction_pool.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "audio_conversion": audio_converter.stats(),
+        "speech_to_text": stt_backend.stats()
+    }
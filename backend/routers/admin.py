@@ -0,0 +1,54 @@
+from fastapi import APIRouter, HTTPException, Header
+from pydantic import BaseModel
+from typing import Optional
+import os
+from database.retention import (
+    retention_job,
+    start_retention,
+    RETENTION_MAX_AGE_DAYS,
+    RETENTION_MAX_ROWS_PER_USER
+)
+
+router = APIRouter()
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def _check_admin(token: Optional[str]) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API disabled (set ADMIN_TOKEN)")
+    if token != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+class RetentionRequest(BaseModel):
+    max_age_days: Optional[int] = None  # Defaults to RETENTION_MAX_AGE_DAYS
+    max_rows_per_user: Optional[int] = None  # Defaults to RETENTION_MAX_ROWS_PER_USER
+
+
+@router.post("/retention", status_code=202)
+async def run_retention_endpoint(
+    request: Optional[RetentionRequest] = None,
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Start a retention run in the background; poll GET /retention for progress."""
+    _check_admin(x_admin_token)
+    if retention_job.running:
+        raise HTTPException(status_code=409, detail="Retention already running")
+
+    request = request or RetentionRequest()
+    max_age_days = RETENTION_MAX_AGE_DAYS if request.max_age_days is None else request.max_age_days
+    max_rows_per_user = RETENTION_MAX_ROWS_PER_USER if request.max_rows_per_user is None else request.max_rows_per_user
+    if max_age_days <= 0 and max_rows_per_user <= 0:
+        raise HTTPException(status_code=400, detail="Set max_age_days or max_rows_per_user")
+
+    start_retention(max_age_days, max_rows_per_user)
+    return retention_job.to_dict()
+
+
+@router.get("/retention")
+async def retention_status_endpoint(x_admin_token: Optional[str] = Header(None)):
+    """Progress of the current or last retention run."""
+    _check_admin(x_admin_token)
+    return retention_job.to_dict()
@@ -1,17 +1,44 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Union
-from services.file_processor import process_file
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from typing import Optional, Union
+from services.file_processor import process_upload, lookup_extraction, parse_page_range, FileTooLargeError
+from services.extraction_pool import ExtractionBusyError, ExtractionTimeout
 
 router = APIRouter()
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(
+    file: Optional[UploadFile] = File(None),
+    sha256: Optional[str] = Query(None, pattern="^[0-9a-fA-F]{64}$", description="Hash-first check: SHA-256 of the file"),
+    pages: Optional[str] = Query(None, description='PDF pages to extract, e.g. "1-5,9"'),
+    max_chars: Optional[int] = Query(None, ge=0, description="PDF character budget (0 = whole document)")
+):
+    """
+    Extract text from an uploaded file.
+    Clients can first send only ?sha256=: if that file was extracted before the
+    cached result is returned (cached=true), otherwise 404 and the file must be uploaded.
+    """
+    try:
+        page_numbers = parse_page_range(pages) if pages else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     if not file:
-        raise HTTPException(status_code=400, detail="No file uploaded")
-    
+        if not sha256:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        cached = await lookup_extraction(sha256, page_numbers, max_chars)
+        if cached is None:
+            raise HTTPException(status_code=404, detail="Not cached - upload the file")
+        return cached
+
     try:
-        content, file_type = await process_file(file)
-        return {"content": content, "file_type": file_type}
+        # PDFs also get pages (per-page character offsets), page_count and truncated
+        return await process_upload(file, page_numbers, max_chars)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ExtractionBusyError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ExtractionTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
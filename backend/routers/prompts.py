@@ -1,13 +1,20 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
-from sqlalchemy.orm import Session
-from services.prompt_agent import process_message, optimize_prompt, reset_conversation
-from database import get_db
-from database.crud import (
-    create_prompt_session,
-    create_prompt_version,
-    get_recent_sessions,
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import datetime
+import base64
+from sqlalchemy.ext.asyncio import AsyncSession
+import json
+from services.prompt_agent import process_message, stream_message, optimize_prompt, reset_conversation
+from services.response_cache import response_cache
+from services.semantic_index import settings_signature
+from database import get_async_db
+from database.write_behind import write_behind
+from database.search import search_history
+from database.async_crud import (
+    get_history_page,
+    get_latest_versions,
     get_session_with_versions,
     delete_session,
     clear_all_sessions
@@ -27,6 +34,7 @@ class MessageRequest(BaseModel):
     file_content: Optional[str] = None
     file_type: Optional[str] = None
     settings: dict = {}
+    conversation_id: Optional[str] = None  # Issued by the server on the first message
 
 
 class MessageResponse(BaseModel):
@@ -48,6 +56,12 @@ class MessageResponse(BaseModel):
     suggestions: List[str]
     metadata: Dict[str, Any]
 
+    # Saved history session (only for persisted prompt optimizations)
+    session_id: Optional[int] = None
+
+    # Conversation this message belongs to - send it back with the next message
+    conversation_id: Optional[str] = None
+
 
 # Legacy endpoint for backward compatibility
 class OptimizePromptRequest(BaseModel):
@@ -67,7 +81,7 @@ class OptimizePromptResponse(BaseModel):
 
 
 @router.post("/chat", response_model=MessageResponse)
-async def chat_endpoint(request: MessageRequest, db: Session = Depends(get_db)):
+async def chat_endpoint(request: MessageRequest):
     """
     Main intelligent chat endpoint.
     Automatically detects intent and responds appropriately:
@@ -80,44 +94,91 @@ async def chat_endpoint(request: MessageRequest, db: Session = Depends(get_db)):
             request.user_input,
             request.file_content,
             request.file_type,
-            request.settings
+            request.settings,
+            request.conversation_id
         )
 
         # Save to database if it's a prompt optimization
-        if result.get("intent") == "prompt_optimization" and result.get("optimized_prompt"):
-            try:
-                # Create a session (user_id=1 for anonymous users)
-                session = create_prompt_session(
-                    db=db,
-                    user_id=1,
-                    domain=result.get("domain", "general"),
-                    task_type=result.get("task_type", "general_query"),
-                    raw_prompt=request.user_input,
-                    quality_score=result.get("quality_score", 0)
-                )
-
-                # Create the optimized version
-                create_prompt_version(
-                    db=db,
-                    session_id=session.id,
-                    label="v1",
-                    optimized_prompt=result.get("optimized_prompt", ""),
-                    was_copied=False,
-                    rating=0
-                )
-
-                # Add session_id to result for frontend
-                result["session_id"] = session.id
-            except Exception as db_error:
-                # Don't fail the request if DB save fails
-                print(f"[LUKTHAN] DB save error (non-fatal): {db_error}")
-                result["session_id"] = None  # Ensure session_id is always present
+        await _save_prompt_result(request.user_input, request.settings, result)
 
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/chat/stream")
+async def chat_stream_endpoint(request: MessageRequest):
+    """
+    Server-Sent Events variant of /chat.
+    Events (data is JSON using MessageResponse field names):
+    - thinking: one ThinkingStep, sent as soon as it is parsed
+    - optimized_prompt: {"optimized_prompt": "<text delta>"} for each generated chunk
+    - suggestions: {"suggestions": [...]}
+    - done: all remaining MessageResponse fields plus session_id and conversation_id
+    - error: {"detail": "..."} if the request fails mid-stream
+    """
+    async def event_stream():
+        try:
+            result: Dict[str, Any] = {}
+            async for event, data in stream_message(
+                request.user_input,
+                request.file_content,
+                request.file_type,
+                request.settings,
+                request.conversation_id
+            ):
+                if event == "thinking":
+                    yield _sse("thinking", data)
+                elif event == "optimized_prompt":
+                    yield _sse("optimized_prompt", {"optimized_prompt": data})
+                elif event == "result":
+                    result = data
+
+            yield _sse("suggestions", {"suggestions": result.get("suggestions", [])})
+
+            await _save_prompt_result(request.user_input, request.settings, result)
+
+            final = {
+                key: value for key, value in result.items()
+                if key not in ("thinking", "optimized_prompt", "suggestions")
+            }
+            final.setdefault("session_id", None)
+            yield _sse("done", final)
+        except Exception as e:
+            print(f"[LUKTHAN] Streaming chat error: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _sse(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _save_prompt_result(user_input: str, settings: Dict[str, Any], result: Dict[str, Any]) -> None:
+    """Queue an optimized prompt for persistence and add its session_id to the result."""
+    if result.get("intent") == "prompt_optimization" and result.get("optimized_prompt"):
+        try:
+            # The id is pre-allocated; the rows are written in the background
+            result["session_id"] = await write_behind.enqueue(
+                raw_prompt=user_input,
+                domain=result.get("domain", "general"),
+                task_type=result.get("task_type", "general_query"),
+                quality_score=result.get("quality_score", 0),
+                settings_key=settings_signature(settings),
+                optimized_prompt=result.get("optimized_prompt", "")
+            )
+        except Exception as db_error:
+            # Don't fail the request if DB save fails
+            print(f"[LUKTHAN] DB save error (non-fatal): {db_error}")
+            result["session_id"] = None  # Ensure session_id is always present
+
+
 @router.post("/optimize", response_model=OptimizePromptResponse)
 async def optimize_prompt_endpoint(request: OptimizePromptRequest):
     """Legacy endpoint for prompt optimization only."""
@@ -142,6 +203,13 @@ async def optimize_prompt_endpoint(request: OptimizePromptRequest):
 
 
 # History Response Models
+class LatestVersion(BaseModel):
+    id: int
+    label: str
+    optimized_prompt: str  # First 200 characters
+    created_at: str
+
+
 class HistoryItem(BaseModel):
     id: int
     raw_prompt: str
@@ -149,6 +217,7 @@ class HistoryItem(BaseModel):
     task_type: str
     quality_score: float
     created_at: str
+    latest_version: Optional[LatestVersion] = None  # Only with ?include_latest=true
 
     class Config:
         from_attributes = True
@@ -157,36 +226,119 @@ class HistoryItem(BaseModel):
 class HistoryResponse(BaseModel):
     sessions: List[HistoryItem]
     total: int
+    next_cursor: Optional[str] = None  # Pass back as ?cursor= to get the next page
+
+
+def _encode_cursor(created_at: datetime, session_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{session_id}".encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        created_at, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(session_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @router.get("/history", response_model=HistoryResponse)
-async def get_history(limit: int = 20, db: Session = Depends(get_db)):
-    """Get recent prompt history."""
+async def get_history(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    include_latest: bool = False,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get recent prompt history, newest first, one keyset-paginated page at a time.
+    A page costs one query, plus one for include_latest, however many versions sessions have.
+    """
+    before = _decode_cursor(cursor) if cursor else None
     try:
-        sessions = get_recent_sessions(db, limit)
+        await write_behind.join()
+        # One extra row tells us whether another page exists
+        sessions = await get_history_page(db, limit + 1, before)
+        next_cursor = None
+        if len(sessions) > limit:
+            sessions = sessions[:limit]
+            next_cursor = _encode_cursor(sessions[-1].created_at, sessions[-1].id)
+        latest = await get_latest_versions(db, [s.id for s in sessions]) if include_latest else {}
         return {
             "sessions": [
                 {
                     "id": s.id,
-                    "raw_prompt": s.raw_prompt[:100] + "..." if len(s.raw_prompt) > 100 else s.raw_prompt,
+                    "raw_prompt": s.raw_prompt + "..." if s.truncated else s.raw_prompt,
                     "domain": s.domain,
                     "task_type": s.task_type,
                     "quality_score": s.quality_score,
-                    "created_at": s.created_at.isoformat()
+                    "created_at": s.created_at.isoformat(),
+                    "latest_version": _latest_version_item(latest.get(s.id))
                 }
                 for s in sessions
             ],
-            "total": len(sessions)
+            "total": len(sessions),
+            "next_cursor": next_cursor
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _latest_version_item(version) -> Optional[Dict[str, Any]]:
+    if version is None:
+        return None
+    return {
+        "id": version.id,
+        "label": version.label,
+        "optimized_prompt": version.optimized_prompt,
+        "created_at": version.created_at.isoformat()
+    }
+
+
+class SearchResult(BaseModel):
+    id: int
+    domain: str
+    task_type: str
+    quality_score: float
+    created_at: str
+    snippet: str  # Matched terms wrapped in **
+    score: Optional[float] = None  # bm25 relevance, higher is better (None on the LIKE fallback)
+
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    next_offset: Optional[int] = None  # Pass back as ?offset= to get the next page
+
+
+@router.get("/history/search", response_model=SearchResponse)
+async def search_history_endpoint(
+    q: str = Query(..., min_length=1, max_length=500),
+    domain: Optional[str] = None,
+    task_type: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Full-text search over raw and optimized prompts, best matches first."""
+    try:
+        await write_behind.join()
+        # One extra row tells us whether another page exists
+        results = await search_history(db, q, domain, task_type, limit + 1, offset)
+        next_offset = None
+        if len(results) > limit:
+            results = results[:limit]
+            next_offset = offset + limit
+        for result in results:
+            result["created_at"] = result["created_at"].isoformat()
+        return {"results": results, "next_offset": next_offset}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/history/{session_id}")
-async def get_session_detail(session_id: int, db: Session = Depends(get_db)):
+async def get_session_detail(session_id: int, db: AsyncSession = Depends(get_async_db)):
     """Get a specific session with its versions."""
     try:
-        result = get_session_with_versions(db, session_id)
+        await write_behind.join()
+        result = await get_session_with_versions(db, session_id)
         if not result:
             raise HTTPException(status_code=404, detail="Session not found")
 
@@ -219,30 +371,42 @@ async def get_session_detail(session_id: int, db: Session = Depends(get_db)):
 
 
 @router.delete("/history/{session_id}")
-async def delete_session_endpoint(session_id: int, db: Session = Depends(get_db)):
+async def delete_session_endpoint(session_id: int, db: AsyncSession = Depends(get_async_db)):
     """Delete a specific session."""
     try:
-        delete_session(db, session_id)
+        await write_behind.join()
+        await delete_session(db, session_id)
         return {"success": True, "message": "Session deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/history")
-async def clear_history(db: Session = Depends(get_db)):
+async def clear_history(db: AsyncSession = Depends(get_async_db)):
     """Clear all history."""
     try:
-        clear_all_sessions(db)
+        await write_behind.join()
+        await clear_all_sessions(db)
         return {"success": True, "message": "All history cleared"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class ResetConversationRequest(BaseModel):
+    conversation_id: Optional[str] = None
+
+
 @router.post("/reset-conversation")
-async def reset_conversation_endpoint():
-    """Reset the guided mode conversation history."""
+async def reset_conversation_endpoint(request: Optional[ResetConversationRequest] = None):
+    """Reset the guided mode conversation history for one conversation."""
     try:
-        result = reset_conversation()
+        result = await reset_conversation(request.conversation_id if request else None)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/cache/stats")
+def cache_stats_endpoint():
+    """Hit/miss metrics for the prompt optimization response cache."""
+    return response_cache.stats()
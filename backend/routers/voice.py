@@ -1,62 +1,16 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-import tempfile
-import os
-import subprocess
-
-# Get ffmpeg path from imageio-ffmpeg package
-FFMPEG_PATH = None
-try:
-    import imageio_ffmpeg
-    FFMPEG_PATH = imageio_ffmpeg.get_ffmpeg_exe()
-    print(f"[LUKTHAN Voice] Using ffmpeg from imageio: {FFMPEG_PATH}")
-except ImportError:
-    print("[LUKTHAN Voice] imageio-ffmpeg not installed, checking system ffmpeg...")
-    # Check if ffmpeg is in PATH
-    try:
-        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, timeout=5)
-        if result.returncode == 0:
-            FFMPEG_PATH = 'ffmpeg'
-            print("[LUKTHAN Voice] Using system ffmpeg")
-    except:
-        pass
 
-if FFMPEG_PATH is None:
-    print("[LUKTHAN Voice] WARNING: No ffmpeg found! Audio conversion will fail.")
+from services.audio_converter import audio_converter, AudioConversionError, AudioConverterBusyError
+from services.speech_to_text import stt_backend, SpeechNotRecognizedError, STTUnavailableError, STTBusyError
 
 router = APIRouter()
 
 
-def convert_to_wav(input_path: str, output_path: str) -> bool:
-    """Convert audio file to WAV using ffmpeg directly."""
-    if not FFMPEG_PATH:
-        return False
-
-    try:
-        cmd = [
-            FFMPEG_PATH,
-            '-y',  # Overwrite output
-            '-i', input_path,  # Input file
-            '-ar', '16000',  # Sample rate
-            '-ac', '1',  # Mono
-            '-f', 'wav',  # WAV format
-            output_path
-        ]
-        result = subprocess.run(cmd, capture_output=True, timeout=30)
-        if result.returncode == 0:
-            print(f"[LUKTHAN Voice] Converted to WAV: {output_path}")
-            return True
-        else:
-            print(f"[LUKTHAN Voice] FFmpeg error: {result.stderr.decode()}")
-            return False
-    except Exception as e:
-        print(f"[LUKTHAN Voice] Conversion error: {e}")
-        return False
-
-
 @router.post("/transcribe")
 async def transcribe(file: UploadFile = File(...)):
     """
-    Transcribe audio file to text using Google Speech Recognition.
+    Transcribe audio file to text with the configured speech-to-text backend
+    (Google Speech Recognition or a local Vosk model, see STT_BACKEND).
     Accepts: WAV, MP3, WebM, OGG, MP4 audio formats.
     """
     # Accept various audio formats including browser-recorded formats
@@ -90,7 +44,11 @@ async def transcribe(file: UploadFile = File(...)):
             detail=f"Invalid file type. Accepted types: WAV, MP3, WebM, OGG. Got: {content_type}"
         )
 
-    temp_files = []
+    if not stt_backend.available:
+        raise HTTPException(
+            status_code=500,
+            detail="Voice transcription requires speech_recognition package. Please install it."
+        )
 
     try:
         # Read audio data
@@ -121,53 +79,32 @@ async def transcribe(file: UploadFile = File(...)):
             elif file.filename.endswith(".wav"):
                 suffix = ".wav"
 
-        # Save to temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp_file:
-            tmp_file.write(audio_data)
-            tmp_path = tmp_file.name
-        temp_files.append(tmp_path)
-        print(f"[LUKTHAN Voice] Saved temp file: {tmp_path}")
+        # Decode to PCM in memory (ffmpeg over pipes for non-WAV formats)
+        try:
+            decoded = await audio_converter.decode(audio_data, suffix)
+        except AudioConverterBusyError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except AudioConversionError:
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to convert audio format. FFmpeg may not be installed or configured correctly."
+            )
+        print(f"[LUKTHAN Voice] Decoded {decoded.duration:.1f}s of audio from {suffix}")
 
         try:
-            # Import speech recognition
-            import speech_recognition as sr
-            recognizer = sr.Recognizer()
-
-            wav_path = tmp_path
-
-            # Convert non-WAV formats to WAV using ffmpeg
-            if suffix != ".wav":
-                print(f"[LUKTHAN Voice] Converting {suffix} to WAV...")
-                wav_path = tmp_path.replace(suffix, ".wav")
-                temp_files.append(wav_path)
-
-                if not convert_to_wav(tmp_path, wav_path):
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Failed to convert audio format. FFmpeg may not be installed or configured correctly."
-                    )
-
-            # Transcribe using Google Speech Recognition
-            print(f"[LUKTHAN Voice] Transcribing from: {wav_path}")
-            with sr.AudioFile(wav_path) as source:
-                audio = recognizer.record(source)
-                transcription = recognizer.recognize_google(audio)
-                print(f"[LUKTHAN Voice] Transcription: {transcription[:50] if len(transcription) > 50 else transcription}...")
+            transcription = await stt_backend.transcribe(decoded)
+            print(f"[LUKTHAN Voice] Transcription ({stt_backend.name}): {transcription[:50] if len(transcription) > 50 else transcription}...")
 
             return {"transcription": transcription, "success": True}
 
-        except sr.UnknownValueError:
+        except SpeechNotRecognizedError:
             print("[LUKTHAN Voice] Could not understand audio")
             return {"transcription": "Could not understand audio. Please speak clearly and try again.", "success": False}
-        except sr.RequestError as e:
-            print(f"[LUKTHAN Voice] Google API error: {e}")
+        except STTBusyError as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        except STTUnavailableError as e:
+            print(f"[LUKTHAN Voice] {stt_backend.name} speech recognition error: {e}")
             raise HTTPException(status_code=503, detail=f"Speech recognition service unavailable: {str(e)}")
-        except ImportError as e:
-            print(f"[LUKTHAN Voice] Missing dependency: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail="Voice transcription requires speech_recognition package. Please install it."
-            )
 
     except HTTPException:
         raise
@@ -176,11 +113,3 @@ async def transcribe(file: UploadFile = File(...)):
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up all temp files
-        for file_path in temp_files:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                except Exception:
-                    pass  # Ignore cleanup errors
@@ -0,0 +1,228 @@
+"""
+Audio decoding for voice transcription, in memory.
+
+Uploads are piped to ffmpeg over stdin and come back on stdout as raw mono
+16-bit PCM at VOICE_SAMPLE_RATE. ffmpeg runs as an asyncio subprocess, so
+the event loop keeps serving other requests meanwhile, and nothing is written
+to disk. Mono 16-bit WAV uploads are read directly, without ffmpeg.
+
+At most VOICE_FFMPEG_CONCURRENCY ffmpeg processes run at once. A request that
+waits longer than VOICE_FFMPEG_QUEUE_TIMEOUT for a slot gets
+AudioConverterBusyError, which the voice router turns into a 429.
+MP4/M4A files with their index (moov atom) at the end cannot be decoded from
+a pipe, so those fall back to reading from a temp file. Event loops without
+subprocess support (SelectorEventLoop on Windows, e.g. under uvicorn --reload)
+run ffmpeg with subprocess.run in a worker thread instead.
+"""
+from typing import Any, Dict, List, Optional
+import asyncio
+import io
+import os
+import subprocess
+import tempfile
+import wave
+
+# Audio conversion configuration (environment overridable)
+VOICE_SAMPLE_RATE = int(os.getenv("VOICE_SAMPLE_RATE", "16000"))
+VOICE_FFMPEG_CONCURRENCY = int(os.getenv("VOICE_FFMPEG_CONCURRENCY", "0")) or (os.cpu_count() or 1)
+VOICE_FFMPEG_TIMEOUT = float(os.getenv("VOICE_FFMPEG_TIMEOUT", "30"))
+VOICE_FFMPEG_QUEUE_TIMEOUT = float(os.getenv("VOICE_FFMPEG_QUEUE_TIMEOUT", "10"))
+
+# Containers ffmpeg may need to seek in (index at the end of the file)
+_SEEKABLE_SUFFIXES = (".mp4", ".m4a")
+
+
+def find_ffmpeg() -> Optional[str]:
+    """ffmpeg from the imageio-ffmpeg package, else the system one."""
+    try:
+        import imageio_ffmpeg
+        path = imageio_ffmpeg.get_ffmpeg_exe()
+        print(f"[LUKTHAN Voice] Using ffmpeg from imageio: {path}")
+        return path
+    except ImportError:
+        print("[LUKTHAN Voice] imageio-ffmpeg not installed, checking system ffmpeg...")
+    try:
+        result = subprocess.run(['ffmpeg', '-version'], capture_output=True, timeout=5)
+        if result.returncode == 0:
+            print("[LUKTHAN Voice] Using system ffmpeg")
+            return 'ffmpeg'
+    except Exception:
+        pass
+    print("[LUKTHAN Voice] WARNING: No ffmpeg found! Audio conversion will fail.")
+    return None
+
+
+FFMPEG_PATH = find_ffmpeg()
+
+
+class AudioConversionError(RuntimeError):
+    """ffmpeg is missing, failed, or timed out."""
+
+
+class AudioConverterBusyError(RuntimeError):
+    """Every ffmpeg slot stayed busy for VOICE_FFMPEG_QUEUE_TIMEOUT."""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__("Too many audio conversions in progress, please retry shortly")
+
+
+class DecodedAudio:
+    """Raw little-endian PCM frames."""
+
+    def __init__(self, frames: bytes, sample_rate: int, sample_width: int):
+        self.frames = frames
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+
+    @property
+    def duration(self) -> float:
+        return len(self.frames) / (self.sample_rate * self.sample_width)
+
+
+def read_wav(data: bytes) -> Optional[DecodedAudio]:
+    """Frames of a mono 16-bit PCM WAV; None when the file needs ffmpeg."""
+    try:
+        with wave.open(io.BytesIO(data)) as wav:
+            if wav.getnchannels() != 1 or wav.getsampwidth() != 2:
+                return None
+            return DecodedAudio(wav.readframes(wav.getnframes()), wav.getframerate(), 2)
+    except (wave.Error, EOFError):
+        return None
+
+
+def _ffmpeg_args(source: str) -> List[str]:
+    return [
+        FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+        '-i', source,
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        '-ar', str(VOICE_SAMPLE_RATE), '-ac', '1',
+        'pipe:1'
+    ]
+
+
+def _check_output(returncode: int, stdout: bytes, stderr: bytes) -> bytes:
+    if returncode != 0 or not stdout:
+        message = stderr.decode(errors="replace").strip()[-500:] or "no audio decoded"
+        print(f"[LUKTHAN Voice] FFmpeg error: {message}")
+        raise AudioConversionError(message)
+    return stdout
+
+
+class AudioConverter:
+    """Bounded, timed ffmpeg decoding over pipes."""
+
+    def __init__(self, concurrency: int, timeout: float, queue_timeout: float):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.slots = asyncio.Semaphore(concurrency)
+        self.running = 0
+        self.converted = 0
+        self.direct = 0
+        self.file_fallbacks = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    async def decode(self, data: bytes, suffix: str) -> DecodedAudio:
+        """
+        Decode an upload to mono 16-bit PCM. suffix (".webm", ".wav", ...) is
+        the upload's extension. Raises AudioConverterBusyError when no ffmpeg slot
+        frees up in time and AudioConversionError when decoding fails.
+        """
+        if suffix == ".wav":
+            audio = read_wav(data)
+            if audio is not None:
+                self.direct += 1
+                return audio
+        if not FFMPEG_PATH:
+            raise AudioConversionError("ffmpeg is not available")
+
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise AudioConverterBusyError(retry_after=max(1, int(self.timeout // 4)))
+
+        self.running += 1
+        try:
+            try:
+                frames = await self._run(_ffmpeg_args('pipe:0'), data)
+            except AudioConversionError:
+                if suffix not in _SEEKABLE_SUFFIXES:
+                    raise
+                frames = await self._run_from_file(data, suffix)
+                self.file_fallbacks += 1
+            self.converted += 1
+            return DecodedAudio(frames, VOICE_SAMPLE_RATE, 2)
+        except AudioConversionError:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+    async def _run(self, args: List[str], stdin: Optional[bytes]) -> bytes:
+        """Run ffmpeg, feeding stdin and collecting stdout concurrently; kill it on timeout or cancellation."""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+        except NotImplementedError:
+            return await self._run_in_thread(args, stdin)
+        except OSError as e:
+            raise AudioConversionError(f"could not start ffmpeg: {e}")
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(stdin), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise AudioConversionError(f"ffmpeg timed out after {self.timeout:g}s")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+        return _check_output(process.returncode, stdout, stderr)
+
+    async def _run_in_thread(self, args: List[str], stdin: Optional[bytes]) -> bytes:
+        """Blocking subprocess.run in a worker thread, for loops that cannot spawn subprocesses."""
+        try:
+            result = await asyncio.to_thread(
+                subprocess.run, args,
+                input=stdin, stdin=subprocess.DEVNULL if stdin is None else None,
+                capture_output=True, timeout=self.timeout
+            )
+        except subprocess.TimeoutExpired:
+            self.timeouts += 1
+            raise AudioConversionError(f"ffmpeg timed out after {self.timeout:g}s")
+        except OSError as e:
+            raise AudioConversionError(f"could not start ffmpeg: {e}")
+        return _check_output(result.returncode, result.stdout, result.stderr)
+
+    async def _run_from_file(self, data: bytes, suffix: str) -> bytes:
+        # Closed before ffmpeg opens it: Windows cannot open a NamedTemporaryFile twice
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+            f.write(data)
+        try:
+            return await self._run(_ffmpeg_args(f.name), None)
+        finally:
+            os.remove(f.name)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ffmpeg": bool(FFMPEG_PATH),
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "converted": self.converted,
+            "direct_wav": self.direct,
+            "file_fallbacks": self.file_fallbacks,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+audio_converter = AudioConverter(VOICE_FFMPEG_CONCURRENCY, VOICE_FFMPEG_TIMEOUT, VOICE_FFMPEG_QUEUE_TIMEOUT)
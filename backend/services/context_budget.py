@@ -0,0 +1,246 @@
+"""
+Token budgeting for attached context (uploaded files) before LLM calls.
+
+Every Claude call that carries the attached file gets a token budget for it
+(CONTEXT_BUDGET_* below). Tokens are estimated locally, without a tokenizer
+download or an API round trip. A context that fits its budget is sent
+unchanged; a larger one is split into paragraph-sized chunks, the chunks are
+ranked with BM25 against the user's message, and the best ones that fit the
+budget are sent in document order with a marker where text was left out. When
+the message shares no terms with the document ("summarize this"), chunks are
+picked evenly across the document instead of only from its beginning.
+
+CONTEXT_SELECTION=head keeps the old behaviour (a prefix of the document),
+measured in tokens instead of characters.
+
+Chunking and ranking a multi-megabyte attachment takes seconds of CPU, so
+request handlers use fit_context_async, which does it in a worker thread.
+"""
+from typing import Dict, List, Tuple
+from collections import Counter
+from functools import lru_cache
+import asyncio
+import math
+import os
+import re
+
+# Context budget configuration (environment overridable)
+CONTEXT_SELECTION = os.getenv("CONTEXT_SELECTION", "bm25")  # bm25 | head
+# Tokens of attached context allowed per call type
+CONTEXT_BUDGETS: Dict[str, int] = {
+    "thinking": int(os.getenv("CONTEXT_BUDGET_THINKING", "100")),
+    "smart": int(os.getenv("CONTEXT_BUDGET_SMART", "150")),
+    "optimize": int(os.getenv("CONTEXT_BUDGET_OPTIMIZE", "600")),
+    "document": int(os.getenv("CONTEXT_BUDGET_DOCUMENT", "1200")),
+}
+# Upper bound on the size of one chunk
+CONTEXT_CHUNK_TOKENS = int(os.getenv("CONTEXT_CHUNK_TOKENS", "120"))
+
+# BM25 parameters
+_K1 = 1.5
+_B = 0.75
+# Characters per token assumed when a single chunk has to be cut to fit
+_CHARS_PER_TOKEN = 4
+# Contexts up to this size are budgeted on the event loop (well under a millisecond)
+_INLINE_CHARS = 16384
+# Spans longer than this many characters per allowed token are split without counting
+_SPLIT_UNCOUNTED_CHARS_PER_TOKEN = 16
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|[0-9]+|[^\sA-Za-z0-9]")
+_TERM_RE = re.compile(r"\w\w+")
+# Boundaries tried in order when a piece of text is larger than one chunk
+_SPLIT_RES = [re.compile(r"\n\s*\n"), re.compile(r"\n"), re.compile(r"(?<=[.!?;:])\s+")]
+_STOPWORDS = frozenset(
+    "the and for are but not you all any can had her was one our out has him his how its "
+    "may new now see two who did get let say she too use this that with have from they "
+    "will what when your about which their there would could should into than then them "
+    "these those been were also more some such only just like does doc document file "
+    "please tell give show explain summarize summary me my is it of to in on an as at be "
+    "by or if so do we".split()
+)
+
+
+def _piece_tokens(piece: str) -> int:
+    if len(piece) == 1:
+        return 1
+    if piece[0].isdigit():
+        return (len(piece) + 2) // 3
+    return (len(piece) + 3) // 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count: ~4 letters or ~3 digits per token, one per symbol or non-Latin character."""
+    return sum(_piece_tokens(piece) for piece in _TOKEN_RE.findall(text))
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _TERM_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _token_windows(text: str, start: int, end: int, max_tokens: int) -> List[Tuple[int, int, int]]:
+    """Cut text[start:end] between words every max_tokens tokens (no line or sentence boundary left)."""
+    windows = []
+    window_start, tokens = start, 0
+    for match in _TOKEN_RE.finditer(text, start, end):
+        cost = _piece_tokens(match.group())
+        if tokens and tokens + cost > max_tokens:
+            windows.append((window_start, match.start(), tokens))
+            window_start, tokens = match.start(), 0
+        tokens += cost
+    windows.append((window_start, end, tokens))
+    return windows
+
+
+def _pieces(text: str, start: int, end: int, max_tokens: int, level: int = 0) -> List[Tuple[int, int, int]]:
+    """Split text[start:end] into (start, end, tokens) of at most max_tokens, at the coarsest boundary possible."""
+    # Counting a multi-megabyte span is one long regex call that holds the GIL
+    # (stalling the event loop even from a thread); such a span never fits anyway
+    if end - start <= max_tokens * _SPLIT_UNCOUNTED_CHARS_PER_TOKEN:
+        tokens = estimate_tokens(text[start:end])
+        if tokens <= max_tokens:
+            return [(start, end, tokens)]
+    if level == len(_SPLIT_RES):
+        return _token_windows(text, start, end, max_tokens)
+
+    pieces: List[Tuple[int, int, int]] = []
+    position = start
+    for match in _SPLIT_RES[level].finditer(text, start, end):
+        if match.start() > position:
+            pieces.extend(_pieces(text, position, match.start(), max_tokens, level + 1))
+        position = match.end()
+    if position < end:
+        pieces.extend(_pieces(text, position, end, max_tokens, level + 1))
+    return pieces
+
+
+def split_chunks(text: str, max_tokens: int = CONTEXT_CHUNK_TOKENS) -> List[Tuple[int, int, int]]:
+    """(start, end, tokens) of paragraph-aligned chunks; small neighbours are merged up to max_tokens."""
+    chunks: List[Tuple[int, int, int]] = []
+    for start, end, tokens in _pieces(text, 0, len(text), max_tokens):
+        if chunks and chunks[-1][2] + tokens <= max_tokens:
+            chunks[-1] = (chunks[-1][0], end, chunks[-1][2] + tokens)
+        else:
+            chunks.append((start, end, tokens))
+    return chunks
+
+
+class ChunkedContext:
+    """A context split into chunks, with the per-chunk statistics BM25 needs."""
+
+    def __init__(self, text: str):
+        self.text = text
+        chunks = split_chunks(text)
+        self.chunks = [(start, end) for start, end, _ in chunks]
+        self.tokens = [tokens for _, _, tokens in chunks]
+        self.term_counts = [Counter(_terms(text[start:end])) for start, end in self.chunks]
+        self.lengths = [sum(counts.values()) for counts in self.term_counts]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.document_frequency: Counter = Counter()
+        for counts in self.term_counts:
+            self.document_frequency.update(counts.keys())
+
+    def bm25(self, query: str) -> List[float]:
+        count = len(self.chunks)
+        query_terms = set(_terms(query))
+        idf = {
+            term: math.log(1 + (count - self.document_frequency[term] + 0.5) / (self.document_frequency[term] + 0.5))
+            for term in query_terms if term in self.document_frequency
+        }
+        scores = []
+        for counts, length in zip(self.term_counts, self.lengths):
+            norm = _K1 * (1 - _B + _B * length / (self.average_length or 1))
+            scores.append(sum(
+                weight * counts[term] * (_K1 + 1) / (counts[term] + norm)
+                for term, weight in idf.items() if term in counts
+            ))
+        return scores
+
+
+@lru_cache(maxsize=8)
+def _chunked(text: str) -> ChunkedContext:
+    # The same attachment is budgeted for several calls of one request
+    return ChunkedContext(text)
+
+
+def _spread_order(count: int, picks: int) -> List[int]:
+    """Chunk indices spread evenly over the document first, then the rest in order."""
+    step = max(1, math.ceil(count / max(1, picks)))
+    first = list(range(0, count, step))
+    chosen = set(first)
+    return first + [i for i in range(count) if i not in chosen]
+
+
+def _omitted(chars: int) -> str:
+    return f"\n[... {chars} characters omitted ...]\n"
+
+
+def select_context(text: str, query: str, budget: int, selection: str = CONTEXT_SELECTION) -> str:
+    """The parts of text most relevant to query that fit in budget tokens."""
+    if budget <= 0:
+        return ""
+    # Every estimated token covers at least one character
+    if len(text) <= budget:
+        return text
+    chunked = _chunked(text)
+    if sum(chunked.tokens) <= budget:
+        return text
+
+    count = len(chunked.chunks)
+    if selection == "head":
+        order = list(range(count))
+    else:
+        scores = chunked.bm25(query)
+        if any(scores):
+            order = sorted(range(count), key=lambda i: (-scores[i], i))
+        else:
+            average = sum(chunked.tokens) / count
+            order = _spread_order(count, int(budget // (average + estimate_tokens(_omitted(0)))))
+
+    marker_tokens = estimate_tokens(_omitted(len(text)))
+    selected: List[int] = []
+    used = 0
+    for index in order:
+        cost = chunked.tokens[index] + marker_tokens
+        if used + cost <= budget:
+            selected.append(index)
+            used += cost
+        elif selection == "head":
+            break
+
+    if not selected:
+        # Budget smaller than a single chunk: cut the best chunk down to size
+        start, end = chunked.chunks[order[0]]
+        end = min(end, start + max(0, budget - marker_tokens) * _CHARS_PER_TOKEN)
+        selected_ranges = [(start, end)]
+    else:
+        selected_ranges = [chunked.chunks[i] for i in sorted(selected)]
+
+    parts: List[str] = []
+    position = 0
+    for start, end in selected_ranges:
+        if start > position:
+            parts.append(_omitted(start - position))
+        parts.append(text[start:end])
+        position = end
+    if position < len(text):
+        parts.append(_omitted(len(text) - position))
+    return "".join(parts).strip("\n")
+
+
+def fit_context(context: str, query: str, purpose: str) -> str:
+    """Attached context for one LLM call, trimmed to the purpose's token budget."""
+    if not context:
+        return context
+    budget = CONTEXT_BUDGETS.get(purpose, CONTEXT_BUDGETS["document"])
+    fitted = select_context(context, query, budget)
+    if fitted is not context:
+        print(f"[LUKTHAN] Context for {purpose}: ~{sum(_chunked(context).tokens)} -> "
+              f"~{estimate_tokens(fitted)} tokens (budget {budget})")
+    return fitted
+
+
+async def fit_context_async(context: str, query: str, purpose: str) -> str:
+    """fit_context off the event loop for contexts large enough to block it."""
+    if len(context) <= _INLINE_CHARS:
+        return fit_context(context, query, purpose)
+    return await asyncio.to_thread(fit_context, context, query, purpose)
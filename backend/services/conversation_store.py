@@ -0,0 +1,224 @@
+"""
+Per-session conversation state for guided mode and casual chat.
+
+Every client conversation gets its own id and its own bounded history
+(a deque of recent turns). Access to a conversation is serialized with a
+per-session lock, idle conversations are evicted, and state can optionally
+be persisted to a local SQLite file so several workers share it. The lock
+only covers one process, so SQLite rows carry a version: a save is a
+compare-and-swap, and when another worker saved the conversation in the
+meantime this request's changes are replayed on top of its history.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from collections import deque
+from contextlib import asynccontextmanager, closing
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+# Conversation store configuration (environment overridable)
+CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "24"))
+CONVERSATION_IDLE_TTL = int(os.getenv("CONVERSATION_IDLE_TTL", "3600"))
+CONVERSATION_BACKEND = os.getenv("CONVERSATION_BACKEND", "memory")  # memory | sqlite
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "./conversations.db")
+
+# How often (seconds) idle conversations are swept on access
+_SWEEP_INTERVAL = 60
+# Compare-and-swap attempts before a conflicting save is given up
+_SAVE_ATTEMPTS = 5
+
+
+class ConversationHistory(deque):
+    """Bounded turn deque that remembers what the current request changed."""
+
+    def __init__(self, max_turns: int):
+        super().__init__(maxlen=max_turns)
+        self.checkpoint([])
+
+    def checkpoint(self, turns: list) -> None:
+        """Replace the contents with stored turns and forget local changes."""
+        super().clear()
+        super().extend(turns)
+        self.cleared = False
+        self.appended: List[Dict[str, str]] = []
+
+    def append(self, turn: Dict[str, str]) -> None:
+        super().append(turn)
+        self.appended.append(turn)
+
+    def clear(self) -> None:
+        super().clear()
+        self.cleared = True
+        self.appended = []
+
+    def rebase(self, stored: list) -> list:
+        """This request's changes applied to a newer stored history."""
+        turns = ([] if self.cleared else list(stored)) + self.appended
+        return turns[-self.maxlen:] if self.maxlen else turns
+
+
+class ConversationState:
+    """History and lock for a single conversation."""
+
+    def __init__(self, max_turns: int):
+        self.history = ConversationHistory(max_turns)
+        self.lock = asyncio.Lock()
+        self.last_active = time.time()
+
+
+class SQLiteConversationBackend:
+    """Persists conversation histories to a local SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "conversation_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 1)"
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(conversations)")}
+            if "version" not in columns:
+                conn.execute("ALTER TABLE conversations ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_conversations_updated_at ON conversations (updated_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def load(self, conversation_id: str) -> Tuple[list, int]:
+        """(history, version); version 0 when the conversation is not stored."""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT history, version FROM conversations WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else ([], 0)
+
+    def save(self, conversation_id: str, history: list, version: int) -> bool:
+        """Store history if the row is still at `version`; False when another writer got there first."""
+        with closing(self._connect()) as conn, conn:
+            if version == 0:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO conversations (conversation_id, history, updated_at, version) "
+                    "VALUES (?, ?, ?, 1)",
+                    (conversation_id, json.dumps(history), time.time())
+                )
+            else:
+                cursor = conn.execute(
+                    "UPDATE conversations SET history = ?, updated_at = ?, version = version + 1 "
+                    "WHERE conversation_id = ? AND version = ?",
+                    (json.dumps(history), time.time(), conversation_id, version)
+                )
+            return cursor.rowcount == 1
+
+    def delete(self, conversation_id: str) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM conversations WHERE conversation_id = ?", (conversation_id,))
+
+    def evict_idle(self, idle_ttl: int) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute(
+                "DELETE FROM conversations WHERE updated_at < ?", (time.time() - idle_ttl,)
+            ).rowcount
+
+
+class ConversationStore:
+    """Session-keyed conversation histories with locking and idle eviction."""
+
+    def __init__(self, max_turns: int, idle_ttl: int, backend: Optional[SQLiteConversationBackend] = None):
+        self.max_turns = max_turns
+        self.idle_ttl = idle_ttl
+        self.backend = backend
+        self.states: Dict[str, ConversationState] = {}
+        self.last_sweep = time.time()
+        self.save_conflicts = 0
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def _get_state(self, conversation_id: str) -> ConversationState:
+        state = self.states.get(conversation_id)
+        if state is None:
+            state = ConversationState(self.max_turns)
+            self.states[conversation_id] = state
+        return state
+
+    @asynccontextmanager
+    async def session(self, conversation_id: str):
+        """Lock a conversation and yield its history deque for the duration of a request."""
+        await self._maybe_sweep()
+        state = self._get_state(conversation_id)
+        async with state.lock:
+            stored, version = list(state.history), 0
+            if self.backend is not None:
+                stored, version = await asyncio.to_thread(self.backend.load, conversation_id)
+            state.history.checkpoint(stored)
+            state.last_active = time.time()
+            try:
+                yield state.history
+            finally:
+                state.last_active = time.time()
+                if self.backend is not None:
+                    await asyncio.to_thread(self._persist, conversation_id, state.history, version)
+
+    def _persist(self, conversation_id: str, history: ConversationHistory, version: int) -> None:
+        """Compare-and-swap save; on conflict reload and replay this request's changes."""
+        turns = list(history)
+        for _ in range(_SAVE_ATTEMPTS):
+            if self.backend.save(conversation_id, turns, version):
+                return
+            self.save_conflicts += 1
+            stored, version = self.backend.load(conversation_id)
+            turns = history.rebase(stored)
+        print(f"[LUKTHAN] Conversation {conversation_id} kept changing, update not saved")
+
+    async def reset(self, conversation_id: str) -> None:
+        state = self._get_state(conversation_id)
+        # Under the lock, so a request in progress cannot save the old history back afterwards
+        async with state.lock:
+            state.history.clear()
+            if self.backend is not None:
+                await asyncio.to_thread(self.backend.delete, conversation_id)
+
+    async def _maybe_sweep(self) -> None:
+        now = time.time()
+        if now - self.last_sweep < _SWEEP_INTERVAL:
+            return
+        self.last_sweep = now
+        await self.evict_idle()
+
+    async def evict_idle(self) -> int:
+        """Drop conversations idle for longer than the TTL."""
+        cutoff = time.time() - self.idle_ttl
+        idle = [
+            cid for cid, state in self.states.items()
+            if state.last_active < cutoff and not state.lock.locked()
+        ]
+        for cid in idle:
+            del self.states[cid]
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.evict_idle, self.idle_ttl)
+        if idle:
+            print(f"[LUKTHAN] Evicted {len(idle)} idle conversations")
+        return len(idle)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_conversations": len(self.states),
+            "max_turns": self.max_turns,
+            "idle_ttl_seconds": self.idle_ttl,
+            "backend": "sqlite" if self.backend is not None else "memory",
+            "save_conflicts": self.save_conflicts,
+        }
+
+
+conversation_store = ConversationStore(
+    CONVERSATION_MAX_TURNS,
+    CONVERSATION_IDLE_TTL,
+    SQLiteConversationBackend(CONVERSATION_DB_PATH) if CONVERSATION_BACKEND == "sqlite" else None
+)
@@ -0,0 +1,219 @@
+"""
+Cache of text extracted from uploads, keyed by the upload's SHA-256.
+
+Re-uploading the same PDF or screenshot skips PyPDF2/tesseract entirely.
+Keys combine the content hash, the extractor version and the extraction
+options, so an extractor upgrade never serves stale text. Two tiers: a small
+in-memory LRU for hot entries, in front of a local SQLite file (shared by
+every worker on the host) that holds zlib-compressed results and evicts least
+recently used entries once it grows past EXTRACTION_CACHE_MAX_BYTES.
+"""
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from contextlib import closing
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Cache configuration (environment overridable)
+EXTRACTION_CACHE_BACKEND = os.getenv("EXTRACTION_CACHE_BACKEND", "sqlite")  # sqlite | memory | none
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "./extraction_cache.db")
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+EXTRACTION_CACHE_HOT_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_HOT_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Rows examined per eviction round on disk
+_EVICT_BATCH = 64
+
+
+def make_extraction_key(content_hash: str, extractor_version: str, options: Dict[str, Any]) -> str:
+    """Key for one extraction of one upload."""
+    payload = {"sha256": content_hash, "version": extractor_version, "options": options}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class HotTier:
+    """In-process LRU bounded by the total size of the stored values."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self.bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= len(previous)
+            self.entries[key] = value
+            self.bytes += len(value)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+
+class SQLiteExtractionStore:
+    """Compressed results in a local SQLite file, LRU-evicted by total size."""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_extraction_cache_last_access ON extraction_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute("SELECT value FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE extraction_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def set(self, key: str, value: bytes) -> int:
+        """Store a value; returns the number of entries evicted."""
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, len(value), time.time())
+            )
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+            evicted = 0
+            while total > self.max_bytes:
+                oldest = conn.execute(
+                    "SELECT key, size FROM extraction_cache ORDER BY last_access LIMIT ?", (_EVICT_BATCH,)
+                ).fetchall()
+                if not oldest:
+                    break
+                for old_key, size in oldest:
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute("DELETE FROM extraction_cache WHERE key = ?", (old_key,))
+                    total -= size
+                    evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM extraction_cache")
+
+    def size(self) -> Dict[str, int]:
+        with closing(self._connect()) as conn:
+            entries, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()
+            return {"entries": entries, "bytes": total}
+
+
+class ExtractionCache:
+    """Hot in-memory tier in front of an optional disk store, with hit/miss accounting."""
+
+    def __init__(self, hot: Optional[HotTier], disk: Optional[SQLiteExtractionStore]):
+        self.hot = hot
+        self.disk = disk
+        self.hot_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.hot is not None or self.disk is not None
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        value = self.hot.get(key) if self.hot else None
+        if value is not None:
+            self.hot_hits += 1
+        elif self.disk:
+            try:
+                value = await asyncio.to_thread(self.disk.get, key)
+            except Exception as e:
+                print(f"[LUKTHAN] Extraction cache read failed: {e}")
+            if value is not None:
+                self.disk_hits += 1
+                if self.hot:
+                    self.hot.set(key, value)
+        if value is None:
+            self.misses += 1
+            return None
+        return json.loads(zlib.decompress(value))
+
+    async def set(self, key: str, result: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        value = zlib.compress(json.dumps(result).encode("utf-8"))
+        if self.hot:
+            self.hot.set(key, value)
+        if self.disk:
+            try:
+                self.evictions += await asyncio.to_thread(self.disk.set, key, value)
+            except Exception as e:
+                print(f"[LUKTHAN] Extraction cache write failed: {e}")
+                return
+        self.sets += 1
+
+    def clear(self) -> None:
+        if self.hot:
+            self.hot.clear()
+        if self.disk:
+            self.disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hot_hits + self.disk_hits + self.misses
+        disk = self.disk.size() if self.disk else {"entries": 0, "bytes": 0}
+        return {
+            "backend": EXTRACTION_CACHE_BACKEND if self.enabled else "disabled",
+            "hot_entries": len(self.hot.entries) if self.hot else 0,
+            "hot_bytes": self.hot.bytes if self.hot else 0,
+            "disk_entries": disk["entries"],
+            "disk_bytes": disk["bytes"],
+            "max_bytes": self.disk.max_bytes if self.disk else 0,
+            "hot_hits": self.hot_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hot_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _create_cache() -> ExtractionCache:
+    if EXTRACTION_CACHE_BACKEND == "none":
+        return ExtractionCache(None, None)
+    hot = HotTier(EXTRACTION_CACHE_HOT_MAX_BYTES)
+    if EXTRACTION_CACHE_BACKEND == "sqlite":
+        return ExtractionCache(hot, SQLiteExtractionStore(EXTRACTION_CACHE_PATH, EXTRACTION_CACHE_MAX_BYTES))
+    return ExtractionCache(hot, None)
+
+
+# Process-wide cache instance
+extraction_cache = _create_cache()
@@ -0,0 +1,223 @@
+"""
+Process pool for CPU-bound text extraction (PDF, DOCX, OCR).
+
+Extractors run in worker processes so a slow upload never blocks the event
+loop and uploads use every core. The number of jobs in flight is bounded:
+when the pool is saturated, run() raises ExtractionBusyError and the
+upload router answers 429. Each job is limited to EXTRACTION_TIMEOUT seconds
+inside the worker (SIGALRM); a worker that does not come back is killed with
+its pool, which is then recreated (a process pool cannot lose a single
+worker), and the other jobs that were running on it are resubmitted to the
+new pool rather than failed. Workers are replaced after
+EXTRACTION_MAX_TASKS_PER_WORKER jobs so memory leaked by PDF parsing is
+returned to the OS.
+
+Uploads reach the workers as a temp file path (or bytes when small), never
+as a pickled copy of a large file.
+"""
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import weakref
+
+# Extraction pool configuration (environment overridable)
+EXTRACTION_MODE = os.getenv("EXTRACTION_MODE", "process")  # process | thread | inline
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "0")) or (os.cpu_count() or 1)
+EXTRACTION_MAX_PENDING = int(os.getenv("EXTRACTION_MAX_PENDING", "0")) or EXTRACTION_WORKERS * 4
+EXTRACTION_TIMEOUT = float(os.getenv("EXTRACTION_TIMEOUT", "60"))
+EXTRACTION_MAX_TASKS_PER_WORKER = int(os.getenv("EXTRACTION_MAX_TASKS_PER_WORKER", "50"))
+
+# Uploads up to this size are sent to workers as bytes instead of a temp file
+_INLINE_BYTES = 1024 * 1024
+# Extra time the parent waits before assuming a worker is stuck
+_TIMEOUT_GRACE = 5.0
+# Times a job is resubmitted after its pool was restarted because of another job
+_MAX_RESUBMITS = 2
+
+
+class ExtractionBusyError(RuntimeError):
+    """Every worker is busy and the queue is full."""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__("Extraction queue is full, please retry shortly")
+
+
+class ExtractionError(RuntimeError):
+    """A job could not complete (its worker process died)."""
+
+
+class ExtractionTimeout(ExtractionError):
+    """A job ran past EXTRACTION_TIMEOUT."""
+
+
+def _run_job(func: Callable, timeout: float, args: tuple) -> Any:
+    """Worker entry point: run func(*args) under a SIGALRM deadline."""
+    def on_alarm(signum, frame):
+        raise ExtractionTimeout(f"extraction timed out after {timeout:g}s")
+
+    if hasattr(signal, "setitimer"):
+        signal.signal(signal.SIGALRM, on_alarm)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return func(*args)
+    finally:
+        if hasattr(signal, "setitimer"):
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+
+def _mp_context():
+    # Worker recycling (max_tasks_per_child) can't use fork; forkserver starts workers cheaply
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+class ExtractionPool:
+    """Bounded, timed execution of extractors in worker processes."""
+
+    def __init__(self, mode: str, workers: int, max_pending: int, timeout: float, max_tasks_per_worker: int):
+        self.mode = mode
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.executor: Optional[ProcessPoolExecutor] = None
+        # Pools killed because one of their jobs was stuck; their other jobs are resubmitted
+        self.stopped: "weakref.WeakSet[ProcessPoolExecutor]" = weakref.WeakSet()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self.resubmitted = 0
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=_mp_context(),
+                max_tasks_per_child=self.max_tasks_per_worker or None
+            )
+        return self.executor
+
+    def _restart(self, executor: ProcessPoolExecutor, stuck: bool) -> None:
+        """
+        Kill every worker of executor (one is stuck or dead) and start a fresh
+        pool on next use. No-op when another failed job already replaced it.
+        After a stuck job, the pool's other jobs fail with BrokenProcessPool
+        and are resubmitted by _run_in_process.
+        """
+        if self.executor is not executor:
+            return
+        self.executor = None
+        self.restarts += 1
+        if stuck:
+            self.stopped.add(executor)
+        for process in list((executor._processes or {}).values()):
+            process.kill()
+        # Queued jobs are failed (not cancelled) by the broken pool, so they can be resubmitted too
+        executor.shutdown(wait=False)
+        print("[LUKTHAN] Extraction pool restarted")
+
+    async def run(self, func: Callable[..., Any], stream: BinaryIO, *args: Any) -> Any:
+        """
+        Run func(*args, source) off the event loop, where source is the upload
+        as a file object (thread/inline) or a path/bytes (process).
+        Raises ExtractionBusyError when max_pending jobs are already in flight,
+        ExtractionTimeout / ExtractionError when the job times out or its worker dies.
+        """
+        return (await self.map(func, stream, [args]))[0]
+
+    async def map(self, func: Callable[..., Any], stream: BinaryIO, args_list: List[tuple]) -> List[Any]:
+        """Run func(*args, source) for every args tuple in parallel, sharing one copy of the upload."""
+        if self.pending + len(args_list) > self.max_pending:
+            self.rejected += 1
+            raise ExtractionBusyError(retry_after=max(1, int(self.timeout // 4)))
+
+        self.pending += len(args_list)
+        try:
+            if self.mode == "inline":
+                return [func(*args, stream) for args in args_list]
+            if self.mode == "thread":
+                return [await self._run_in_thread(func, stream, args) for args in args_list]
+            source, temp_path = await asyncio.to_thread(_to_worker_source, stream)
+            try:
+                return await asyncio.gather(*(self._run_in_process(func, source, args) for args in args_list))
+            finally:
+                if temp_path:
+                    os.unlink(temp_path)
+        except ExtractionTimeout:
+            self.timeouts += 1
+            raise
+        finally:
+            self.pending -= len(args_list)
+            self.completed += len(args_list)
+
+    async def _run_in_thread(self, func: Callable[..., Any], stream: BinaryIO, args: tuple) -> Any:
+        stream.seek(0)
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args, stream), self.timeout)
+        except asyncio.TimeoutError:
+            raise ExtractionTimeout(f"extraction timed out after {self.timeout:g}s")
+
+    async def _run_in_process(self, func: Callable[..., Any], source: Union[str, bytes], args: tuple) -> Any:
+        loop = asyncio.get_running_loop()
+        for attempt in range(_MAX_RESUBMITS + 1):
+            executor = self._executor()
+            future = loop.run_in_executor(executor, _run_job, func, self.timeout, (*args, source))
+            try:
+                return await asyncio.wait_for(future, self.timeout + _TIMEOUT_GRACE)
+            except asyncio.TimeoutError:
+                # The worker ignored its alarm (stuck in native code)
+                self._restart(executor, stuck=True)
+                raise ExtractionTimeout(f"extraction timed out after {self.timeout:g}s")
+            except BrokenProcessPool:
+                if executor in self.stopped and attempt < _MAX_RESUBMITS:
+                    # Killed along with another job's stuck worker - run it again
+                    self.resubmitted += 1
+                    continue
+                # A worker died (segfault / OOM kill) - nothing else can run on this pool
+                self._restart(executor, stuck=False)
+                raise ExtractionError("worker process crashed")
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts,
+            "resubmitted": self.resubmitted,
+        }
+
+
+def _to_worker_source(stream: BinaryIO) -> Tuple[Union[str, bytes], Optional[str]]:
+    """Small uploads go to the worker as bytes; larger ones as a temp file path (to be deleted)."""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size <= _INLINE_BYTES:
+        return stream.read(), None
+    with tempfile.NamedTemporaryFile(prefix="lukthan-extract-", delete=False) as f:
+        shutil.copyfileobj(stream, f)
+    return f.name, f.name
+
+
+extraction_pool = ExtractionPool(
+    EXTRACTION_MODE, EXTRACTION_WORKERS, EXTRACTION_MAX_PENDING,
+    EXTRACTION_TIMEOUT, EXTRACTION_MAX_TASKS_PER_WORKER
+)
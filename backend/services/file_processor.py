@@ -1,11 +1,18 @@
-from typing import Union, Tuple
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union, Tuple
+import asyncio
+import codecs
+import hashlib
+import math
 import os
 import tempfile
 import io
 from fastapi import UploadFile
+from services.extraction_pool import extraction_pool, ExtractionError, ExtractionBusyError, ExtractionTimeout
+from services.extraction_cache import extraction_cache, make_extraction_key
 
 # Conditional imports for optional dependencies
 try:
+    import PyPDF2
     from PyPDF2 import PdfReader
     PDF_SUPPORT = True
 except ImportError:
@@ -20,10 +27,57 @@ except ImportError:
 try:
     from PIL import Image
     import pytesseract
+    from services.ocr_pipeline import ocr_image, OCR_PRESET
     IMAGE_OCR_SUPPORT = True
 except ImportError:
     IMAGE_OCR_SUPPORT = False
 
+# Bump when extraction output changes so text cached by older code is not reused.
+# Library versions are part of it, so upgrading PyPDF2/pytesseract does the same.
+EXTRACTOR_VERSION = "|".join([
+    "1",
+    f"pypdf2-{PyPDF2.__version__}" if PDF_SUPPORT else "no-pdf",
+    f"pytesseract-{pytesseract.__version__}-{OCR_PRESET}" if IMAGE_OCR_SUPPORT else "no-ocr",
+])
+
+# Types worth caching: their extraction runs in the process pool and takes seconds
+CACHED_TYPES = ["pdf", "docx", "png", "jpg", "gif", "webp"]
+# Extraction results starting with these are failures and are never cached
+_ERROR_PREFIXES = ("[Error", "[PDF support", "[DOCX support", "[Image OCR")
+
+# Upload limits in bytes (environment overridable), checked while the upload is read
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+UPLOAD_MAX_TEXT_BYTES = int(os.getenv("UPLOAD_MAX_TEXT_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_MAX_IMAGE_BYTES = int(os.getenv("UPLOAD_MAX_IMAGE_BYTES", str(20 * 1024 * 1024)))
+# Uploads larger than this are spooled to a temp file instead of RAM
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv("UPLOAD_SPOOL_MAX_MEMORY", str(1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+
+# PDF extraction stops after this many characters (0 = whole document, the
+# default: prompts are built from the chunks most relevant to the message,
+# which can come from anywhere in the document). Clients can still pass a
+# per-upload max_chars.
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "0"))
+# Whole-document extraction of PDFs with at least this many pages is split into
+# page chunks that run on several extraction workers at once
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "32"))
+PDF_PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "16"))
+
+
+class FileTooLargeError(ValueError):
+    """Upload exceeds the size limit for its file type."""
+
+    def __init__(self, size: int, limit: int):
+        self.size = size
+        self.limit = limit
+        super().__init__(f"File too large: the limit for this file type is {format_size(limit)}")
+
+
+def format_size(num_bytes: int) -> str:
+    if num_bytes >= 1024 * 1024:
+        return f"{num_bytes / (1024 * 1024):.0f} MB"
+    return f"{num_bytes / 1024:.0f} KB"
+
 
 # File type categorization
 FILE_TYPE_MAPPING = {
@@ -103,6 +157,20 @@ async def process_file(file: UploadFile) -> Tuple[str, str]:
     Process an uploaded file and extract its content.
     Returns: Tuple of (extracted_content, file_type_category)
     """
+    result = await process_upload(file)
+    return result["content"], result["file_type"]
+
+
+async def process_upload(file: UploadFile, pages: Optional[List[int]] = None,
+                         max_chars: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Process an uploaded file and extract its content.
+    For PDFs, `pages` (1-based) limits extraction to those pages and `max_chars`
+    overrides PDF_MAX_CHARS; the result then also has per-page offsets.
+    PDFs, DOCX files and images are cached by content hash (see extraction_cache).
+    Returns: dict with content, file_type, for PDFs pages / page_count / truncated,
+             and for cached types sha256 (+ cached=True on a cache hit)
+    """
     # Get file type info
     content_type = file.content_type or ""
     filename = file.filename or ""
@@ -117,77 +185,327 @@ async def process_file(file: UploadFile) -> Tuple[str, str]:
         # Default to documents/text for unknown types
         category, specific_type = "documents", "txt"
 
-    # Read file content
-    file_content = await file.read()
-
-    # Extract text based on file type
-    extracted_text = ""
-
-    if specific_type == "pdf":
-        extracted_text = extract_text_from_pdf(file_content)
-    elif specific_type == "docx":
-        extracted_text = extract_text_from_docx(file_content)
-    elif specific_type in ["png", "jpg", "gif", "webp"]:
-        extracted_text = extract_text_from_image(file_content, specific_type)
-    elif category == "code" or specific_type in ["txt", "md"]:
-        # For code and text files, decode directly
-        try:
-            extracted_text = file_content.decode("utf-8")
-        except UnicodeDecodeError:
-            try:
-                extracted_text = file_content.decode("latin-1")
-            except (UnicodeDecodeError, LookupError) as e:
-                extracted_text = f"[Unable to decode file content: {type(e).__name__}]"
-    elif category == "audio":
-        extracted_text = "[Audio file - use voice transcription endpoint]"
-    else:
-        extracted_text = "[Unsupported file type]"
+    result: Dict[str, Any] = {"content": "", "file_type": category}
+    max_chars = PDF_MAX_CHARS if max_chars is None else max_chars
+    stream = await spool_upload(file, upload_size_limit(category, specific_type))
+    try:
+        cache_key = None
+        if specific_type in CACHED_TYPES and extraction_cache.enabled:
+            result["sha256"] = await asyncio.to_thread(hash_stream, stream)
+            cache_key = extraction_cache_key(result["sha256"], pages, max_chars)
+            cached = await extraction_cache.get(cache_key)
+            if cached is not None:
+                return {**cached, "sha256": result["sha256"], "cached": True}
+
+        # Extract text based on file type (CPU-bound types run in the extraction process pool)
+        if specific_type == "pdf":
+            result.update(await extract_pdf(stream, pages, max_chars))
+        elif specific_type in ["docx", "png", "jpg", "gif", "webp"]:
+            result["content"] = await extraction_pool.run(extract_document, stream, specific_type)
+        elif category == "code" or specific_type in ["txt", "md"]:
+            # For code and text files, decode chunk by chunk
+            result["content"] = decode_text_stream(stream)
+        elif category == "audio":
+            result["content"] = "[Audio file - use voice transcription endpoint]"
+        else:
+            result["content"] = "[Unsupported file type]"
+
+        if cache_key and not result["content"].startswith(_ERROR_PREFIXES):
+            await extraction_cache.set(cache_key, {k: v for k, v in result.items() if k != "sha256"})
+    except ExtractionTimeout:
+        raise
+    except ExtractionError as e:
+        result["content"] = f"[Error extracting {specific_type.upper()} text: {e}]"
+    finally:
+        if stream is not file.file:
+            stream.close()
+
+    return result
+
+
+def extraction_cache_key(content_hash: str, pages: Optional[List[int]], max_chars: int) -> str:
+    return make_extraction_key(content_hash, EXTRACTOR_VERSION, {"pages": pages, "max_chars": max_chars})
+
+
+async def lookup_extraction(content_hash: str, pages: Optional[List[int]] = None,
+                            max_chars: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Hash-first upload: the cached result for an upload with this SHA-256 (and
+    the same options), or None if the file has to be uploaded.
+    """
+    max_chars = PDF_MAX_CHARS if max_chars is None else max_chars
+    cached = await extraction_cache.get(extraction_cache_key(content_hash.lower(), pages, max_chars))
+    if cached is None:
+        return None
+    return {**cached, "sha256": content_hash.lower(), "cached": True}
+
+
+def hash_stream(stream: BinaryIO) -> str:
+    """SHA-256 of a stream's content, read in chunks; leaves the stream at the start."""
+    digest = hashlib.sha256()
+    stream.seek(0)
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def upload_size_limit(category: str, specific_type: str) -> int:
+    """Maximum upload size in bytes for a file type."""
+    if category == "code" or specific_type in ["txt", "md"]:
+        return UPLOAD_MAX_TEXT_BYTES
+    if category == "images":
+        return UPLOAD_MAX_IMAGE_BYTES
+    return UPLOAD_MAX_BYTES
+
+
+async def spool_upload(file: UploadFile, max_bytes: int) -> BinaryIO:
+    """
+    Return a seekable stream over the upload without loading it into memory.
+    Starlette already spools multipart uploads (to disk past 1 MB), so a
+    seekable upload is used in place; anything else is copied chunk by chunk
+    into a SpooledTemporaryFile. Raises FileTooLargeError as soon as more than
+    max_bytes have been seen.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise FileTooLargeError(file.size, max_bytes)
 
-    return extracted_text, category
+    source = file.file
+    if source.seekable():
+        size = source.seek(0, os.SEEK_END)
+        source.seek(0)
+        if size > max_bytes:
+            raise FileTooLargeError(size, max_bytes)
+        return source
 
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY)
+    size = 0
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            spool.close()
+            raise FileTooLargeError(size, max_bytes)
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+
+def iter_text_chunks(stream: BinaryIO, encoding: str = "utf-8", chunk_size: int = UPLOAD_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Decode a byte stream chunk by chunk. The incremental decoder carries a
+    multi-byte character split across two chunks over to the next one.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def decode_text_stream(stream: BinaryIO) -> str:
+    """Decode a text/code upload as UTF-8, or latin-1 if it isn't valid UTF-8."""
+    try:
+        return "".join(iter_text_chunks(stream))
+    except UnicodeDecodeError:
+        stream.seek(0)
+        return "".join(iter_text_chunks(stream, "latin-1"))
+
+
+def extract_document(specific_type: str, source: Union[str, bytes, BinaryIO]) -> str:
+    """Extract text from a DOCX/image given as a path, bytes or file (extraction pool entry point)."""
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return extract_document(specific_type, f)
+    if specific_type == "docx":
+        return extract_text_from_docx(source)
+    return extract_text_from_image(source, specific_type)
+
+
+def _as_stream(file_content: Union[bytes, BinaryIO]) -> BinaryIO:
+    return io.BytesIO(file_content) if isinstance(file_content, bytes) else file_content
+
+
+def extract_text_from_pdf(file_content: Union[bytes, BinaryIO]) -> str:
     """Extract text from PDF file content."""
     if not PDF_SUPPORT:
         return "[PDF support not available - install PyPDF2]"
 
     try:
-        pdf_file = io.BytesIO(file_content)
-        reader = PdfReader(pdf_file)
-        text_parts = []
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text_parts.append(page_text)
-        return "\n".join(text_parts)
+        return extract_pdf_pages(None, 0, file_content)["text"]
+    except ExtractionError:
+        raise
     except Exception as e:
         return f"[Error extracting PDF text: {str(e)}]"
 
 
-def extract_text_from_docx(file_content: bytes) -> str:
+def extract_pdf_pages(pages: Optional[List[int]], max_chars: int,
+                      source: Union[str, bytes, BinaryIO]) -> Dict[str, Any]:
+    """
+    Extract the given pages (1-based, default all) in order, stopping once
+    max_chars characters have been collected (0 = no limit). Pages are joined
+    with newlines; each page's [start, end) character range in the text is
+    returned so later stages can pick pages instead of a text prefix.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return extract_pdf_pages(pages, max_chars, f)
+
+    reader = PdfReader(_as_stream(source))
+    page_count = len(reader.pages)
+    numbers = [n for n in (pages or range(1, page_count + 1)) if 1 <= n <= page_count]
+    parts: List[str] = []
+    offsets: List[Dict[str, int]] = []
+    length = 0
+    truncated = False
+    for index, number in enumerate(numbers):
+        page_text = reader.pages[number - 1].extract_text()
+        if not page_text:
+            continue
+        if parts:
+            # No room for any of this page after the newline separator
+            if max_chars and length + 1 >= max_chars:
+                truncated = True
+                break
+            length += 1
+        if max_chars and length + len(page_text) > max_chars:
+            page_text = page_text[:max(0, max_chars - length)]
+            truncated = True
+        parts.append(page_text)
+        offsets.append({"page": number, "start": length, "end": length + len(page_text)})
+        length += len(page_text)
+        if max_chars and length >= max_chars:
+            truncated = truncated or index < len(numbers) - 1
+            break
+    return {"text": "\n".join(parts), "pages": offsets, "page_count": page_count, "truncated": truncated}
+
+
+def count_pdf_pages(source: Union[str, bytes, BinaryIO]) -> int:
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return count_pdf_pages(f)
+    return len(PdfReader(_as_stream(source)).pages)
+
+
+async def extract_pdf(stream: BinaryIO, pages: Optional[List[int]] = None,
+                      max_chars: int = PDF_MAX_CHARS) -> Dict[str, Any]:
+    """
+    Extract PDF text in the extraction pool. With a character budget the pages
+    are read in order until it is used up; without one, large documents are
+    split into page chunks extracted by several workers in parallel.
+    Returns: dict with content, pages (offsets), page_count and truncated
+    """
+    if not PDF_SUPPORT:
+        return {"content": "[PDF support not available - install PyPDF2]"}
+
+    try:
+        if max_chars or extraction_pool.mode != "process" or extraction_pool.workers < 2:
+            result = await extraction_pool.run(extract_pdf_pages, stream, pages, max_chars)
+        else:
+            result = await _extract_pdf_parallel(stream, pages)
+    except (ExtractionError, ExtractionBusyError):
+        raise
+    except Exception as e:
+        return {"content": f"[Error extracting PDF text: {str(e)}]"}
+    return {
+        "content": result["text"],
+        "pages": result["pages"],
+        "page_count": result["page_count"],
+        "truncated": result["truncated"],
+    }
+
+
+async def _extract_pdf_parallel(stream: BinaryIO, pages: Optional[List[int]]) -> Dict[str, Any]:
+    page_count = await extraction_pool.run(count_pdf_pages, stream)
+    numbers = [n for n in (pages or range(1, page_count + 1)) if 1 <= n <= page_count]
+    # Contiguous chunks, at most one per worker and never more than the pool will accept
+    chunk_count = min(
+        math.ceil(len(numbers) / PDF_PAGES_PER_CHUNK),
+        extraction_pool.workers,
+        max(1, extraction_pool.max_pending - extraction_pool.pending)
+    )
+    if len(numbers) < PDF_PARALLEL_MIN_PAGES or chunk_count < 2:
+        return await extraction_pool.run(extract_pdf_pages, stream, numbers, 0)
+
+    size = math.ceil(len(numbers) / chunk_count)
+    chunks = [numbers[i:i + size] for i in range(0, len(numbers), size)]
+    results = await extraction_pool.map(extract_pdf_pages, stream, [(chunk, 0) for chunk in chunks])
+
+    # Stitch the chunks back together, shifting each chunk's offsets
+    parts: List[str] = []
+    offsets: List[Dict[str, int]] = []
+    length = 0
+    for result in results:
+        if not result["text"]:
+            continue
+        if parts:
+            length += 1
+        offsets.extend({**o, "start": o["start"] + length, "end": o["end"] + length} for o in result["pages"])
+        parts.append(result["text"])
+        length += len(result["text"])
+    return {"text": "\n".join(parts), "pages": offsets, "page_count": page_count, "truncated": False}
+
+
+def parse_page_range(spec: str) -> List[int]:
+    """Parse "1-5,9,12-" style page ranges into sorted 1-based page numbers (open end capped at 10000)."""
+    numbers = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            first_page = int(first) if first.strip() else 1
+            last_page = int(last) if last.strip() else 10000
+            if first_page < 1 or last_page < first_page:
+                raise ValueError(f"Invalid page range: {part}")
+            numbers.update(range(first_page, min(last_page, 10000) + 1))
+        else:
+            if int(part) < 1:
+                raise ValueError(f"Invalid page number: {part}")
+            numbers.add(int(part))
+    return sorted(numbers)
+
+
+def extract_text_from_docx(file_content: Union[bytes, BinaryIO]) -> str:
     """Extract text from DOCX file content."""
     if not DOCX_SUPPORT:
         return "[DOCX support not available - install python-docx]"
 
     try:
-        docx_file = io.BytesIO(file_content)
-        doc = Document(docx_file)
+        doc = Document(_as_stream(file_content))
         paragraphs = [para.text for para in doc.paragraphs if para.text.strip()]
         return "\n".join(paragraphs)
+    except ExtractionError:
+        # The job's timeout (SIGALRM in the extraction worker)
+        raise
     except Exception as e:
         return f"[Error extracting DOCX text: {str(e)}]"
 
 
-def extract_text_from_image(file_content: bytes, image_type: str) -> str:
+def extract_text_from_image(file_content: Union[bytes, BinaryIO], image_type: str) -> str:
     """Extract text from image using OCR."""
     if not IMAGE_OCR_SUPPORT:
         return "[Image OCR not available - install Pillow and pytesseract]"
 
     try:
-        image_file = io.BytesIO(file_content)
-        image = Image.open(image_file)
-        text = pytesseract.image_to_string(image)
-        return text.strip() if text.strip() else "[No text detected in image]"
+        image = Image.open(_as_stream(file_content))
+        # Downscale, binarize and OCR only the text regions (see services/ocr_pipeline)
+        text = ocr_image(image)
+        return text if text else "[No text detected in image]"
+    except ExtractionError:
+        raise
     except Exception as e:
         return f"[Error extracting image text: {str(e)}]"
 
@@ -198,18 +516,18 @@ class FileProcessor:
     @staticmethod
     def extract_text_from_pdf(file_path: str) -> str:
         with open(file_path, "rb") as f:
-            return extract_text_from_pdf(f.read())
+            return extract_text_from_pdf(f)
 
     @staticmethod
     def extract_text_from_docx(file_path: str) -> str:
         with open(file_path, "rb") as f:
-            return extract_text_from_docx(f.read())
+            return extract_text_from_docx(f)
 
     @staticmethod
     def extract_text_from_image(file_path: str) -> str:
         with open(file_path, "rb") as f:
             ext = os.path.splitext(file_path)[1].lower().replace(".", "")
-            return extract_text_from_image(f.read(), ext)
+            return extract_text_from_image(f, ext)
 
     @staticmethod
     def extract_text(file_path: str, file_type: str) -> Union[str, None]:
@@ -0,0 +1,365 @@
+"""
+Compiled, single-pass keyword classifier for intent, domain, task type,
+programming language and complexity detection.
+
+All keyword tables are compiled once at import into trie-shaped alternation
+regexes. The lowercased request text (and attached context) is scanned once
+per matcher to collect every keyword present, and all scores are derived
+from that set. Results match the original per-keyword substring checks.
+"""
+from typing import Any, Dict, FrozenSet, List, Tuple
+from collections import OrderedDict
+from functools import lru_cache
+import re
+import threading
+
+
+# Domain to task type mapping (inline definitions)
+domain_tasks = {
+    "coding": ["code_generation", "debugging", "code_review", "architecture", "api_design"],
+    "research": ["literature_review", "paper_writing", "methodology", "explanation"],
+    "data_science": ["data_analysis", "ml_model", "data_visualization"],
+    "general": ["general_query", "writing_assistance", "brainstorming"]
+}
+
+# Task type keywords for detection
+task_keywords = {
+    "code_generation": ["write", "create", "implement", "build", "develop", "code", "function", "class", "program"],
+    "debugging": ["debug", "fix", "error", "bug", "issue", "problem", "not working", "crash", "exception"],
+    "code_review": ["review", "check", "analyze code", "improve", "optimize", "refactor"],
+    "architecture": ["design", "architect", "structure", "system", "scalable", "microservice"],
+    "api_design": ["api", "endpoint", "rest", "graphql", "route", "request", "response"],
+    "literature_review": ["literature", "review", "papers", "research", "studies", "academic"],
+    "paper_writing": ["paper", "thesis", "dissertation", "essay", "article", "publication"],
+    "methodology": ["method", "methodology", "approach", "procedure", "study design"],
+    "explanation": ["explain", "what is", "how does", "understand", "concept", "theory"],
+    "data_analysis": ["analyze", "data", "statistics", "trends", "patterns", "insights",
+                      "csv", "clean", "cleaning", "missing", "null", "preprocess", "preprocessing",
+                      "eda", "exploratory", "leakage", "leak", "correlation", "distribution"],
+    "ml_model": ["machine learning", "ml", "model", "predict", "classification", "regression", "neural",
+                 "lstm", "xgboost", "random forest", "gradient boosting", "lightgbm", "catboost",
+                 "train", "training", "validation", "hyperparameter", "forecast", "forecasting",
+                 "deep learning", "tensorflow", "pytorch", "keras", "sklearn", "scikit"],
+    "data_visualization": ["visualize", "chart", "graph", "plot", "dashboard", "visualization"],
+    "general_query": ["help", "question", "information", "tell me", "what", "how", "why"],
+    "writing_assistance": ["write", "draft", "content", "copy", "blog", "email", "message"],
+    "brainstorming": ["ideas", "brainstorm", "suggest", "creative", "options", "possibilities"]
+}
+
+# Programming language detection keywords
+language_keywords = {
+    "python": ["python", "py", "django", "flask", "pandas", "numpy", "pytorch", "tensorflow"],
+    "javascript": ["javascript", "js", "node", "react", "vue", "angular", "express", "npm"],
+    "typescript": ["typescript", "ts", "angular", "nest", "deno"],
+    "java": ["java", "spring", "maven", "gradle", "jvm", "kotlin"],
+    "csharp": ["c#", "csharp", ".net", "dotnet", "asp.net", "unity"],
+    "cpp": ["c++", "cpp", "cmake", "qt", "boost"],
+    "go": ["golang", "go ", "gin", "fiber"],
+    "rust": ["rust", "cargo", "tokio"],
+    "php": ["php", "laravel", "symfony", "wordpress"],
+    "ruby": ["ruby", "rails", "sinatra"],
+    "swift": ["swift", "ios", "swiftui", "uikit"],
+    "sql": ["sql", "mysql", "postgresql", "database", "query", "select", "insert"]
+}
+
+# Domain detection keywords (1 point each, scanned over input + context)
+coding_keywords = ["code", "function", "class", "api", "bug", "error", "debug",
+                   "implement", "program", "script", "variable", "loop", "array",
+                   "database", "server", "frontend", "backend", "deploy", "react",
+                   "python", "javascript", "typescript", "java", "css", "html"]
+
+research_keywords = ["research", "study", "paper", "thesis", "literature",
+                     "methodology", "hypothesis", "analysis", "academic",
+                     "citation", "journal", "publication"]
+
+# Basic data science keywords (1 point each)
+ds_keywords = ["data", "machine learning", "ml", "model", "predict",
+               "dataset", "visualization", "statistics", "neural",
+               "training", "algorithm", "feature", "regression", "classification",
+               "csv", "dataframe", "pandas", "numpy", "sklearn", "scikit",
+               "clean", "cleaning", "preprocessing", "preprocess",
+               "missing", "null", "nan", "impute", "imputation",
+               "leakage", "leak", "overfit", "overfitting", "underfit",
+               "train", "test", "validation", "split", "cross-validation",
+               "forecast", "forecasting", "time series", "arima",
+               "eda", "exploratory", "correlation", "distribution"]
+
+# High-value ML terms (3 points each - very specific indicators)
+ml_specific = ["lstm", "xgboost", "random forest", "gradient boosting",
+               "lightgbm", "catboost", "tensorflow", "pytorch", "keras",
+               "transformer", "bert", "gpt", "cnn", "rnn", "autoencoder",
+               "hyperparameter", "epoch", "batch size", "learning rate",
+               "confusion matrix", "roc", "auc", "precision", "recall", "f1"]
+
+complex_indicators = ["complex", "advanced", "sophisticated", "enterprise",
+                      "scalable", "distributed", "microservice", "architecture",
+                      "optimize", "performance", "security"]
+
+# Intent detection tables (scanned over the user input only)
+greetings = ["hello", "hi", "hey", "bonjour", "salut", "coucou", "yo", "sup",
+             "good morning", "good evening", "good afternoon", "what's up",
+             "how are you", "comment ça va", "ça va", "how's it going"]
+
+casual_patterns = [
+    r"^(thanks|thank you|merci)",
+    r"^(okay|ok|alright|sure|yes|no|yep|nope)",
+    r"^(nice|cool|great|awesome|amazing)",
+    r"(how's your|what's your) (day|name)",
+    r"^(lol|haha|😂|😊|👋)",
+    r"(bye|goodbye|see you|later|à bientôt)",
+    r"^just (saying|asking|wondering|curious)",
+    r"^i'?m (doing|feeling|good|fine|great|okay|well)",
+    r"(can you|do you) speak",
+    r"(what|which) language",
+    r"^(that's|thats) (cool|nice|great|interesting|funny)",
+    r"^(really|wow|oh|hm+|ah)",
+    r"(tell me (about yourself|a joke|something))",
+    r"^(yeah|yea|yup|nah)",
+    r"what do you (like|think|prefer)",
+    r"^(hows|how is) (it|life|everything)",
+]
+
+life_patterns = [
+    r"what is (the meaning of |)life",
+    r"why (do|are) (we|humans)",
+    r"what (do you think|is your opinion)",
+    r"how (do i|should i|can i) (deal with|handle|cope|live)",
+    r"what('s| is) (love|happiness|success|friendship)",
+    r"(tell me|talk to me) about (yourself|you|life)",
+    r"who are you",
+    r"are you (real|alive|conscious|sentient)",
+    r"what (can you|do you) (do|think|feel)",
+    r"(advice|help me|guide me) (about|with|on) (life|career|relationship)",
+    r"i (feel|am feeling|'m feeling) (sad|happy|confused|lost|anxious)",
+    r"do you (believe|think)",
+]
+
+# Prompt optimization indicators - must be STRONG signals
+prompt_keywords = [
+    "prompt", "optimize", "generate prompt", "create prompt",
+    "write a prompt", "better prompt", "ai prompt",
+    "transform this", "enhance this", "refine prompt"
+]
+
+# Technical/coding indicators (likely prompt optimization)
+tech_keywords = [
+    "code", "function", "api", "database", "implement",
+    "algorithm", "script", "program", "debug", "error",
+    "python", "javascript", "react", "sql"
+]
+
+# User wants to ask about / analyze an attached document
+doc_question_patterns = [
+    "what", "explain", "summarize", "summary", "tell me about",
+    "read", "analyze", "review", "check", "look at",
+    "can you", "do you see", "is there", "find"
+]
+
+
+def _build_trie_pattern(words) -> str:
+    """Alternation regex shaped like a trie, so shared prefixes are matched once."""
+    trie: Dict[str, Any] = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = True
+
+    def build(node) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        group = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # Optional continuation - greedy, so the longest keyword at a position wins
+            return "(?:" + group + ")?"
+        return group
+
+    return build(trie)
+
+
+class _KeywordMatcher:
+    """Finds every keyword occurring anywhere in a text, overlaps included."""
+
+    def __init__(self, keywords):
+        vocabulary = sorted(set(keywords))
+        self.pattern = re.compile(_build_trie_pattern(vocabulary))
+        # Every keyword that also matched at the same position (its prefixes)
+        self.prefixes = {
+            word: frozenset(k for k in vocabulary if word.startswith(k))
+            for word in vocabulary
+        }
+
+    def find(self, text: str) -> FrozenSet[str]:
+        found = set()
+        search = self.pattern.search
+        pos = 0
+        while True:
+            match = search(text, pos)
+            if match is None:
+                break
+            found.update(self.prefixes[match.group()])
+            pos = match.start() + 1
+        return frozenset(found)
+
+
+# Compiled once at import
+_text_matcher = _KeywordMatcher(
+    coding_keywords + research_keywords + ds_keywords + ml_specific + complex_indicators
+    + [kw for kws in language_keywords.values() for kw in kws]
+)
+_user_matcher = _KeywordMatcher(
+    [kw for kws in task_keywords.values() for kw in kws]
+    + prompt_keywords + tech_keywords + doc_question_patterns
+)
+_code_pattern = re.compile(r'```|def |class |function |const |let |var |import |from ')
+_casual_pattern = re.compile("|".join(f"(?:{p})" for p in casual_patterns))
+_life_pattern = re.compile("|".join(f"(?:{p})" for p in life_patterns))
+_greetings = tuple(greetings)
+
+
+def _count(found: FrozenSet[str], keywords: List[str]) -> int:
+    return sum(1 for kw in keywords if kw in found)
+
+
+@lru_cache(maxsize=256)
+def user_keywords(user_input: str) -> FrozenSet[str]:
+    """Task / intent keywords present in the user's own message."""
+    return _user_matcher.find(user_input.lower())
+
+
+def detect_intent(user_input: str, context: str) -> str:
+    """
+    Detect what the user wants:
+    prompt_optimization, conversation or question.
+    """
+    text = user_input.lower().strip()
+
+    if text.startswith(_greetings):
+        return "conversation"
+
+    if _casual_pattern.search(text):
+        return "conversation"
+
+    if _life_pattern.search(text):
+        return "question"
+
+    found = user_keywords(user_input)
+    prompt_score = _count(found, prompt_keywords)
+    tech_score = _count(found, tech_keywords)
+
+    # Only if STRONG prompt optimization signals
+    if prompt_score >= 1:
+        return "prompt_optimization"
+
+    # If it's clearly technical with multiple signals
+    if tech_score >= 2:
+        return "prompt_optimization"
+
+    # If attached file, check what user wants to do with it
+    if context:
+        if any(p in found for p in doc_question_patterns):
+            return "question"  # Will use document Q&A mode
+
+        # Default to prompt optimization for documents without questions
+        return "prompt_optimization"
+
+    # Short to medium messages without tech keywords = conversation
+    return "conversation"
+
+
+def _score_domains(found: FrozenSet[str], text: str) -> Dict[str, int]:
+    domain_scores = {
+        "coding": _count(found, coding_keywords),
+        "research": _count(found, research_keywords),
+        "data_science": _count(found, ds_keywords) + 3 * _count(found, ml_specific),
+        "general": 0
+    }
+    if _code_pattern.search(text):
+        domain_scores["coding"] += 3
+    return domain_scores
+
+
+def _best(scores: Dict[str, int], default: str) -> str:
+    max_score = max(scores.values()) if scores else 0
+    if max_score == 0:
+        return default
+    for name, score in scores.items():
+        if score == max_score:
+            return name
+    return default
+
+
+def detect_task_type(user_input: str, domain: str) -> str:
+    """Pick the best-scoring task type of a domain for the user's message."""
+    possible_tasks = domain_tasks.get(domain, ["general_query"])
+    found = user_keywords(user_input)
+    task_scores = {task: _count(found, task_keywords.get(task, [])) for task in possible_tasks}
+    return _best(task_scores, possible_tasks[0] if possible_tasks else "general_query")
+
+
+def detect_programming_language(found: FrozenSet[str]) -> str:
+    """First language (in table order) with a keyword present."""
+    for lang, keywords in language_keywords.items():
+        if any(kw in found for kw in keywords):
+            return lang
+    return "python"
+
+
+def find_text_keywords(text: str) -> FrozenSet[str]:
+    """Domain / language / complexity keywords present in already-lowercased text."""
+    return _text_matcher.find(text)
+
+
+# Recent classify() results. Keyed on the context's length and (SipHash, cached
+# on the str object) hash rather than the context itself, so large attachments
+# are not kept alive by the cache.
+_CLASSIFY_CACHE_SIZE = 64
+_classify_cache: "OrderedDict[Tuple[str, int, int], Dict[str, Any]]" = OrderedDict()
+_classify_lock = threading.Lock()
+
+
+def classify(user_input: str, context: str) -> Dict[str, Any]:
+    """
+    Scan the request once and return every detection result together:
+    intent, domain (+ scores), programming language and complexity.
+    Cached, so repeated calls for the same request cost nothing; each caller
+    gets its own copy.
+    """
+    key = (user_input, len(context), hash(context))
+    with _classify_lock:
+        result = _classify_cache.get(key)
+        if result is not None:
+            _classify_cache.move_to_end(key)
+    if result is None:
+        result = _classify(user_input, context)
+        with _classify_lock:
+            _classify_cache[key] = result
+            if len(_classify_cache) > _CLASSIFY_CACHE_SIZE:
+                _classify_cache.popitem(last=False)
+    return dict(result, domain_scores=dict(result["domain_scores"]))
+
+
+def _classify(user_input: str, context: str) -> Dict[str, Any]:
+    text = (user_input + " " + context).lower()
+    found = _text_matcher.find(text)
+
+    domain_scores = _score_domains(found, text)
+
+    # Word count only matters up to 201 words - stop splitting there
+    word_count = len(text.split(None, 201))
+    complexity_score = _count(found, complex_indicators)
+    if word_count > 200 or complexity_score >= 3:
+        complexity = "high"
+    elif word_count > 50 or complexity_score >= 1:
+        complexity = "medium"
+    else:
+        complexity = "low"
+
+    return {
+        "intent": detect_intent(user_input, context),
+        "domain": _best(domain_scores, "general"),
+        "domain_scores": domain_scores,
+        "language": detect_programming_language(found),
+        "complexity": complexity,
+    }
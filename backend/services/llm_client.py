@@ -0,0 +1,87 @@
+"""
+Shared async Anthropic client for the whole process.
+
+All LLM calls go through a single AsyncAnthropic instance backed by one
+bounded httpx connection pool, so calls never block the event loop and
+the number of in-flight requests is capped by a semaphore.
+"""
+from typing import Any, AsyncIterator, Optional
+import asyncio
+import os
+
+import anthropic
+import httpx
+
+# Pool / concurrency configuration (environment overridable)
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "50"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "256"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+_client: Optional[anthropic.AsyncAnthropic] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_api_key: str = ""
+
+
+def configure(api_key: str) -> None:
+    """Set the API key used when the shared client is first created."""
+    global _api_key
+    _api_key = api_key
+
+
+def get_async_client() -> anthropic.AsyncAnthropic:
+    """Return the process-wide AsyncAnthropic client, creating it on first use."""
+    global _client
+    if _client is None:
+        http_client = anthropic.DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_MAX_KEEPALIVE,
+            ),
+        )
+        _client = anthropic.AsyncAnthropic(
+            api_key=_api_key or os.getenv("ANTHROPIC_API_KEY", ""),
+            http_client=http_client,
+            max_retries=LLM_MAX_RETRIES,
+            timeout=anthropic.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        )
+        print(f"[LUKTHAN] Async LLM client ready (pool={LLM_MAX_CONNECTIONS}, concurrency={LLM_MAX_CONCURRENCY}, timeout={LLM_TIMEOUT}s)")
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def create_message(**kwargs: Any) -> Any:
+    """
+    Non-blocking equivalent of ``client.messages.create``.
+    Waits for a concurrency slot, then awaits the shared async client.
+    """
+    async with _get_semaphore():
+        return await get_async_client().messages.create(**kwargs)
+
+
+async def stream_text(**kwargs: Any) -> AsyncIterator[str]:
+    """
+    Stream text deltas for a ``messages.create`` request.
+    Holds a concurrency slot for the lifetime of the stream.
+    """
+    async with _get_semaphore():
+        async with get_async_client().messages.stream(**kwargs) as stream:
+            async for text in stream.text_stream:
+                yield text
+
+
+async def close_async_client() -> None:
+    """Close the shared client and its connection pool (called on shutdown)."""
+    global _client, _semaphore
+    if _client is not None:
+        await _client.close()
+        _client = None
+    _semaphore = None
@@ -0,0 +1,211 @@
+"""
+OCR preprocessing and tiling for uploaded images.
+
+Phone screenshots are large and mostly empty space, and tesseract's cost
+grows with pixel count. Before OCR the image is:
+
+1. converted to grayscale and downscaled towards the preset's target DPI
+   (and a maximum side length),
+2. binarized with an Otsu threshold,
+3. cut into horizontal text bands at blank rows, so blank areas are never
+   sent to tesseract; bands taller than the tile height are split at their
+   least inked row,
+4. packed into tiles of up to tile_height rows (consecutive bands stacked
+   with a small gap, which keeps the per-call tesseract overhead down),
+5. OCR'd tile by tile on a small thread pool (tesseract runs as a
+   subprocess, so the threads run in parallel).
+
+Presets trade speed for accuracy; OCR_PRESET=off sends the image as uploaded.
+"""
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+
+try:
+    from PIL import Image, ImageOps
+    import pytesseract
+    OCR_SUPPORT = True
+except ImportError:
+    OCR_SUPPORT = False
+
+# OCR configuration (environment overridable)
+OCR_PRESET = os.getenv("OCR_PRESET", "balanced")  # fast | balanced | accurate | off
+OCR_TILE_WORKERS = int(os.getenv("OCR_TILE_WORKERS", "2"))
+# DPI assumed when an image carries none (screenshots usually don't)
+OCR_SOURCE_DPI = int(os.getenv("OCR_SOURCE_DPI", "220"))
+
+
+class OCRPreset:
+    """Preprocessing and tesseract settings for one quality/speed trade-off."""
+
+    def __init__(self, name: str, target_dpi: int, max_side: int, tile_height: int,
+                 min_gap: int, tesseract_config: str):
+        self.name = name
+        self.target_dpi = target_dpi
+        self.max_side = max_side
+        self.tile_height = tile_height  # Bands taller than this are split
+        self.min_gap = min_gap  # Blank rows (after scaling) that separate two bands
+        self.tesseract_config = tesseract_config
+
+
+OCR_PRESETS: Dict[str, OCRPreset] = {
+    "fast": OCRPreset("fast", target_dpi=120, max_side=1600, tile_height=600, min_gap=6,
+                      tesseract_config="--oem 1 --psm 6"),
+    "balanced": OCRPreset("balanced", target_dpi=160, max_side=2400, tile_height=900, min_gap=8,
+                          tesseract_config="--oem 1 --psm 6"),
+    "accurate": OCRPreset("accurate", target_dpi=300, max_side=4000, tile_height=1600, min_gap=12,
+                          tesseract_config="--oem 1 --psm 3"),
+}
+
+# Share of dark pixels in a row below which the row counts as blank
+_BLANK_ROW_INK = 0.002
+# Bands shorter than this (pixels) are specks, not text
+_MIN_BAND_HEIGHT = 6
+# Padding kept around each band so glyphs are not clipped
+_BAND_PADDING = 4
+
+
+def source_dpi(image: "Image.Image") -> float:
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] and dpi[0] > 1:
+        return float(dpi[0])
+    return float(OCR_SOURCE_DPI)
+
+
+def downscale(image: "Image.Image", preset: OCRPreset, dpi: float) -> "Image.Image":
+    """Scale down (never up) from dpi to the preset's target DPI and maximum side."""
+    scale = min(1.0, preset.target_dpi / dpi, preset.max_side / max(image.size))
+    if scale >= 0.98:
+        return image
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    return image.resize(size, Image.LANCZOS)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Threshold maximising between-class variance of the gray-level histogram."""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = histogram.sum()
+    levels = np.arange(256)
+    weight_dark = np.cumsum(histogram)
+    weight_light = total - weight_dark
+    sum_dark = np.cumsum(histogram * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    variance = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(variance))
+
+
+def grayscale(image: "Image.Image") -> "Image.Image":
+    """Upright 8-bit grayscale, with transparent areas flattened onto white."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P", "PA"):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, "white")
+        image = Image.alpha_composite(background, image)
+    return image.convert("L")
+
+
+def binarize(gray: "Image.Image") -> np.ndarray:
+    """Otsu threshold; returns a bool array where True = ink."""
+    gray = np.asarray(gray)
+    ink = gray <= otsu_threshold(gray)
+    # Dark-mode screenshots: the majority class is the background
+    if ink.mean() > 0.5:
+        ink = ~ink
+    return ink
+
+
+def text_bands(ink: np.ndarray, preset: OCRPreset) -> List[Tuple[int, int]]:
+    """(top, bottom) row ranges that contain ink, separated by at least min_gap blank rows."""
+    row_ink = ink.mean(axis=1)
+    inked = row_ink > _BLANK_ROW_INK
+    bands: List[Tuple[int, int]] = []
+    top: Optional[int] = None
+    blank_run = 0
+    for row, has_ink in enumerate(inked):
+        if has_ink:
+            if top is None:
+                top = row
+            blank_run = 0
+        elif top is not None:
+            blank_run += 1
+            if blank_run >= preset.min_gap:
+                bands.append((top, row - blank_run + 1))
+                top, blank_run = None, 0
+    if top is not None:
+        bands.append((top, len(inked) - blank_run))
+
+    tiles: List[Tuple[int, int]] = []
+    for top, bottom in bands:
+        if bottom - top < _MIN_BAND_HEIGHT:
+            continue
+        tiles.extend(_split_band(row_ink, top, bottom, preset.tile_height))
+    return tiles
+
+
+def _split_band(row_ink: np.ndarray, top: int, bottom: int, tile_height: int) -> List[Tuple[int, int]]:
+    """Split a tall band at its least inked rows (between text lines) into tiles of at most tile_height."""
+    tiles = []
+    while bottom - top > tile_height:
+        # Look for the cut in the last quarter of the tile so tiles stay large
+        window_start = top + tile_height * 3 // 4
+        window = row_ink[window_start:top + tile_height]
+        cut = window_start + int(np.argmin(window))
+        tiles.append((top, cut))
+        top = cut
+    tiles.append((top, bottom))
+    return tiles
+
+
+def preprocess(image: "Image.Image", preset: OCRPreset) -> List["Image.Image"]:
+    """Downscale, binarize and pack the text bands of an image into tiles (top to bottom)."""
+    dpi = source_dpi(image)
+    ink = binarize(downscale(grayscale(image), preset, dpi))
+    height, width = ink.shape
+    # Ink is black on white for tesseract
+    binary = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+
+    groups: List[List[Tuple[int, int]]] = []
+    group_height = 0
+    for top, bottom in text_bands(ink, preset):
+        top, bottom = max(0, top - _BAND_PADDING), min(height, bottom + _BAND_PADDING)
+        band_height = bottom - top + preset.min_gap
+        if groups and group_height + band_height <= preset.tile_height:
+            groups[-1].append((top, bottom))
+            group_height += band_height
+        else:
+            groups.append([(top, bottom)])
+            group_height = band_height
+
+    tiles = []
+    for bands in groups:
+        tile = Image.new("L", (width, sum(b - t + preset.min_gap for t, b in bands)), 255)
+        y = 0
+        for top, bottom in bands:
+            tile.paste(binary.crop((0, top, width, bottom)), (0, y))
+            y += bottom - top + preset.min_gap
+        tiles.append(tile)
+    return tiles
+
+
+def ocr_image(image: "Image.Image", preset_name: str = OCR_PRESET, workers: int = OCR_TILE_WORKERS) -> str:
+    """OCR an image with a preset; "off" runs tesseract on the image as uploaded."""
+    preset = OCR_PRESETS.get(preset_name)
+    if preset is None:
+        return pytesseract.image_to_string(image).strip()
+
+    tiles = preprocess(image, preset)
+    if not tiles:
+        return ""
+
+    def read(tile: "Image.Image") -> str:
+        return pytesseract.image_to_string(tile, config=preset.tesseract_config).strip()
+
+    if workers > 1 and len(tiles) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            texts = list(pool.map(read, tiles))
+    else:
+        texts = [read(tile) for tile in tiles]
+    return "\n".join(text for text in texts if text)
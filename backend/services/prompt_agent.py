@@ -1,79 +1,27 @@
-from typing import Dict, Any, Optional, List
-import anthropic
+from typing import Dict, Any, Optional, List, AsyncIterator, Awaitable, Deque, Tuple
 import os
 import re
 import json
 import asyncio
 from datetime import datetime
 from dotenv import load_dotenv
-
-# Domain to task type mapping (inline definitions)
-domain_tasks = {
-    "coding": ["code_generation", "debugging", "code_review", "architecture", "api_design"],
-    "research": ["literature_review", "paper_writing", "methodology", "explanation"],
-    "data_science": ["data_analysis", "ml_model", "data_visualization"],
-    "general": ["general_query", "writing_assistance", "brainstorming"]
-}
-
-# Task type keywords for detection
-task_keywords = {
-    "code_generation": ["write", "create", "implement", "build", "develop", "code", "function", "class", "program"],
-    "debugging": ["debug", "fix", "error", "bug", "issue", "problem", "not working", "crash", "exception"],
-    "code_review": ["review", "check", "analyze code", "improve", "optimize", "refactor"],
-    "architecture": ["design", "architect", "structure", "system", "scalable", "microservice"],
-    "api_design": ["api", "endpoint", "rest", "graphql", "route", "request", "response"],
-    "literature_review": ["literature", "review", "papers", "research", "studies", "academic"],
-    "paper_writing": ["paper", "thesis", "dissertation", "essay", "article", "publication"],
-    "methodology": ["method", "methodology", "approach", "procedure", "study design"],
-    "explanation": ["explain", "what is", "how does", "understand", "concept", "theory"],
-    "data_analysis": ["analyze", "data", "statistics", "trends", "patterns", "insights",
-                      "csv", "clean", "cleaning", "missing", "null", "preprocess", "preprocessing",
-                      "eda", "exploratory", "leakage", "leak", "correlation", "distribution"],
-    "ml_model": ["machine learning", "ml", "model", "predict", "classification", "regression", "neural",
-                 "lstm", "xgboost", "random forest", "gradient boosting", "lightgbm", "catboost",
-                 "train", "training", "validation", "hyperparameter", "forecast", "forecasting",
-                 "deep learning", "tensorflow", "pytorch", "keras", "sklearn", "scikit"],
-    "data_visualization": ["visualize", "chart", "graph", "plot", "dashboard", "visualization"],
-    "general_query": ["help", "question", "information", "tell me", "what", "how", "why"],
-    "writing_assistance": ["write", "draft", "content", "copy", "blog", "email", "message"],
-    "brainstorming": ["ideas", "brainstorm", "suggest", "creative", "options", "possibilities"]
-}
-
-# Programming language detection keywords
-language_keywords = {
-    "python": ["python", "py", "django", "flask", "pandas", "numpy", "pytorch", "tensorflow"],
-    "javascript": ["javascript", "js", "node", "react", "vue", "angular", "express", "npm"],
-    "typescript": ["typescript", "ts", "angular", "nest", "deno"],
-    "java": ["java", "spring", "maven", "gradle", "jvm", "kotlin"],
-    "csharp": ["c#", "csharp", ".net", "dotnet", "asp.net", "unity"],
-    "cpp": ["c++", "cpp", "cmake", "qt", "boost"],
-    "go": ["golang", "go ", "gin", "fiber"],
-    "rust": ["rust", "cargo", "tokio"],
-    "php": ["php", "laravel", "symfony", "wordpress"],
-    "ruby": ["ruby", "rails", "sinatra"],
-    "swift": ["swift", "ios", "swiftui", "uikit"],
-    "sql": ["sql", "mysql", "postgresql", "database", "query", "select", "insert"]
-}
-
-# Minimal fallback template for prompt generation (used when AI optimization fails)
-templates = {
-    "general_query": """You are a knowledgeable assistant providing comprehensive and accurate information.
-
-**Task:** {user_request}
-
-**Response Guidelines:**
-1. Provide accurate, well-researched information
-2. Structure the response clearly
-3. Include relevant examples
-4. Acknowledge limitations or uncertainties
-
-**Context:** {context}
-
-**Output Format:**
-- Direct answer to the query
-- Supporting details and examples
-- Practical applications"""
-}
+from services import llm_client
+from services.llm_client import create_message, stream_text
+from services.response_cache import response_cache, make_cache_key
+from services.semantic_index import find_similar
+from services.context_budget import fit_context_async
+from services.conversation_store import conversation_store
+from services.keyword_classifier import (
+    domain_tasks,
+    task_keywords,
+    classify,
+    detect_task_type,
+    detect_programming_language,
+    find_text_keywords,
+    user_keywords,
+)
+from services.prompt_templates import render_template
+from services.prompt_formatters import format_for_target_ai, adjust_for_expertise
 
 # Load environment variables from the correct path
 import pathlib
@@ -95,9 +43,29 @@ if not ANTHROPIC_API_KEY:
     except Exception:
         pass  # Will be caught when trying to use the API
 
+# Share the key with the process-wide async client
+llm_client.configure(ANTHROPIC_API_KEY)
+
 # Claude model configuration (configurable via environment variable)
 CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-haiku-20241022")
 
+# Default execution mode: "sequential" or "pipelined" (overridable per request via settings["execution_mode"])
+DEFAULT_EXECUTION_MODE = os.getenv("EXECUTION_MODE", "sequential")
+
+# Local template generation: "off", "simple" (low-complexity requests never call the LLM)
+# or "always" (fully offline). Overridable per request via settings["local_generation"]
+LOCAL_GENERATION = os.getenv("LOCAL_GENERATION", "off")
+
+# Display names for detected programming languages in templates
+LANGUAGE_NAMES = {
+    "javascript": "JavaScript",
+    "typescript": "TypeScript",
+    "csharp": "C#",
+    "cpp": "C++",
+    "php": "PHP",
+    "sql": "SQL",
+}
+
 # Domain-specific expert consultant prompts for GUIDED mode
 EXPERT_CONSULTANTS = {
     "coding": {
@@ -211,6 +179,62 @@ Keep responses SHORT (2-3 sentences max) and end with ONE clear question.""",
 }
 
 
+async def _gather_or_cancel(*aws: Awaitable[Any]) -> List[Any]:
+    """asyncio.gather that cancels the other calls as soon as one fails, so no LLM call runs for a discarded result."""
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+class _ThinkingStepParser:
+    """
+    Incrementally extracts thinking-step objects from a streamed JSON array.
+    Each complete top-level {...} inside the array is parsed as soon as it closes.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.start = -1
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        self.buffer += text
+        steps = []
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif char == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    try:
+                        step = json.loads(self.buffer[self.start:self.pos + 1])
+                        if isinstance(step, dict):
+                            steps.append(step)
+                    except json.JSONDecodeError:
+                        pass
+            self.pos += 1
+        return steps
+
+
 class IntelligentAgent:
     """
     An intelligent AI agent that can:
@@ -221,11 +245,8 @@ class IntelligentAgent:
     """
 
     def __init__(self):
-        # Use Claude API with configurable model
-        self.client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
         # Use model from environment variable
         self.model = CLAUDE_MODEL
-        self.conversation_history: List[Dict[str, str]] = []
         print(f"[LUKTHAN] IntelligentAgent initialized with model: {self.model}")
 
     async def process_message(
@@ -233,50 +254,119 @@ class IntelligentAgent:
         user_input: str,
         file_content: Optional[str] = None,
         file_type: Optional[str] = None,
-        settings: Optional[Dict[str, Any]] = None
+        settings: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Main entry point - intelligently process any user message.
         Detects intent and responds appropriately.
         Supports both DIRECT and GUIDED modes.
+        A new conversation_id is issued when the client does not send one.
+        """
+        settings = settings or {}
+        context = file_content or ""
+        conversation_id = conversation_id or conversation_store.new_id()
+
+        async with conversation_store.session(conversation_id) as history:
+            if self._is_pipelined(settings):
+                # Pipelined: thinking and the main completion run concurrently
+                thinking_steps, result = await _gather_or_cancel(
+                    self._generate_thinking(user_input, context, settings),
+                    self._route_message(user_input, context, settings, [], history)
+                )
+            else:
+                # Step 1: Generate thinking process
+                thinking_steps = await self._generate_thinking(user_input, context, settings)
+                result = await self._route_message(user_input, context, settings, thinking_steps, history)
+
+        result["thinking"] = thinking_steps
+        result["conversation_id"] = conversation_id
+        return result
+
+    async def stream_message(
+        self,
+        user_input: str,
+        file_content: Optional[str] = None,
+        file_type: Optional[str] = None,
+        settings: Optional[Dict[str, Any]] = None,
+        conversation_id: Optional[str] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of process_message.
+        Yields ("thinking", step) as each thinking step parses, ("optimized_prompt", delta)
+        while a direct-mode prompt is generated, and finally ("result", result_dict).
         """
         settings = settings or {}
         context = file_content or ""
+        conversation_id = conversation_id or conversation_store.new_id()
+
+        thinking_steps: List[Dict[str, str]] = []
+        async for step in self._stream_thinking(user_input, context, settings):
+            thinking_steps.append(step)
+            yield "thinking", step
+
+        if settings.get("mode", "direct") == "direct" and not self._is_simple_greeting(user_input):
+            print(f"[LUKTHAN] DIRECT MODE - Streaming optimized prompt")
+            result: Dict[str, Any] = {}
+            async for event, data in self._stream_optimize_prompt(user_input, context, settings):
+                if event == "result":
+                    result = data
+                else:
+                    yield event, data
+            result["intent"] = "prompt_optimization"
+        else:
+            # Guided / conversational replies are short - no token streaming needed
+            async with conversation_store.session(conversation_id) as history:
+                result = await self._route_message(user_input, context, settings, thinking_steps, history)
+
+        result["thinking"] = thinking_steps
+        result["conversation_id"] = conversation_id
+        yield "result", result
+
+    def _is_simple_greeting(self, user_input: str) -> bool:
+        """Check if the message is just a greeting (hi, hello, thanks, etc.)."""
+        simple_greetings = ["hi", "hello", "hey", "thanks", "thank you", "bye", "goodbye"]
+        return user_input.lower().strip() in simple_greetings or len(user_input.split()) <= 3 and any(g in user_input.lower() for g in simple_greetings)
+
+    def _is_pipelined(self, settings: Dict[str, Any]) -> bool:
+        """Check whether this request should use the pipelined execution mode."""
+        return settings.get("execution_mode", DEFAULT_EXECUTION_MODE) == "pipelined"
+
+    async def _route_message(
+        self,
+        user_input: str,
+        context: str,
+        settings: Dict[str, Any],
+        thinking_steps: List[Dict],
+        history: Deque[Dict[str, str]]
+    ) -> Dict[str, Any]:
+        """Detect intent and dispatch to the matching response handler."""
         mode = settings.get("mode", "direct")
         domain = settings.get("domain", "coding")
 
-        # Step 1: Generate thinking process
-        thinking_steps = await self._generate_thinking(user_input, context, settings)
-
         # Step 2: Detect user intent
         intent = self._detect_intent(user_input, context)
 
         # Step 3: Check if GUIDED mode is active - ALWAYS use guided flow when mode is "guided"
         if mode == "guided":
             # Use domain-specific expert consultant (ignores intent detection)
-            result = await self._guided_expert_flow(user_input, context, settings, thinking_steps, domain)
+            result = await self._guided_expert_flow(user_input, context, settings, thinking_steps, domain, history)
             result["intent"] = "guided"
-            result["thinking"] = thinking_steps
             return result
 
         # Step 4: DIRECT MODE - Always optimize prompts unless it's a simple greeting
         if mode == "direct":
             # Check if it's just a greeting (hi, hello, thanks, etc.)
-            simple_greetings = ["hi", "hello", "hey", "thanks", "thank you", "bye", "goodbye"]
-            is_simple_greeting = user_input.lower().strip() in simple_greetings or len(user_input.split()) <= 3 and any(g in user_input.lower() for g in simple_greetings)
-
-            if is_simple_greeting:
+            if self._is_simple_greeting(user_input):
                 # Only for simple greetings, have a brief conversation
-                result = await self._have_conversation(user_input, thinking_steps, context)
+                result = await self._have_conversation(user_input, thinking_steps, history, context)
                 result["intent"] = "conversation"
-                result["thinking"] = thinking_steps
                 return result
             else:
                 # DIRECT MODE: Always optimize prompts without asking questions
                 print(f"[LUKTHAN] DIRECT MODE - Optimizing prompt directly (no questions)")
                 result = await self._optimize_prompt(user_input, context, settings, thinking_steps)
                 result["intent"] = "prompt_optimization"
-                result["thinking"] = thinking_steps
                 return result
 
         # Step 5: Fallback for any other mode - use intent-based routing
@@ -284,28 +374,24 @@ class IntelligentAgent:
             # User wants to optimize a prompt
             result = await self._optimize_prompt(user_input, context, settings, thinking_steps)
             result["intent"] = "prompt_optimization"
-            result["thinking"] = thinking_steps
             return result
 
         elif intent == "conversation":
             # User wants to have a conversation (pass context for document analysis)
-            result = await self._have_conversation(user_input, thinking_steps, context)
+            result = await self._have_conversation(user_input, thinking_steps, history, context)
             result["intent"] = "conversation"
-            result["thinking"] = thinking_steps
             return result
 
         elif intent == "question":
             # User is asking a question (life, philosophy, general) - may include document
             result = await self._answer_question(user_input, thinking_steps, context)
             result["intent"] = "question"
-            result["thinking"] = thinking_steps
             return result
 
         else:
             # Hybrid - try to help in the most appropriate way
             result = await self._smart_response(user_input, context, settings, thinking_steps)
             result["intent"] = "hybrid"
-            result["thinking"] = thinking_steps
             return result
 
     async def _guided_expert_flow(
@@ -314,7 +400,8 @@ class IntelligentAgent:
         context: str,
         settings: Dict[str, Any],
         thinking_steps: List[Dict],
-        domain: str
+        domain: str,
+        history: Deque[Dict[str, str]]
     ) -> Dict[str, Any]:
         """
         Guided expert consultant flow - uses REAL AI to have natural conversations
@@ -326,21 +413,21 @@ class IntelligentAgent:
             expert_role = expert_config["role"]
 
             # Calculate conversation step (number of exchanges)
-            conversation_step = len(self.conversation_history) // 2
+            conversation_step = len(history) // 2
 
             print(f"[LUKTHAN] === GUIDED MODE (AI-Powered) ===")
-            print(f"[LUKTHAN] Domain: {domain}, Step: {conversation_step}, History: {len(self.conversation_history)} messages")
+            print(f"[LUKTHAN] Domain: {domain}, Step: {conversation_step}, History: {len(history)} messages")
             print(f"[LUKTHAN] User input: {user_input[:50]}...")
 
             # Check if we should generate final prompt (ONLY on explicit request)
-            should_generate = self._should_generate_final_prompt(user_input, self.conversation_history)
+            should_generate = self._should_generate_final_prompt(user_input, history)
 
             if should_generate and conversation_step >= 2:
                 print(f"[LUKTHAN] >>> GENERATING FINAL PROMPT <<<")
-                return await self._generate_final_guided_prompt(context, settings, thinking_steps, domain)
+                return await self._generate_final_guided_prompt(context, settings, thinking_steps, domain, history)
 
             # Store user message in history
-            self.conversation_history.append({
+            history.append({
                 "role": "user",
                 "content": user_input,
                 "timestamp": datetime.now().isoformat()
@@ -378,7 +465,7 @@ class IntelligentAgent:
 
             # Build conversation history for Claude
             history_text = ""
-            for msg in self.conversation_history[-8:]:  # Last 8 messages for context
+            for msg in list(history)[-8:]:  # Last 8 messages for context
                 role = "User" if msg["role"] == "user" else "You"
                 history_text += f"{role}: {msg['content']}\n"
 
@@ -416,8 +503,7 @@ CRITICAL RULES:
 
             print(f"[LUKTHAN] Calling Claude for natural guided response...")
 
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
+            response = await create_message(
                 model=self.model,
                 max_tokens=150,  # Keep responses short
                 system=system_prompt,
@@ -428,7 +514,7 @@ CRITICAL RULES:
             print(f"[LUKTHAN] AI Guided response: {message[:100]}...")
 
             # Store assistant response in history
-            self.conversation_history.append({
+            history.append({
                 "role": "assistant",
                 "content": message,
                 "timestamp": datetime.now().isoformat()
@@ -463,7 +549,7 @@ CRITICAL RULES:
                 "metadata": {"error": str(e), "conversation_step": 1}
             }
 
-    def _should_generate_final_prompt(self, user_input: str, history: List[Dict]) -> bool:
+    def _should_generate_final_prompt(self, user_input: str, history: Deque[Dict[str, str]]) -> bool:
         """Check if user EXPLICITLY requested to generate the final prompt."""
         text = user_input.lower().strip()
 
@@ -487,14 +573,15 @@ CRITICAL RULES:
         context: str,
         settings: Dict[str, Any],
         thinking_steps: List[Dict],
-        domain: str
+        domain: str,
+        history: Deque[Dict[str, str]]
     ) -> Dict[str, Any]:
         """Generate the final optimized prompt based on guided conversation."""
         try:
             # Compile all gathered information from conversation
             conversation_summary = "\n".join([
                 f"{'User' if msg['role'] == 'user' else 'Expert'}: {msg['content']}"
-                for msg in self.conversation_history[-12:]
+                for msg in list(history)[-12:]
             ])
 
             system_prompt = f"""Based on the conversation below, generate an OPTIMIZED AI PROMPT.
@@ -509,8 +596,7 @@ Generate a comprehensive, well-structured prompt that incorporates all the infor
 The prompt should be ready to use directly in {settings.get('target_ai', 'ChatGPT')}.
 Output ONLY the prompt, no explanations."""
 
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
+            response = await create_message(
                 model=self.model,
                 max_tokens=2000,
                 system=system_prompt,
@@ -521,7 +607,8 @@ Output ONLY the prompt, no explanations."""
             print(f"[LUKTHAN] Generated final prompt from guided session ({len(optimized_prompt)} chars)")
 
             # Clear conversation history for next session
-            self.conversation_history = []
+            exchanges = len(history) // 2
+            history.clear()
 
             return {
                 "optimized_prompt": optimized_prompt,
@@ -537,7 +624,7 @@ Output ONLY the prompt, no explanations."""
                 "metadata": {
                     "mode": "guided",
                     "generated_from": "conversation",
-                    "exchanges": len(self.conversation_history) // 2
+                    "exchanges": exchanges
                 }
             }
 
@@ -554,119 +641,12 @@ Output ONLY the prompt, no explanations."""
         - prompt_optimization: User wants to create/improve a prompt for AI
         - conversation: User wants to chat casually
         - question: User is asking about life, philosophy, or general knowledge
-        - hybrid: Mixed intent or unclear
         """
-        text = user_input.lower().strip()
-
-        # Greeting patterns (conversation)
-        greetings = ["hello", "hi", "hey", "bonjour", "salut", "coucou", "yo", "sup",
-                     "good morning", "good evening", "good afternoon", "what's up",
-                     "how are you", "comment ça va", "ça va", "how's it going"]
-
-        if any(text.startswith(g) or text == g for g in greetings):
-            return "conversation"
-
-        # Casual conversation patterns - EXPANDED
-        casual_patterns = [
-            r"^(thanks|thank you|merci)",
-            r"^(okay|ok|alright|sure|yes|no|yep|nope)",
-            r"^(nice|cool|great|awesome|amazing)",
-            r"(how's your|what's your) (day|name)",
-            r"^(lol|haha|😂|😊|👋)",
-            r"(bye|goodbye|see you|later|à bientôt)",
-            r"^just (saying|asking|wondering|curious)",
-            r"^i'?m (doing|feeling|good|fine|great|okay|well)",
-            r"(can you|do you) speak",
-            r"(what|which) language",
-            r"^(that's|thats) (cool|nice|great|interesting|funny)",
-            r"^(really|wow|oh|hm+|ah)",
-            r"(tell me (about yourself|a joke|something))",
-            r"^(yeah|yea|yup|nah)",
-            r"what do you (like|think|prefer)",
-            r"^(hows|how is) (it|life|everything)",
-        ]
-
-        for pattern in casual_patterns:
-            if re.search(pattern, text):
-                return "conversation"
-
-        # Life/philosophy questions
-        life_patterns = [
-            r"what is (the meaning of |)life",
-            r"why (do|are) (we|humans)",
-            r"what (do you think|is your opinion)",
-            r"how (do i|should i|can i) (deal with|handle|cope|live)",
-            r"what('s| is) (love|happiness|success|friendship)",
-            r"(tell me|talk to me) about (yourself|you|life)",
-            r"who are you",
-            r"are you (real|alive|conscious|sentient)",
-            r"what (can you|do you) (do|think|feel)",
-            r"(advice|help me|guide me) (about|with|on) (life|career|relationship)",
-            r"i (feel|am feeling|'m feeling) (sad|happy|confused|lost|anxious)",
-            r"do you (believe|think)",
-        ]
-
-        for pattern in life_patterns:
-            if re.search(pattern, text):
-                return "question"
-
-        # Prompt optimization indicators - must be STRONG signals
-        prompt_keywords = [
-            "prompt", "optimize", "generate prompt", "create prompt",
-            "write a prompt", "better prompt", "ai prompt",
-            "transform this", "enhance this", "refine prompt"
-        ]
-
-        # Technical/coding indicators (likely prompt optimization)
-        tech_keywords = [
-            "code", "function", "api", "database", "implement",
-            "algorithm", "script", "program", "debug", "error",
-            "python", "javascript", "react", "sql"
-        ]
-
-        prompt_score = sum(1 for kw in prompt_keywords if kw in text)
-        tech_score = sum(1 for kw in tech_keywords if kw in text)
-
-        # Only if STRONG prompt optimization signals
-        if prompt_score >= 1:
-            return "prompt_optimization"
-
-        # If it's clearly technical with multiple signals
-        if tech_score >= 2:
-            return "prompt_optimization"
-
-        # If attached file, check what user wants to do with it
-        if context:
-            # User wants to ask about / analyze the document
-            doc_question_patterns = [
-                "what", "explain", "summarize", "summary", "tell me about",
-                "read", "analyze", "review", "check", "look at",
-                "can you", "do you see", "is there", "find"
-            ]
-            if any(p in text for p in doc_question_patterns):
-                return "question"  # Will use document Q&A mode
+        return classify(user_input, context)["intent"]
 
-            # Default to prompt optimization for documents without questions
-            return "prompt_optimization"
-
-        # Short to medium messages without tech keywords = conversation
-        if len(text.split()) < 15 and tech_score == 0:
-            return "conversation"
-
-        # Default to conversation for ambiguous cases (not hybrid)
-        return "conversation"
-
-    async def _generate_thinking(self, user_input: str, context: str, settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
-        """Generate visible thinking/reasoning steps using AI."""
-        thinking_steps = []
-        settings = settings or {}
-
-        # Detect intent first (needed for routing)
-        intent = self._detect_intent(user_input, context)
-
-        try:
-            # Use Claude to generate real thinking/analysis
-            system_prompt = """You are LUKTHAN's internal reasoning engine. Analyze the user's input and generate a concise thinking process.
+    def _build_thinking_request(self, user_input: str, attached: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Claude request used to generate thinking steps."""
+        system_prompt = """You are LUKTHAN's internal reasoning engine. Analyze the user's input and generate a concise thinking process.
 
 Output exactly 4-5 short thinking steps in JSON array format. Each step should have:
 - "step": A short title (2-3 words)
@@ -686,21 +666,38 @@ Example format:
 
 Return ONLY the JSON array, no other text."""
 
-            user_message = f"User input: {user_input[:500]}"
-            if context:
-                user_message += f"\n\nAttached context: {context[:300]}..."
-            if settings:
-                user_message += f"\n\nSettings: Target AI={settings.get('target_ai', 'ChatGPT')}, Level={settings.get('expertise_level', 'Professional')}"
+        user_message = f"User input: {user_input[:500]}"
+        if attached:
+            user_message += f"\n\nAttached context: {attached}"
+        if settings:
+            user_message += f"\n\nSettings: Target AI={settings.get('target_ai', 'ChatGPT')}, Level={settings.get('expertise_level', 'Professional')}"
 
+        return {
+            "model": self.model,
+            "max_tokens": 800,
+            "system": system_prompt,
+            "messages": [{"role": "user", "content": user_message}]
+        }
+
+    async def _generate_thinking(self, user_input: str, context: str, settings: Optional[Dict[str, Any]] = None) -> List[Dict[str, str]]:
+        """Generate visible thinking/reasoning steps using AI."""
+        settings = settings or {}
+
+        if self._use_local_generation(user_input, context, settings):
+            return self._fallback_thinking(user_input, context, settings)
+
+        cache_key = make_cache_key("thinking", user_input, context, settings, self.model)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            print(f"[LUKTHAN] Thinking steps served from cache")
+            return cached
+
+        try:
+            # Use Claude to generate real thinking/analysis
             print(f"[LUKTHAN] Generating AI thinking steps...")
 
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
-                model=self.model,
-                max_tokens=800,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_message}]
-            )
+            attached = await fit_context_async(context, user_input, "thinking")
+            response = await create_message(**self._build_thinking_request(user_input, attached, settings))
 
             # Parse the JSON response
             thinking_json = response.content[0].text.strip()
@@ -713,54 +710,95 @@ Return ONLY the JSON array, no other text."""
 
             thinking_steps = json.loads(thinking_json)
             print(f"[LUKTHAN] Generated {len(thinking_steps)} AI thinking steps")
+            await response_cache.set(cache_key, thinking_steps)
             return thinking_steps
 
         except Exception as e:
             print(f"[LUKTHAN] AI thinking generation failed: {e}, using fallback")
+            return self._fallback_thinking(user_input, context, settings)
+
+    async def _stream_thinking(self, user_input: str, context: str, settings: Dict[str, Any]) -> AsyncIterator[Dict[str, str]]:
+        """Streaming variant of _generate_thinking - yields each step as soon as it parses."""
+        if self._use_local_generation(user_input, context, settings):
+            for step in self._fallback_thinking(user_input, context, settings):
+                yield step
+            return
+
+        cache_key = make_cache_key("thinking", user_input, context, settings, self.model)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            print(f"[LUKTHAN] Thinking steps served from cache")
+            for step in cached:
+                yield step
+            return
+
+        parser = _ThinkingStepParser()
+        steps: List[Dict[str, str]] = []
 
-            # Fallback to rule-based thinking if AI fails
-            thinking_steps.append({
-                "step": "Understanding",
-                "thought": f"Analyzing: '{user_input[:80]}{'...' if len(user_input) > 80 else ''}'",
-                "icon": "🧠"
-            })
+        try:
+            print(f"[LUKTHAN] Streaming AI thinking steps...")
+            attached = await fit_context_async(context, user_input, "thinking")
+            async for text in stream_text(**self._build_thinking_request(user_input, attached, settings)):
+                for step in parser.feed(text):
+                    steps.append(step)
+                    yield step
+            if steps:
+                await response_cache.set(cache_key, steps)
+        except Exception as e:
+            print(f"[LUKTHAN] AI thinking stream failed: {e}")
 
-            intent_description = {
-                "prompt_optimization": "User wants to create or optimize an AI prompt",
-                "conversation": "User wants to have a friendly conversation",
-                "question": "User is asking a thoughtful question",
-                "hybrid": "Multifaceted request requiring comprehensive response"
-            }
+        if not steps:
+            print(f"[LUKTHAN] No thinking steps parsed from stream, using fallback")
+            for step in self._fallback_thinking(user_input, context, settings):
+                yield step
 
-            thinking_steps.append({
-                "step": "Intent Analysis",
-                "thought": intent_description.get(intent, "Processing the request..."),
-                "icon": "🔍"
-            })
+    def _fallback_thinking(self, user_input: str, context: str, settings: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Rule-based thinking steps used when AI generation fails."""
+        thinking_steps = []
+        intent = self._detect_intent(user_input, context)
 
-            if intent == "prompt_optimization":
-                domain = self._detect_domain(user_input, context)
-                target_ai = settings.get("target_ai", "ChatGPT (GPT-4)")
-                thinking_steps.append({
-                    "step": "Domain Detection",
-                    "thought": f"Identified domain: {domain.replace('_', ' ').title()}",
-                    "icon": "🎯"
-                })
-                thinking_steps.append({
-                    "step": "Optimization",
-                    "thought": f"Tailoring prompt structure for {target_ai}",
-                    "icon": "🤖"
-                })
+        thinking_steps.append({
+            "step": "Understanding",
+            "thought": f"Analyzing: '{user_input[:80]}{'...' if len(user_input) > 80 else ''}'",
+            "icon": "🧠"
+        })
+
+        intent_description = {
+            "prompt_optimization": "User wants to create or optimize an AI prompt",
+            "conversation": "User wants to have a friendly conversation",
+            "question": "User is asking a thoughtful question",
+            "hybrid": "Multifaceted request requiring comprehensive response"
+        }
 
+        thinking_steps.append({
+            "step": "Intent Analysis",
+            "thought": intent_description.get(intent, "Processing the request..."),
+            "icon": "🔍"
+        })
+
+        if intent == "prompt_optimization":
+            domain = self._detect_domain(user_input, context)
+            target_ai = settings.get("target_ai", "ChatGPT (GPT-4)")
             thinking_steps.append({
-                "step": "Generating",
-                "thought": "Crafting the optimal response...",
-                "icon": "✨"
+                "step": "Domain Detection",
+                "thought": f"Identified domain: {domain.replace('_', ' ').title()}",
+                "icon": "🎯"
+            })
+            thinking_steps.append({
+                "step": "Optimization",
+                "thought": f"Tailoring prompt structure for {target_ai}",
+                "icon": "🤖"
             })
 
-            return thinking_steps
+        thinking_steps.append({
+            "step": "Generating",
+            "thought": "Crafting the optimal response...",
+            "icon": "✨"
+        })
 
-    async def _have_conversation(self, user_input: str, thinking_steps: List[Dict], context: str = "") -> Dict[str, Any]:
+        return thinking_steps
+
+    async def _have_conversation(self, user_input: str, thinking_steps: List[Dict], history: Deque[Dict[str, str]], context: str = "") -> Dict[str, Any]:
         """Handle casual conversation naturally using Claude API. Also handles document analysis."""
         try:
             # Check if there's a document attached
@@ -782,9 +820,10 @@ DOCUMENT ANALYSIS GUIDELINES:
 Be personable and conversational while being informative."""
 
                 # Build message with document context
-                user_message = f"User says: {user_input}\n\n--- DOCUMENT CONTENT ---\n{context[:4000]}"
-                if len(context) > 4000:
-                    user_message += f"\n... [Document truncated, {len(context)} total characters]"
+                document = await fit_context_async(context, user_input, "document")
+                user_message = f"User says: {user_input}\n\n--- DOCUMENT CONTENT ---\n{document}"
+                if document is not context:
+                    user_message += f"\n\n[Only the parts most relevant to the message are shown, {len(context)} total characters]"
 
                 print(f"[LUKTHAN] Document analysis mode - {len(context)} chars of content")
             else:
@@ -805,11 +844,9 @@ You can discuss any topic - life, philosophy, ideas, jokes, or just chat casuall
             if not ANTHROPIC_API_KEY:
                 raise ValueError("ANTHROPIC_API_KEY is not set!")
 
-            # Create client and make API call
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-
+            # Make API call through the shared async client
             print(f"[LUKTHAN] Sending request to Claude {self.model}...")
-            response = client.messages.create(
+            response = await create_message(
                 model=self.model,
                 max_tokens=1000 if has_document else 500,  # More tokens for document analysis
                 system=system_prompt,
@@ -821,12 +858,12 @@ You can discuss any topic - life, philosophy, ideas, jokes, or just chat casuall
             print(f"[LUKTHAN] Response: {message[:200]}...")
 
             # Store in conversation history
-            self.conversation_history.append({
+            history.append({
                 "role": "user",
                 "content": user_input,
                 "timestamp": datetime.now().isoformat()
             })
-            self.conversation_history.append({
+            history.append({
                 "role": "assistant",
                 "content": message,
                 "timestamp": datetime.now().isoformat()
@@ -840,7 +877,7 @@ You can discuss any topic - life, philosophy, ideas, jokes, or just chat casuall
                 "suggestions": [],  # No suggestions for casual conversation - keep it clean
                 "metadata": {
                     "mood": "friendly",
-                    "conversation_length": len(self.conversation_history)
+                    "conversation_length": len(history)
                 }
             }
 
@@ -880,7 +917,8 @@ GUIDELINES:
 - Be accurate and cite specific parts of the document when relevant
 - Be conversational but informative."""
 
-                user_message = f"User asks: {user_input}\n\n--- DOCUMENT CONTENT ---\n{context[:4000]}"
+                document = await fit_context_async(context, user_input, "document")
+                user_message = f"User asks: {user_input}\n\n--- DOCUMENT CONTENT ---\n{document}"
                 print(f"[LUKTHAN] Document Q&A mode - {len(context)} chars")
             else:
                 system_prompt = """You are LUKTHAN, a wise and thoughtful AI assistant.
@@ -893,8 +931,7 @@ Keep it conversational but meaningful. Around 2-4 paragraphs."""
 
             print(f"[LUKTHAN] Calling Claude API for question: {user_input[:50]}...")
 
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
+            response = await create_message(
                 model=self.model,
                 max_tokens=2048,
                 system=system_prompt,
@@ -948,12 +985,11 @@ Respond naturally and helpfully. Be concise but thorough."""
 
             user_message = user_input
             if context:
-                user_message += f"\n\nAdditional context: {context[:500]}"
+                user_message += f"\n\nAdditional context: {await fit_context_async(context, user_input, 'smart')}"
 
             print(f"[LUKTHAN] Calling Claude API for smart response: {user_input[:50]}...")
 
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
+            response = await create_message(
                 model=self.model,
                 max_tokens=2048,
                 system=system_prompt,
@@ -989,25 +1025,13 @@ Respond naturally and helpfully. Be concise but thorough."""
             # Fall back to prompt optimization
             return await self._optimize_prompt(user_input, context, settings, thinking_steps)
 
-    async def _optimize_prompt(
-        self,
-        user_input: str,
-        context: str,
-        settings: Dict[str, Any],
-        thinking_steps: List[Dict]
-    ) -> Dict[str, Any]:
-        """Optimize a user's input into a powerful AI prompt using Claude AI."""
-        # Analyze the input for metadata
-        analysis = await self._analyze_input(user_input, context, settings)
-
-        # Get settings
+    def _build_optimization_request(self, user_input: str, attached: str, settings: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Claude request used to optimize a prompt; attached is the budgeted file context."""
         target_ai = settings.get("target_ai", "ChatGPT (GPT-4)")
         expertise = settings.get("expertise_level", "Professional")
         output_language = settings.get("language", "English")
 
-        try:
-            # Use Claude to actually optimize the prompt
-            system_prompt = f"""You are LUKTHAN, an expert AI prompt engineer. Your task is to transform user ideas into highly optimized, powerful prompts.
+        system_prompt = f"""You are LUKTHAN, an expert AI prompt engineer. Your task is to transform user ideas into highly optimized, powerful prompts.
 
 TARGET AI MODEL: {target_ai}
 EXPERTISE LEVEL: {expertise}
@@ -1029,48 +1053,73 @@ For {target_ai}, consider these best practices:
 - Llama/Mistral: Use instruction format with [INST] tags
 - Copilot: Code-focused with clear comments"""
 
-            user_message = f"Transform this into an optimized AI prompt:\n\n{user_input}"
-            if context:
-                user_message += f"\n\nAdditional context/file content:\n{context[:2000]}"
+        user_message = f"Transform this into an optimized AI prompt:\n\n{user_input}"
+        if attached:
+            user_message += f"\n\nAdditional context/file content:\n{attached}"
+
+        return {
+            "model": self.model,
+            "max_tokens": 4096,
+            "system": system_prompt,
+            "messages": [{"role": "user", "content": user_message}]
+        }
 
+    async def _optimize_prompt(
+        self,
+        user_input: str,
+        context: str,
+        settings: Dict[str, Any],
+        thinking_steps: List[Dict]
+    ) -> Dict[str, Any]:
+        """Optimize a user's input into a powerful AI prompt using Claude AI."""
+        # Identical requests with identical settings are served from the response cache
+        cache_key = make_cache_key("optimize", user_input, context, settings, self.model)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            print(f"[LUKTHAN] Optimized prompt served from cache")
+            cached["metadata"]["cache_hit"] = True
+            return cached
+
+        # Analyze the input for metadata
+        analysis = await self._analyze_input(user_input, context, settings)
+
+        # Near-duplicates of earlier requests reuse the stored optimized prompt
+        reused = self._semantic_match_result(user_input, context, analysis, settings)
+        if reused is not None:
+            return reused
+
+        if self._use_local_generation(user_input, context, settings):
+            print(f"[LUKTHAN] Generating prompt locally from {analysis['task_type']} template")
+            return self._local_optimization_result(user_input, context, analysis, settings)
+
+        try:
+            # Use Claude to actually optimize the prompt
             print(f"[LUKTHAN] Calling Claude API to optimize prompt...")
-            print(f"[LUKTHAN] Target AI: {target_ai}, Expertise: {expertise}")
+            print(f"[LUKTHAN] Target AI: {settings.get('target_ai', 'ChatGPT (GPT-4)')}, Expertise: {settings.get('expertise_level', 'Professional')}")
 
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=system_prompt,
-                messages=[{"role": "user", "content": user_message}]
-            )
+            attached = await fit_context_async(context, user_input, "optimize")
+            completion = create_message(**self._build_optimization_request(user_input, attached, settings))
+
+            if self._is_pipelined(settings):
+                # Suggestions are drafted from the request alone, alongside the main completion
+                response, suggestions = await _gather_or_cancel(
+                    completion,
+                    self._generate_suggestions(user_input, "", analysis)
+                )
+            else:
+                response = await completion
+                suggestions = None
 
             optimized_prompt = response.content[0].text
             print(f"[LUKTHAN] SUCCESS! Generated optimized prompt ({len(optimized_prompt)} chars)")
 
-            # Score based on actual content quality
-            quality_score = self._score_prompt(optimized_prompt, analysis)
-
             # Get AI-generated suggestions
-            suggestions = await self._generate_suggestions(user_input, optimized_prompt, analysis)
+            if suggestions is None:
+                suggestions = await self._generate_suggestions(user_input, optimized_prompt, analysis)
 
-            return {
-                "optimized_prompt": optimized_prompt,
-                "response": f"I've analyzed your request and created an optimized prompt specifically designed for **{target_ai}** at **{expertise}** level. The prompt incorporates best practices for prompt engineering including clear structure, appropriate context, and explicit output expectations.",
-                "response_type": "prompt_optimization",
-                "quality_score": quality_score,
-                "domain": analysis["domain"],
-                "task_type": analysis["task_type"],
-                "suggestions": suggestions,
-                "metadata": {
-                    "complexity": analysis["complexity"],
-                    "confidence": analysis["confidence"],
-                    "key_topics": analysis["key_topics"],
-                    "detected_language": analysis.get("detected_language", "general"),
-                    "target_ai": target_ai,
-                    "expertise_level": expertise,
-                    "ai_optimized": True
-                }
-            }
+            result = self._build_optimization_result(optimized_prompt, analysis, settings, suggestions)
+            await response_cache.set(cache_key, result)
+            return result
 
         except Exception as e:
             print(f"[LUKTHAN] ERROR in prompt optimization: {type(e).__name__}: {str(e)}")
@@ -1078,47 +1127,223 @@ For {target_ai}, consider these best practices:
             traceback.print_exc()
 
             # Fallback to template-based generation if API fails
-            optimized_prompt = self._generate_prompt(
-                domain=analysis["domain"],
-                task_type=analysis["task_type"],
-                user_request=user_input,
-                context=context,
-                language=analysis.get("detected_language", "Python"),
-                settings=settings
-            )
+            return self._fallback_optimization_result(user_input, context, analysis, settings, e)
+
+    async def _stream_optimize_prompt(
+        self,
+        user_input: str,
+        context: str,
+        settings: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of _optimize_prompt.
+        Yields ("optimized_prompt", delta) for each text chunk, then ("result", result_dict).
+        """
+        cache_key = make_cache_key("optimize", user_input, context, settings, self.model)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            print(f"[LUKTHAN] Optimized prompt served from cache")
+            cached["metadata"]["cache_hit"] = True
+            yield "optimized_prompt", cached["optimized_prompt"]
+            yield "result", cached
+            return
 
-            quality_score = self._score_prompt(optimized_prompt, analysis)
-            suggestions = self._get_suggestions(analysis, quality_score)
+        analysis = await self._analyze_input(user_input, context, settings)
 
-            return {
-                "optimized_prompt": optimized_prompt,
-                "response": f"I've created a prompt for **{target_ai}** using templates (AI optimization unavailable: {type(e).__name__}). Please check the API configuration.",
-                "response_type": "prompt_optimization",
-                "quality_score": quality_score,
-                "domain": analysis["domain"],
-                "task_type": analysis["task_type"],
-                "suggestions": suggestions,
-                "metadata": {
-                    "complexity": analysis["complexity"],
-                    "confidence": analysis["confidence"],
-                    "key_topics": analysis["key_topics"],
-                    "detected_language": analysis.get("detected_language", "general"),
-                    "target_ai": target_ai,
-                    "expertise_level": expertise,
-                    "ai_optimized": False,
-                    "error": str(e)
-                }
+        reused = self._semantic_match_result(user_input, context, analysis, settings)
+        if reused is not None:
+            yield "optimized_prompt", reused["optimized_prompt"]
+            yield "result", reused
+            return
+
+        if self._use_local_generation(user_input, context, settings):
+            print(f"[LUKTHAN] Generating prompt locally from {analysis['task_type']} template")
+            result = self._local_optimization_result(user_input, context, analysis, settings)
+            yield "optimized_prompt", result["optimized_prompt"]
+            yield "result", result
+            return
+
+        request = self._build_optimization_request(
+            user_input, await fit_context_async(context, user_input, "optimize"), settings
+        )
+
+        suggestions_task = None
+        if self._is_pipelined(settings):
+            suggestions_task = asyncio.create_task(self._generate_suggestions(user_input, "", analysis))
+
+        parts: List[str] = []
+        try:
+            print(f"[LUKTHAN] Streaming optimized prompt from Claude...")
+            async for text in stream_text(**request):
+                parts.append(text)
+                yield "optimized_prompt", text
+        except Exception as e:
+            if parts:
+                # Part of the prompt already reached the client - nothing sensible to fall back to
+                if suggestions_task:
+                    suggestions_task.cancel()
+                raise
+            print(f"[LUKTHAN] ERROR in streaming optimization: {type(e).__name__}: {str(e)}")
+            result = self._fallback_optimization_result(user_input, context, analysis, settings, e)
+            if suggestions_task:
+                suggestions_task.cancel()
+            yield "optimized_prompt", result["optimized_prompt"]
+            yield "result", result
+            return
+
+        optimized_prompt = "".join(parts)
+        print(f"[LUKTHAN] SUCCESS! Streamed optimized prompt ({len(optimized_prompt)} chars)")
+
+        if suggestions_task:
+            suggestions = await suggestions_task
+        else:
+            suggestions = await self._generate_suggestions(user_input, optimized_prompt, analysis)
+
+        result = self._build_optimization_result(optimized_prompt, analysis, settings, suggestions)
+        await response_cache.set(cache_key, result)
+        yield "result", result
+
+    def _semantic_match_result(
+        self,
+        user_input: str,
+        context: str,
+        analysis: Dict[str, Any],
+        settings: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Reuse a stored optimized prompt for a near-duplicate request, if any."""
+        if context or settings.get("semantic_cache") is False:
+            # Attached files make requests unique - only plain requests are matched
+            return None
+
+        match = find_similar(user_input, analysis["domain"], settings)
+        if match is None:
+            return None
+
+        print(f"[LUKTHAN] Reusing prompt from session {match['session_id']} (similarity {match['similarity']})")
+        analysis = dict(analysis, task_type=match["task_type"] or analysis["task_type"])
+        result = self._build_optimization_result(
+            match["optimized_prompt"], analysis, settings,
+            self._get_suggestions(analysis, self._score_prompt(match["optimized_prompt"], analysis))
+        )
+        result["response"] = f"This is very close to a request I've optimized before, so I've reused that prompt for **{settings.get('target_ai', 'ChatGPT (GPT-4)')}**. Ask me to regenerate it if you'd like a fresh take."
+        result["metadata"]["semantic_match"] = {
+            "session_id": match["session_id"],
+            "similarity": match["similarity"]
+        }
+        return result
+
+    def _build_optimization_result(
+        self,
+        optimized_prompt: str,
+        analysis: Dict[str, Any],
+        settings: Dict[str, Any],
+        suggestions: List[str]
+    ) -> Dict[str, Any]:
+        """Assemble the response payload for an AI-optimized prompt."""
+        target_ai = settings.get("target_ai", "ChatGPT (GPT-4)")
+        expertise = settings.get("expertise_level", "Professional")
+
+        # Score based on actual content quality
+        quality_score = self._score_prompt(optimized_prompt, analysis)
+
+        return {
+            "optimized_prompt": optimized_prompt,
+            "response": f"I've analyzed your request and created an optimized prompt specifically designed for **{target_ai}** at **{expertise}** level. The prompt incorporates best practices for prompt engineering including clear structure, appropriate context, and explicit output expectations.",
+            "response_type": "prompt_optimization",
+            "quality_score": quality_score,
+            "domain": analysis["domain"],
+            "task_type": analysis["task_type"],
+            "suggestions": suggestions,
+            "metadata": {
+                "complexity": analysis["complexity"],
+                "confidence": analysis["confidence"],
+                "key_topics": analysis["key_topics"],
+                "detected_language": analysis.get("detected_language", "general"),
+                "target_ai": target_ai,
+                "expertise_level": expertise,
+                "ai_optimized": True
             }
+        }
+
+    def _fallback_optimization_result(
+        self,
+        user_input: str,
+        context: str,
+        analysis: Dict[str, Any],
+        settings: Dict[str, Any],
+        error: Exception
+    ) -> Dict[str, Any]:
+        """Template-based response payload used when AI optimization fails."""
+        result = self._local_optimization_result(user_input, context, analysis, settings)
+        result["response"] = f"I've created a prompt for **{result['metadata']['target_ai']}** using templates (AI optimization unavailable: {type(error).__name__}). Please check the API configuration."
+        result["metadata"].pop("local_generation")
+        result["metadata"]["error"] = str(error)
+        return result
+
+    def _use_local_generation(self, user_input: str, context: str, settings: Dict[str, Any]) -> bool:
+        """Check whether this request is generated from templates without calling the LLM."""
+        local_generation = settings.get("local_generation", LOCAL_GENERATION)
+        if local_generation == "always":
+            return True
+        if local_generation == "simple":
+            return classify(user_input, context)["complexity"] == "low"
+        return False
+
+    def _local_optimization_result(
+        self,
+        user_input: str,
+        context: str,
+        analysis: Dict[str, Any],
+        settings: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Response payload for a prompt generated offline from the task-type template."""
+        target_ai = settings.get("target_ai", "ChatGPT (GPT-4)")
+        expertise = settings.get("expertise_level", "Professional")
+
+        optimized_prompt = self._generate_prompt(
+            domain=analysis["domain"],
+            task_type=analysis["task_type"],
+            user_request=user_input,
+            context=context,
+            language=analysis.get("detected_language", "Python"),
+            settings=settings
+        )
+
+        quality_score = self._score_prompt(optimized_prompt, analysis)
+        suggestions = self._get_suggestions(analysis, quality_score)
+
+        return {
+            "optimized_prompt": optimized_prompt,
+            "response": f"I've created a prompt for **{target_ai}** at **{expertise}** level from the {analysis['task_type'].replace('_', ' ')} template.",
+            "response_type": "prompt_optimization",
+            "quality_score": quality_score,
+            "domain": analysis["domain"],
+            "task_type": analysis["task_type"],
+            "suggestions": suggestions,
+            "metadata": {
+                "complexity": analysis["complexity"],
+                "confidence": analysis["confidence"],
+                "key_topics": analysis["key_topics"],
+                "detected_language": analysis.get("detected_language", "general"),
+                "target_ai": target_ai,
+                "expertise_level": expertise,
+                "ai_optimized": False,
+                "local_generation": True
+            }
+        }
 
     async def _generate_suggestions(self, original_input: str, optimized_prompt: str, analysis: Dict[str, Any]) -> List[str]:
         """Generate AI-powered suggestions for further improvement."""
         try:
-            client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-            response = client.messages.create(
+            user_message = f"Original request: {original_input}"
+            if optimized_prompt:
+                user_message += f"\n\nOptimized prompt: {optimized_prompt[:1000]}"
+
+            response = await create_message(
                 model=self.model,
                 max_tokens=500,
                 system="You are a prompt engineering expert. Generate 3 brief, actionable suggestions for how the user could further improve their prompt or get better results. Each suggestion should be one concise sentence. Return only the 3 suggestions, one per line, no numbering or bullets.",
-                messages=[{"role": "user", "content": f"Original request: {original_input}\n\nOptimized prompt: {optimized_prompt[:1000]}"}]
+                messages=[{"role": "user", "content": user_message}]
             )
 
             suggestions = [s.strip() for s in response.content[0].text.strip().split('\n') if s.strip()]
@@ -1137,18 +1362,21 @@ For {target_ai}, consider these best practices:
         """Analyze user input to determine domain, task type, and metadata."""
         specified_domain = settings.get("domain", "auto")
 
+        # One scan of input + context gives domain, language and complexity together
+        classification = classify(user_input, context)
+
         if specified_domain != "auto" and specified_domain in domain_tasks:
             domain = specified_domain
         else:
-            domain = self._detect_domain(user_input, context)
+            domain = classification["domain"]
 
         task_type = self._detect_task_type(user_input, domain)
 
         detected_language = "general"
         if domain == "coding":
-            detected_language = self._detect_programming_language(user_input + " " + context)
+            detected_language = classification["language"]
 
-        complexity = self._assess_complexity(user_input, context)
+        complexity = classification["complexity"]
         key_topics = self._extract_key_topics(user_input)
         confidence = self._calculate_confidence(user_input, domain, task_type)
 
@@ -1163,120 +1391,19 @@ For {target_ai}, consider these best practices:
 
     def _detect_domain(self, user_input: str, context: str) -> str:
         """Detect the domain based on keywords and patterns."""
-        text = (user_input + " " + context).lower()
-
-        domain_scores = {
-            "coding": 0,
-            "research": 0,
-            "data_science": 0,
-            "general": 0
-        }
-
-        coding_keywords = ["code", "function", "class", "api", "bug", "error", "debug",
-                         "implement", "program", "script", "variable", "loop", "array",
-                         "database", "server", "frontend", "backend", "deploy", "react",
-                         "python", "javascript", "typescript", "java", "css", "html"]
-        for kw in coding_keywords:
-            if kw in text:
-                domain_scores["coding"] += 1
-
-        if re.search(r'```|def |class |function |const |let |var |import |from ', text):
-            domain_scores["coding"] += 3
-
-        research_keywords = ["research", "study", "paper", "thesis", "literature",
-                           "methodology", "hypothesis", "analysis", "academic",
-                           "citation", "journal", "publication"]
-        for kw in research_keywords:
-            if kw in text:
-                domain_scores["research"] += 1
-
-        # Basic data science keywords (1 point each)
-        ds_keywords = ["data", "machine learning", "ml", "model", "predict",
-                      "dataset", "visualization", "statistics", "neural",
-                      "training", "algorithm", "feature", "regression", "classification",
-                      "csv", "dataframe", "pandas", "numpy", "sklearn", "scikit",
-                      "clean", "cleaning", "preprocessing", "preprocess",
-                      "missing", "null", "nan", "impute", "imputation",
-                      "leakage", "leak", "overfit", "overfitting", "underfit",
-                      "train", "test", "validation", "split", "cross-validation",
-                      "forecast", "forecasting", "time series", "arima",
-                      "eda", "exploratory", "correlation", "distribution"]
-        for kw in ds_keywords:
-            if kw in text:
-                domain_scores["data_science"] += 1
-
-        # High-value ML terms (3 points each - very specific indicators)
-        ml_specific = ["lstm", "xgboost", "random forest", "gradient boosting",
-                      "lightgbm", "catboost", "tensorflow", "pytorch", "keras",
-                      "transformer", "bert", "gpt", "cnn", "rnn", "autoencoder",
-                      "hyperparameter", "epoch", "batch size", "learning rate",
-                      "confusion matrix", "roc", "auc", "precision", "recall", "f1"]
-        for kw in ml_specific:
-            if kw in text:
-                domain_scores["data_science"] += 3
-
-        max_score = max(domain_scores.values())
-        if max_score == 0:
-            return "general"
-
-        for domain, score in domain_scores.items():
-            if score == max_score:
-                return domain
-
-        return "general"
+        return classify(user_input, context)["domain"]
 
     def _detect_task_type(self, user_input: str, domain: str) -> str:
         """Detect specific task type based on keywords."""
-        text = user_input.lower()
-
-        possible_tasks = domain_tasks.get(domain, ["general_query"])
-
-        task_scores = {}
-        for task in possible_tasks:
-            task_scores[task] = 0
-            keywords = task_keywords.get(task, [])
-            for kw in keywords:
-                if kw in text:
-                    task_scores[task] += 1
-
-        max_score = max(task_scores.values()) if task_scores else 0
-        if max_score == 0:
-            return possible_tasks[0] if possible_tasks else "general_query"
-
-        for task, score in task_scores.items():
-            if score == max_score:
-                return task
-
-        return "general_query"
+        return detect_task_type(user_input, domain)
 
     def _detect_programming_language(self, text: str) -> str:
         """Detect the programming language from text."""
-        text = text.lower()
-
-        for lang, keywords in language_keywords.items():
-            for kw in keywords:
-                if kw in text:
-                    return lang
-
-        return "python"
+        return detect_programming_language(find_text_keywords(text.lower()))
 
     def _assess_complexity(self, user_input: str, context: str) -> str:
         """Assess the complexity of the request."""
-        text = user_input + " " + context
-        word_count = len(text.split())
-
-        complex_indicators = ["complex", "advanced", "sophisticated", "enterprise",
-                            "scalable", "distributed", "microservice", "architecture",
-                            "optimize", "performance", "security"]
-
-        complexity_score = sum(1 for ind in complex_indicators if ind in text.lower())
-
-        if word_count > 200 or complexity_score >= 3:
-            return "high"
-        elif word_count > 50 or complexity_score >= 1:
-            return "medium"
-        else:
-            return "low"
+        return classify(user_input, context)["complexity"]
 
     def _extract_key_topics(self, user_input: str) -> List[str]:
         """Extract key topics from the input."""
@@ -1315,9 +1442,8 @@ For {target_ai}, consider these best practices:
         elif word_count > 20:
             base_confidence += 0.1
 
-        text = user_input.lower()
-        task_kws = task_keywords.get(task_type, [])
-        matches = sum(1 for kw in task_kws if kw in text)
+        found = user_keywords(user_input)
+        matches = sum(1 for kw in task_keywords.get(task_type, []) if kw in found)
         if matches >= 3:
             base_confidence += 0.1
         elif matches >= 1:
@@ -1341,19 +1467,17 @@ For {target_ai}, consider these best practices:
         expertise = settings.get("expertise_level", "Professional")
         output_language = settings.get("language", "English")
 
-        # Get base template
-        template = templates.get(task_type, templates["general_query"])
+        # Non-coding domains have no detected language - templates default to Python
+        if not language or language == "general":
+            language = "Python"
 
-        try:
-            base_content = template.format(
-                language=language.capitalize(),
-                user_request=user_request,
-                context=context if context else "No additional context provided."
-            )
-        except KeyError:
-            base_content = template.replace("{user_request}", user_request)
-            base_content = base_content.replace("{context}", context if context else "No additional context provided.")
-            base_content = base_content.replace("{language}", language.capitalize())
+        # Fill the precompiled template for this task type
+        base_content = render_template(
+            task_type,
+            language=LANGUAGE_NAMES.get(language, language.capitalize()),
+            user_request=user_request,
+            context=context if context else "No additional context provided."
+        )
 
         # Apply AI-specific formatting
         optimized = self._format_for_target_ai(base_content, target_ai, domain)
@@ -1369,136 +1493,11 @@ For {target_ai}, consider these best practices:
 
     def _format_for_target_ai(self, content: str, target_ai: str, domain: str) -> str:
         """Format the prompt specifically for the target AI model."""
-
-        # AI-specific prompt structures
-        ai_formats = {
-            "ChatGPT (GPT-4)": {
-                "prefix": "You are an expert assistant. ",
-                "style": "structured",
-                "features": ["Uses markdown formatting", "Appreciates step-by-step requests", "Works well with examples"],
-                "wrapper": lambda c: f"{c}\n\nPlease structure your response with clear headings and bullet points where appropriate."
-            },
-            "ChatGPT (GPT-3.5)": {
-                "prefix": "You are a helpful assistant. ",
-                "style": "concise",
-                "features": ["Prefers shorter prompts", "Direct instructions work best", "Less context needed"],
-                "wrapper": lambda c: f"{c}\n\nKeep your response focused and concise."
-            },
-            "Claude": {
-                "prefix": "",
-                "style": "detailed",
-                "features": ["Excels with nuanced instructions", "Handles long contexts well", "Thoughtful analysis"],
-                "wrapper": lambda c: f"I'd like your help with the following task.\n\n{c}\n\nPlease think through this carefully and provide a thorough response."
-            },
-            "Claude (Opus)": {
-                "prefix": "",
-                "style": "analytical",
-                "features": ["Best for complex reasoning", "Handles ambiguity well", "Deep analysis"],
-                "wrapper": lambda c: f"I have a complex task that requires careful analysis.\n\n{c}\n\nPlease approach this systematically, considering multiple perspectives and edge cases."
-            },
-            "Gemini": {
-                "prefix": "",
-                "style": "conversational",
-                "features": ["Good with multimodal tasks", "Natural conversation flow", "Web-aware"],
-                "wrapper": lambda c: f"{c}\n\nProvide a comprehensive and well-organized response."
-            },
-            "Gemini Pro": {
-                "prefix": "",
-                "style": "professional",
-                "features": ["Advanced reasoning", "Code generation", "Detailed explanations"],
-                "wrapper": lambda c: f"Task:\n{c}\n\nPlease provide a detailed, professional-quality response with explanations where helpful."
-            },
-            "Llama": {
-                "prefix": "[INST] ",
-                "suffix": " [/INST]",
-                "style": "instruction",
-                "features": ["Instruction-tuned format", "Clear delimiters help", "Concise prompts preferred"],
-                "wrapper": lambda c: f"[INST] {c} [/INST]"
-            },
-            "Mistral": {
-                "prefix": "<s>[INST] ",
-                "suffix": " [/INST]",
-                "style": "instruction",
-                "features": ["Instruction format", "Efficient with shorter prompts", "Good at coding"],
-                "wrapper": lambda c: f"<s>[INST] {c} [/INST]"
-            },
-            "Copilot": {
-                "prefix": "",
-                "style": "code-focused",
-                "features": ["Code-optimized", "Comment-driven generation", "Context from files"],
-                "wrapper": lambda c: f"// Task: {c}\n// Please provide working code with comments explaining the implementation."
-            }
-        }
-
-        # Get format for target AI (default to ChatGPT style)
-        ai_config = ai_formats.get(target_ai, ai_formats["ChatGPT (GPT-4)"])
-
-        # Apply the wrapper function
-        formatted = ai_config["wrapper"](content)
-
-        return formatted
+        return format_for_target_ai(content, target_ai)
 
     def _adjust_for_expertise(self, content: str, expertise: str, domain: str) -> str:
         """Adjust the prompt's complexity and vocabulary based on expertise level."""
-
-        expertise_configs = {
-            "Beginner": {
-                "instruction": "Explain in simple terms that a beginner can understand.",
-                "vocabulary": "simple",
-                "detail_level": "step-by-step with explanations",
-                "assumptions": "Assume no prior knowledge.",
-                "examples": "Include simple examples and analogies.",
-                "prefix": "I'm new to this topic. "
-            },
-            "Intermediate": {
-                "instruction": "Provide a balanced explanation suitable for someone with basic knowledge.",
-                "vocabulary": "standard technical terms with brief explanations",
-                "detail_level": "moderate detail",
-                "assumptions": "Assume familiarity with basic concepts.",
-                "examples": "Include practical examples.",
-                "prefix": ""
-            },
-            "Professional": {
-                "instruction": "Provide a professional-level response.",
-                "vocabulary": "industry-standard terminology",
-                "detail_level": "comprehensive with best practices",
-                "assumptions": "Assume professional working knowledge.",
-                "examples": "Include production-ready examples where applicable.",
-                "prefix": ""
-            },
-            "Expert": {
-                "instruction": "Provide an expert-level response with advanced insights.",
-                "vocabulary": "advanced technical terminology",
-                "detail_level": "in-depth with edge cases and optimizations",
-                "assumptions": "Assume deep expertise in the field.",
-                "examples": "Focus on advanced patterns, optimizations, and trade-offs.",
-                "prefix": "As an expert in this field, I need "
-            }
-        }
-
-        config = expertise_configs.get(expertise, expertise_configs["Professional"])
-
-        # Build expertise-specific additions
-        expertise_section = f"\n\n**Response Requirements:**"
-        expertise_section += f"\n- {config['instruction']}"
-        expertise_section += f"\n- Use {config['vocabulary']}"
-        expertise_section += f"\n- {config['assumptions']}"
-
-        if expertise == "Beginner":
-            expertise_section += f"\n- {config['examples']}"
-            expertise_section += "\n- Avoid jargon or explain it when necessary"
-            expertise_section += "\n- Break down complex concepts into digestible parts"
-
-        elif expertise == "Expert":
-            expertise_section += f"\n- {config['examples']}"
-            expertise_section += "\n- Discuss performance implications and trade-offs"
-            expertise_section += "\n- Include considerations for scale and edge cases"
-
-        # Add prefix if needed (skip if AI already adds its own opener)
-        if config["prefix"] and not content.startswith("I'd like") and not content.startswith("I have"):
-            content = config["prefix"] + content
-
-        return content + expertise_section
+        return adjust_for_expertise(content, expertise)
 
     def _score_prompt(self, prompt: str, analysis: Dict[str, Any]) -> int:
         """Score the quality of the generated prompt (0-100)."""
@@ -1566,10 +1565,23 @@ async def process_message(
     user_input: str,
     file_content: Optional[str] = None,
     file_type: Optional[str] = None,
-    settings: Optional[Dict[str, Any]] = None
+    settings: Optional[Dict[str, Any]] = None,
+    conversation_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """Main wrapper function - processes any message intelligently."""
-    return await intelligent_agent.process_message(user_input, file_content, file_type, settings)
+    return await intelligent_agent.process_message(user_input, file_content, file_type, settings, conversation_id)
+
+
+async def stream_message(
+    user_input: str,
+    file_content: Optional[str] = None,
+    file_type: Optional[str] = None,
+    settings: Optional[Dict[str, Any]] = None,
+    conversation_id: Optional[str] = None
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Streaming wrapper - yields (event, data) pairs for the SSE chat endpoint."""
+    async for event, data in intelligent_agent.stream_message(user_input, file_content, file_type, settings, conversation_id):
+        yield event, data
 
 
 # Keep backward compatibility
@@ -1584,8 +1596,10 @@ async def optimize_prompt(
     return result
 
 
-def reset_conversation() -> Dict[str, Any]:
-    """Reset the conversation history for guided mode."""
-    intelligent_agent.conversation_history = []
-    print("[LUKTHAN] Conversation history reset")
+async def reset_conversation(conversation_id: Optional[str] = None) -> Dict[str, Any]:
+    """Reset the conversation history of one guided-mode conversation."""
+    if not conversation_id:
+        return {"success": True, "message": "No conversation to clear"}
+    await conversation_store.reset(conversation_id)
+    print(f"[LUKTHAN] Conversation history reset: {conversation_id}")
     return {"success": True, "message": "Conversation history cleared"}
@@ -0,0 +1,210 @@
+"""
+Precompiled target-AI and expertise formatters for template prompts.
+
+Each target model is a header/footer pair wrapped around the prompt body and
+each expertise level a precomputed prefix and requirements section, so
+formatting a prompt is a couple of string concatenations. Formatters are built
+once at import; extra target models can be registered at runtime or loaded
+from a JSON file named by TARGET_AI_FORMATS_FILE:
+
+    {"Phi-3": {"header": "<|user|>\\n", "footer": "<|end|>", "style": "instruction"}}
+"""
+from typing import Any, Dict, List, Optional
+import json
+import os
+
+TARGET_AI_FORMATS_FILE = os.getenv("TARGET_AI_FORMATS_FILE", "")
+
+DEFAULT_TARGET_AI = "ChatGPT (GPT-4)"
+DEFAULT_EXPERTISE = "Professional"
+
+
+class TargetFormatter:
+    """Wraps prompt content in a target model's preferred structure."""
+
+    def __init__(self, name: str, header: str = "", footer: str = "",
+                 style: str = "", features: Optional[List[str]] = None):
+        self.name = name
+        self.header = header
+        self.footer = footer
+        self.style = style
+        self.features = features or []
+
+    def format(self, content: str) -> str:
+        return self.header + content + self.footer
+
+
+class ExpertiseFormatter:
+    """Adds an expertise level's opener and response requirements to a prompt."""
+
+    # Target formats that already open with their own sentence skip the prefix
+    OPENERS = ("I'd like", "I have")
+
+    def __init__(self, name: str, instruction: str, vocabulary: str, assumptions: str,
+                 prefix: str = "", extra_requirements: Optional[List[str]] = None):
+        self.name = name
+        self.prefix = prefix
+        requirements = [instruction, f"Use {vocabulary}", assumptions] + (extra_requirements or [])
+        self.section = "\n\n**Response Requirements:**" + "".join(f"\n- {r}" for r in requirements)
+
+    def adjust(self, content: str) -> str:
+        if self.prefix and not content.startswith(self.OPENERS):
+            content = self.prefix + content
+        return content + self.section
+
+
+# AI-specific prompt structures
+target_formatters: Dict[str, TargetFormatter] = {}
+
+# Expertise level adjustments
+expertise_formatters: Dict[str, ExpertiseFormatter] = {}
+
+
+def register_target_format(name: str, header: str = "", footer: str = "",
+                           style: str = "", features: Optional[List[str]] = None) -> TargetFormatter:
+    """Add or replace a target model format."""
+    formatter = TargetFormatter(name, header, footer, style, features)
+    target_formatters[name] = formatter
+    return formatter
+
+
+def register_expertise_level(name: str, instruction: str, vocabulary: str, assumptions: str,
+                             prefix: str = "", extra_requirements: Optional[List[str]] = None) -> ExpertiseFormatter:
+    """Add or replace an expertise level."""
+    formatter = ExpertiseFormatter(name, instruction, vocabulary, assumptions, prefix, extra_requirements)
+    expertise_formatters[name] = formatter
+    return formatter
+
+
+def load_target_formats(path: str) -> int:
+    """Register target formats from a JSON file; returns how many were loaded."""
+    with open(path, "r", encoding="utf-8") as f:
+        formats: Dict[str, Dict[str, Any]] = json.load(f)
+    for name, config in formats.items():
+        register_target_format(
+            name,
+            header=config.get("header", ""),
+            footer=config.get("footer", ""),
+            style=config.get("style", ""),
+            features=config.get("features")
+        )
+    return len(formats)
+
+
+def format_for_target_ai(content: str, target_ai: str) -> str:
+    """Format the prompt for the target AI model (ChatGPT style if unknown)."""
+    formatter = target_formatters.get(target_ai) or target_formatters[DEFAULT_TARGET_AI]
+    return formatter.format(content)
+
+
+def adjust_for_expertise(content: str, expertise: str) -> str:
+    """Adjust the prompt for the expertise level (Professional if unknown)."""
+    formatter = expertise_formatters.get(expertise) or expertise_formatters[DEFAULT_EXPERTISE]
+    return formatter.adjust(content)
+
+
+# ---- Built-in target models ----
+register_target_format(
+    "ChatGPT (GPT-4)",
+    footer="\n\nPlease structure your response with clear headings and bullet points where appropriate.",
+    style="structured",
+    features=["Uses markdown formatting", "Appreciates step-by-step requests", "Works well with examples"]
+)
+register_target_format(
+    "ChatGPT (GPT-3.5)",
+    footer="\n\nKeep your response focused and concise.",
+    style="concise",
+    features=["Prefers shorter prompts", "Direct instructions work best", "Less context needed"]
+)
+register_target_format(
+    "Claude",
+    header="I'd like your help with the following task.\n\n",
+    footer="\n\nPlease think through this carefully and provide a thorough response.",
+    style="detailed",
+    features=["Excels with nuanced instructions", "Handles long contexts well", "Thoughtful analysis"]
+)
+register_target_format(
+    "Claude (Opus)",
+    header="I have a complex task that requires careful analysis.\n\n",
+    footer="\n\nPlease approach this systematically, considering multiple perspectives and edge cases.",
+    style="analytical",
+    features=["Best for complex reasoning", "Handles ambiguity well", "Deep analysis"]
+)
+register_target_format(
+    "Gemini",
+    footer="\n\nProvide a comprehensive and well-organized response.",
+    style="conversational",
+    features=["Good with multimodal tasks", "Natural conversation flow", "Web-aware"]
+)
+register_target_format(
+    "Gemini Pro",
+    header="Task:\n",
+    footer="\n\nPlease provide a detailed, professional-quality response with explanations where helpful.",
+    style="professional",
+    features=["Advanced reasoning", "Code generation", "Detailed explanations"]
+)
+register_target_format(
+    "Llama",
+    header="[INST] ",
+    footer=" [/INST]",
+    style="instruction",
+    features=["Instruction-tuned format", "Clear delimiters help", "Concise prompts preferred"]
+)
+register_target_format(
+    "Mistral",
+    header="<s>[INST] ",
+    footer=" [/INST]",
+    style="instruction",
+    features=["Instruction format", "Efficient with shorter prompts", "Good at coding"]
+)
+register_target_format(
+    "Copilot",
+    header="// Task: ",
+    footer="\n// Please provide working code with comments explaining the implementation.",
+    style="code-focused",
+    features=["Code-optimized", "Comment-driven generation", "Context from files"]
+)
+
+# ---- Built-in expertise levels ----
+register_expertise_level(
+    "Beginner",
+    instruction="Explain in simple terms that a beginner can understand.",
+    vocabulary="simple",
+    assumptions="Assume no prior knowledge.",
+    prefix="I'm new to this topic. ",
+    extra_requirements=[
+        "Include simple examples and analogies.",
+        "Avoid jargon or explain it when necessary",
+        "Break down complex concepts into digestible parts",
+    ]
+)
+register_expertise_level(
+    "Intermediate",
+    instruction="Provide a balanced explanation suitable for someone with basic knowledge.",
+    vocabulary="standard technical terms with brief explanations",
+    assumptions="Assume familiarity with basic concepts."
+)
+register_expertise_level(
+    "Professional",
+    instruction="Provide a professional-level response.",
+    vocabulary="industry-standard terminology",
+    assumptions="Assume professional working knowledge."
+)
+register_expertise_level(
+    "Expert",
+    instruction="Provide an expert-level response with advanced insights.",
+    vocabulary="advanced technical terminology",
+    assumptions="Assume deep expertise in the field.",
+    prefix="As an expert in this field, I need ",
+    extra_requirements=[
+        "Focus on advanced patterns, optimizations, and trade-offs.",
+        "Discuss performance implications and trade-offs",
+        "Include considerations for scale and edge cases",
+    ]
+)
+
+if TARGET_AI_FORMATS_FILE:
+    try:
+        print(f"[LUKTHAN] Loaded {load_target_formats(TARGET_AI_FORMATS_FILE)} target AI formats from {TARGET_AI_FORMATS_FILE}")
+    except (OSError, ValueError) as e:
+        print(f"[LUKTHAN] Could not load target AI formats from {TARGET_AI_FORMATS_FILE}: {e}")
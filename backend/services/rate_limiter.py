@@ -0,0 +1,184 @@
+"""
+Token-bucket rate limiter with per-route quotas.
+
+Each (route, client) pair holds one bucket - a token count and a timestamp -
+so memory is constant per client. Buckets that have refilled completely carry
+no state and are evicted. The backend is pluggable: in-process memory
+(default) or a local SQLite file shared by every worker on the host.
+"""
+from typing import Dict, Optional, Tuple
+from collections import OrderedDict
+from contextlib import closing
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+
+# Rate limit configuration (environment overridable)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # memory | sqlite
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", "./rate_limits.db")
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+# Per-route quotas as "path=requests_per_minute" pairs; a path also covers its sub-paths
+RATE_LIMIT_ROUTES = os.getenv("RATE_LIMIT_ROUTES", "/api/prompts/chat=30,/api/voice/transcribe=10")
+
+# How often (seconds) the SQLite backend deletes refilled buckets
+_SWEEP_INTERVAL = 60
+
+
+class RouteQuota:
+    """Bucket size and refill rate for one route."""
+
+    def __init__(self, route: str, requests_per_minute: int, burst: Optional[int] = None):
+        self.route = route
+        self.requests_per_minute = requests_per_minute
+        self.capacity = float(burst or requests_per_minute)
+        self.refill_rate = requests_per_minute / 60.0  # tokens per second
+
+
+def _take_token(tokens: float, updated_at: float, quota: RouteQuota, now: float) -> Tuple[bool, float, int]:
+    """Refill a bucket up to now and try to take one token: (allowed, tokens_left, retry_after)."""
+    tokens = min(quota.capacity, tokens + (now - updated_at) * quota.refill_rate)
+    if tokens >= 1.0:
+        return True, tokens - 1.0, 0
+    return False, tokens, max(1, math.ceil((1.0 - tokens) / quota.refill_rate))
+
+
+class MemoryRateLimitBackend:
+    """In-process buckets, least recently used first."""
+
+    blocking = False
+
+    def __init__(self, max_clients: int):
+        self.max_clients = max_clients
+        # key -> (tokens, updated_at, full_at)
+        self.buckets: "OrderedDict[str, Tuple[float, float, float]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, key: str, quota: RouteQuota) -> Tuple[bool, int]:
+        now = time.time()
+        with self.lock:
+            state = self.buckets.pop(key, None)
+            tokens, updated_at = (state[0], state[1]) if state else (quota.capacity, now)
+            allowed, tokens, retry_after = _take_token(tokens, updated_at, quota, now)
+            full_at = now + (quota.capacity - tokens) / quota.refill_rate
+            self.buckets[key] = (tokens, now, full_at)
+            self._evict(now)
+            return allowed, retry_after
+
+    def _evict(self, now: float) -> None:
+        # Refilled buckets are equivalent to no bucket at all
+        while self.buckets:
+            key, (_, _, full_at) = next(iter(self.buckets.items()))
+            if full_at > now and len(self.buckets) <= self.max_clients:
+                break
+            del self.buckets[key]
+
+    def size(self) -> int:
+        return len(self.buckets)
+
+
+class SQLiteRateLimitBackend:
+    """Buckets in a local SQLite file, shared by every worker on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.last_sweep = 0.0
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+                "updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_rate_limits_full_at ON rate_limits (full_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def acquire(self, key: str, quota: RouteQuota) -> Tuple[bool, int]:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            # IMMEDIATE takes the write lock up front so read-modify-write is atomic across workers
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                tokens, updated_at = row if row else (quota.capacity, now)
+                allowed, tokens, retry_after = _take_token(tokens, updated_at, quota, now)
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)",
+                    (key, tokens, now, now + (quota.capacity - tokens) / quota.refill_rate)
+                )
+                if now - self.last_sweep >= _SWEEP_INTERVAL:
+                    self.last_sweep = now
+                    conn.execute("DELETE FROM rate_limits WHERE full_at <= ?", (now,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return allowed, retry_after
+
+    def size(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+def parse_route_quotas(spec: str) -> Dict[str, RouteQuota]:
+    """Parse "path=rpm,path=rpm" into quotas keyed by path."""
+    quotas = {}
+    for item in spec.split(","):
+        if "=" not in item:
+            continue
+        route, rpm = item.split("=", 1)
+        quotas[route.strip().rstrip("/")] = RouteQuota(route.strip().rstrip("/"), int(rpm))
+    return quotas
+
+
+class RateLimiter:
+    """Per-route token buckets keyed by client."""
+
+    def __init__(self, backend, default_quota: RouteQuota, route_quotas: Dict[str, RouteQuota]):
+        self.backend = backend
+        self.default_quota = default_quota
+        # Longest prefix first so /api/prompts/chat/stream matches /api/prompts/chat before /api
+        self.route_quotas = sorted(route_quotas.values(), key=lambda q: len(q.route), reverse=True)
+        self.rejected = 0
+
+    def quota_for(self, path: str) -> RouteQuota:
+        for quota in self.route_quotas:
+            if path == quota.route or path.startswith(quota.route + "/"):
+                return quota
+        return self.default_quota
+
+    async def check(self, client_ip: str, path: str) -> Tuple[bool, int]:
+        """Take a token for this client on this route: (allowed, retry_after seconds)."""
+        quota = self.quota_for(path)
+        key = f"{quota.route}|{client_ip}"
+        if self.backend.blocking:
+            allowed, retry_after = await asyncio.to_thread(self.backend.acquire, key, quota)
+        else:
+            allowed, retry_after = self.backend.acquire(key, quota)
+        if not allowed:
+            self.rejected += 1
+        return allowed, retry_after
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": "sqlite" if self.backend.blocking else "memory",
+            "tracked_buckets": self.backend.size(),
+            "rejected": self.rejected,
+            "default_per_minute": self.default_quota.requests_per_minute,
+            "routes": {q.route: q.requests_per_minute for q in self.route_quotas},
+        }
+
+
+rate_limiter = RateLimiter(
+    SQLiteRateLimitBackend(RATE_LIMIT_DB_PATH) if RATE_LIMIT_BACKEND == "sqlite" else MemoryRateLimitBackend(RATE_LIMIT_MAX_CLIENTS),
+    RouteQuota("*", RATE_LIMIT_PER_MINUTE),
+    parse_route_quotas(RATE_LIMIT_ROUTES)
+)
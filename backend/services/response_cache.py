@@ -0,0 +1,224 @@
+"""
+Content-addressed response cache for prompt optimization.
+
+Results are keyed on a normalized SHA-256 of the request (user input,
+full attached context, generation settings and model), expire after a TTL and
+are evicted least-recently-used once the cache is full. Backends are
+pluggable: in-process memory (default) or a local SQLite file.
+"""
+from typing import Any, Dict, Optional
+from collections import OrderedDict
+from contextlib import closing
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Cache configuration (environment overridable)
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")  # memory | sqlite | none
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "./response_cache.db")
+
+# Settings that change the generated output and therefore belong in the key
+KEY_SETTINGS = ("target_ai", "expertise_level", "language", "domain")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return " ".join((text or "").lower().split()).rstrip(" .!?")
+
+
+def make_cache_key(namespace: str, user_input: str, context: str, settings: Dict[str, Any], model: str) -> str:
+    """Build a content-addressed key for a request."""
+    payload = {
+        "ns": namespace,
+        "input": normalize_text(user_input),
+        # The whole document: the chunks sent to the LLM are selected from all of it
+        "context": hashlib.sha256(normalize_text(context).encode("utf-8")).hexdigest(),
+        "settings": {name: settings.get(name) for name in KEY_SETTINGS},
+        "model": model,
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: int) -> int:
+        """Store a value; returns the number of entries evicted."""
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+            self.entries.move_to_end(key)
+            evicted = 0
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def size(self) -> int:
+        return len(self.entries)
+
+
+class SQLiteCacheBackend:
+    """Local-file cache shared by every worker on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_response_cache_last_access ON response_cache (last_access)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: str, ttl: int) -> int:
+        now = time.time()
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            conn.execute("DELETE FROM response_cache WHERE expires_at < ?", (now,))
+            overflow = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                conn.execute(
+                    "DELETE FROM response_cache WHERE key IN "
+                    "(SELECT key FROM response_cache ORDER BY last_access LIMIT ?)",
+                    (overflow,)
+                )
+                return overflow
+            return 0
+
+    def clear(self) -> None:
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM response_cache")
+
+    def size(self) -> int:
+        with closing(self._connect()) as conn, conn:
+            return conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+
+
+class ResponseCache:
+    """Async facade over a cache backend with hit/miss accounting."""
+
+    def __init__(self, backend: Optional[Any], ttl: int):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh copy of the cached value, or None on a miss."""
+        if not self.enabled:
+            return None
+        try:
+            value = await self._call(self.backend.get, key)
+        except Exception as e:
+            print(f"[LUKTHAN] Response cache read failed: {e}")
+            value = None
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(value)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.evictions += await self._call(self.backend.set, key, json.dumps(value), self.ttl)
+            self.sets += 1
+        except Exception as e:
+            print(f"[LUKTHAN] Response cache write failed: {e}")
+
+    def clear(self) -> None:
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.enabled else "disabled",
+            "entries": self.backend.size() if self.enabled else 0,
+            "max_entries": self.backend.max_entries if self.enabled else 0,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _create_backend() -> Optional[Any]:
+    if RESPONSE_CACHE_BACKEND == "none":
+        return None
+    if RESPONSE_CACHE_BACKEND == "sqlite":
+        return SQLiteCacheBackend(RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES)
+    return MemoryCacheBackend(RESPONSE_CACHE_MAX_ENTRIES)
+
+
+# Process-wide cache instance
+response_cache = ResponseCache(_create_backend(), RESPONSE_CACHE_TTL)
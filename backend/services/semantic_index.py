@@ -0,0 +1,211 @@
+"""
+Local semantic index over past optimized prompts.
+
+Each saved PromptSession.raw_prompt is embedded as a hashed n-gram vector
+(word unigrams/bigrams + character 4-grams, no network service needed) and
+kept in an in-memory NumPy matrix. A new request that is close enough to a
+stored one - same domain and same generation settings - can reuse the stored
+optimized prompt instead of calling the LLM. Similarity alone is not enough:
+the two requests must also contain the same numbers and the same content
+words, so "older than 7 days" never reuses the prompt for "older than 30
+days". Off by default (SEMANTIC_CACHE_ENABLED).
+"""
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+import hashlib
+import os
+import re
+import threading
+import zlib
+
+try:
+    import numpy as np
+    NUMPY_SUPPORT = True
+except ImportError:
+    NUMPY_SUPPORT = False
+
+from database.crud import add_version_listener, add_delete_listener, get_sessions_with_latest_version
+
+# Semantic cache configuration (environment overridable)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() in ("true", "1", "t")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_INDEX_DIM = int(os.getenv("SEMANTIC_INDEX_DIM", "1024"))
+
+_WORD_RE = re.compile(r"[a-z0-9#+]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+# Words that may differ between two requests that still mean the same thing
+_FILLER_WORDS = frozenset(
+    "a an the and or of to in on for with by at from into that this these those is are be "
+    "it its my me i we our you your please can could would should will just some any "
+    "write create make build generate give help need want".split()
+)
+
+
+def settings_signature(settings: Dict[str, Any]) -> str:
+    """Short stable hash of the settings that shape the optimized prompt."""
+    parts = (
+        settings.get("target_ai", "ChatGPT (GPT-4)"),
+        settings.get("expertise_level", "Professional"),
+        settings.get("language", "English"),
+    )
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _features(text: str) -> List[str]:
+    text = " ".join(text.lower().split())
+    words = _WORD_RE.findall(text)
+    features = ["w:" + w for w in words]
+    features += ["b:" + a + " " + b for a, b in zip(words, words[1:])]
+    padded = f" {text} "
+    features += ["c:" + padded[i:i + 4] for i in range(len(padded) - 3)]
+    return features
+
+
+def content_signature(text: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """(numbers, content words) of a request; a reuse needs both to be identical."""
+    lowered = text.lower()
+    numbers = frozenset(_NUMBER_RE.findall(lowered))
+    words = frozenset(w for w in _WORD_RE.findall(lowered) if w not in _FILLER_WORDS and not w.isdigit())
+    return numbers, words
+
+
+def embed(text: str, dim: int = SEMANTIC_INDEX_DIM) -> "np.ndarray":
+    """Hashed n-gram vector, sublinear TF, L2-normalized."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    vector = np.sign(vector) * np.log1p(np.abs(vector))
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector /= norm
+    return vector
+
+
+class SemanticIndex:
+    """Append-only vector index partitioned by (domain, settings signature)."""
+
+    def __init__(self, dim: int = SEMANTIC_INDEX_DIM):
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.size = 0
+        self.vectors = np.zeros((256, dim), dtype=np.float32)
+        self.groups = np.zeros(256, dtype=np.int32)
+        self.group_ids: Dict[str, int] = {}
+        self.entries: List[Dict[str, Any]] = []
+        self.positions: Dict[int, int] = {}
+
+    def _group_id(self, domain: str, settings_key: str) -> int:
+        key = f"{domain}|{settings_key}"
+        if key not in self.group_ids:
+            self.group_ids[key] = len(self.group_ids)
+        return self.group_ids[key]
+
+    def add(self, session_id: int, raw_prompt: str, optimized_prompt: str,
+            domain: str, task_type: str, settings_key: Optional[str]) -> None:
+        """Index (or re-index) one session's latest optimized prompt."""
+        if not settings_key or not raw_prompt or not optimized_prompt:
+            return
+        vector = embed(raw_prompt, self.dim)
+        entry = {
+            "session_id": session_id,
+            "raw_prompt": raw_prompt,
+            "optimized_prompt": optimized_prompt,
+            "domain": domain,
+            "task_type": task_type,
+            "signature": content_signature(raw_prompt),
+        }
+        with self.lock:
+            if session_id in self.positions:
+                # Newer version of an indexed session - update in place
+                row = self.positions[session_id]
+                self.entries[row] = entry
+                self.vectors[row] = vector
+                return
+            if self.size == len(self.vectors):
+                self.vectors = np.resize(self.vectors, (self.size * 2, self.dim))
+                self.groups = np.resize(self.groups, self.size * 2)
+            self.vectors[self.size] = vector
+            self.groups[self.size] = self._group_id(domain, settings_key)
+            self.entries.append(entry)
+            self.positions[session_id] = self.size
+            self.size += 1
+
+    def search(self, text: str, domain: str, settings_key: str,
+               threshold: float = SEMANTIC_CACHE_THRESHOLD) -> Optional[Dict[str, Any]]:
+        """Best stored match in the same domain/settings partition above threshold with the same content."""
+        with self.lock:
+            group = self.group_ids.get(f"{domain}|{settings_key}")
+            if group is None or self.size == 0:
+                return None
+            rows = np.flatnonzero(self.groups[:self.size] == group)
+            if rows.size == 0:
+                return None
+            scores = self.vectors[rows] @ embed(text, self.dim)
+            signature = content_signature(text)
+            for best in np.argsort(-scores):
+                score = float(scores[best])
+                if score < threshold:
+                    return None
+                entry = self.entries[rows[best]]
+                if entry["signature"] == signature:
+                    return dict(entry, similarity=round(score, 4))
+            return None
+
+    def remove(self, session_ids: List[int]) -> None:
+        """Drop deleted sessions; their rows are left in place but never match again."""
+        with self.lock:
+            for session_id in session_ids:
+                row = self.positions.pop(session_id, None)
+                if row is not None:
+                    self.groups[row] = -1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.__init__(self.dim)
+
+
+semantic_index = SemanticIndex() if NUMPY_SUPPORT and SEMANTIC_CACHE_ENABLED else None
+
+
+def rebuild_index(db) -> int:
+    """Load every stored session's latest version into the index (startup)."""
+    if semantic_index is None:
+        return 0
+    semantic_index.clear()
+    for session, version in get_sessions_with_latest_version(db):
+        semantic_index.add(
+            session.id, session.raw_prompt, version.optimized_prompt,
+            session.domain, session.task_type, session.settings_key
+        )
+    print(f"[LUKTHAN] Semantic index built with {semantic_index.size} prompts")
+    return semantic_index.size
+
+
+def find_similar(user_input: str, domain: str, settings: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Look up a stored near-duplicate request, or None."""
+    if semantic_index is None:
+        return None
+    return semantic_index.search(user_input, domain, settings_signature(settings))
+
+
+def _on_version_created(version) -> None:
+    session = version.session
+    if semantic_index is None or session is None:
+        return
+    semantic_index.add(
+        session.id, session.raw_prompt, version.optimized_prompt,
+        session.domain, session.task_type, session.settings_key
+    )
+
+
+def _on_sessions_deleted(session_ids: Optional[List[int]]) -> None:
+    if semantic_index is None:
+        return
+    if session_ids is None:
+        semantic_index.clear()
+    else:
+        semantic_index.remove(session_ids)
+
+
+add_version_listener(_on_version_created)
+add_delete_listener(_on_sessions_deleted)
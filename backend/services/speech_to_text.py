@@ -0,0 +1,285 @@
+"""
+Speech-to-text backends shared by /api/voice/transcribe and VoiceProcessor.
+
+STT_BACKEND selects the engine:
+
+- google: SpeechRecognition's Google Web Speech API (the previous behaviour;
+  one network round trip per request, no SLA)
+- vosk: Vosk (Kaldi) models on the local CPU, fully offline
+
+The vosk backend keeps a warm pool of STT_WORKERS processes. Each one loads
+the model from VOSK_MODEL_PATH once, when the pool is started at application
+startup, and keeps it for its lifetime. Requests are batched: while every
+worker is busy, requests queue up, and a worker that frees up takes up to
+STT_BATCH_SIZE of them in one job (waiting at most STT_BATCH_WINDOW_MS for
+more to arrive), so concurrent requests share IPC round trips instead of
+queueing one by one. While other workers are idle, queued requests are
+split between them instead of all going to the first free one. When more than STT_MAX_PENDING requests are waiting,
+transcribe() raises STTBusyError (HTTP 429).
+
+Backends take DecodedAudio (mono 16-bit PCM, see services/audio_converter).
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import math
+import multiprocessing
+import os
+
+try:
+    import speech_recognition as sr
+    SPEECH_RECOGNITION_SUPPORT = True
+except ImportError:
+    SPEECH_RECOGNITION_SUPPORT = False
+
+try:
+    from services import stt_worker
+    VOSK_SUPPORT = True
+except ImportError:
+    VOSK_SUPPORT = False
+
+from services.audio_converter import DecodedAudio
+
+# Speech-to-text configuration (environment overridable)
+STT_BACKEND = os.getenv("STT_BACKEND", "google")  # google | vosk
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH", "")
+STT_WORKERS = int(os.getenv("STT_WORKERS", "1"))
+STT_BATCH_SIZE = int(os.getenv("STT_BATCH_SIZE", "8"))
+STT_BATCH_WINDOW_MS = float(os.getenv("STT_BATCH_WINDOW_MS", "20"))
+STT_MAX_PENDING = int(os.getenv("STT_MAX_PENDING", "64"))
+STT_TIMEOUT = float(os.getenv("STT_TIMEOUT", "60"))
+
+
+class SpeechNotRecognizedError(ValueError):
+    """The audio was decoded but contained no recognizable speech."""
+
+
+class STTUnavailableError(RuntimeError):
+    """The engine could not run (service down, model missing, worker crashed)."""
+
+
+class STTBusyError(RuntimeError):
+    """Too many transcriptions are already waiting."""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        super().__init__("Too many transcriptions in progress, please retry shortly")
+
+
+class GoogleSTTBackend:
+    """SpeechRecognition's Google Web Speech API, called from a worker thread."""
+
+    name = "google"
+
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+
+    @property
+    def available(self) -> bool:
+        return SPEECH_RECOGNITION_SUPPORT
+
+    async def start(self) -> None:
+        pass
+
+    async def transcribe(self, audio: DecodedAudio) -> str:
+        if not SPEECH_RECOGNITION_SUPPORT:
+            raise STTUnavailableError("speech_recognition package is not installed")
+        self.requests += 1
+        data = sr.AudioData(audio.frames, audio.sample_rate, audio.sample_width)
+        try:
+            return await asyncio.to_thread(sr.Recognizer().recognize_google, data)
+        except sr.UnknownValueError:
+            raise SpeechNotRecognizedError("no speech recognized")
+        except sr.RequestError as e:
+            self.failures += 1
+            raise STTUnavailableError(str(e))
+
+    def shutdown(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "available": self.available,
+                "requests": self.requests, "failures": self.failures}
+
+
+class VoskSTTBackend:
+    """Local Vosk models in a warm process pool, with dynamic batching of concurrent requests."""
+
+    name = "vosk"
+
+    def __init__(self, model_path: str, workers: int, batch_size: int, batch_window_ms: float,
+                 max_pending: int, timeout: float):
+        self.model_path = model_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.dispatcher: Optional[asyncio.Task] = None
+        self.free_workers: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.active_batches = 0
+        self.requests = 0
+        self.batches = 0
+        self.failures = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    @property
+    def available(self) -> bool:
+        return VOSK_SUPPORT and os.path.isdir(self.model_path)
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn"),
+                initializer=stt_worker.load_model,
+                initargs=(self.model_path,)
+            )
+        return self.executor
+
+    async def start(self) -> None:
+        """Start the batch dispatcher on the running loop and load the model in every worker."""
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.free_workers = asyncio.Semaphore(self.workers)
+        self.dispatcher = asyncio.create_task(self._dispatch())
+        # One ping per worker: processes are started on demand, each loads the model once
+        created = self.executor is None
+        executor = self._executor()
+        await asyncio.gather(*(loop.run_in_executor(executor, stt_worker.ping) for _ in range(self.workers)))
+        if created:
+            print(f"[LUKTHAN Voice] Vosk model loaded in {self.workers} worker(s): {self.model_path}")
+
+    async def transcribe(self, audio: DecodedAudio) -> str:
+        if not self.available:
+            raise STTUnavailableError(f"Vosk model not found at '{self.model_path}'")
+        await self.start()
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise STTBusyError(retry_after=max(1, int(self.timeout // 4)))
+
+        self.requests += 1
+        self.pending += 1
+        future = self.loop.create_future()
+        self.queue.put_nowait((audio.frames, audio.sample_rate, future))
+        try:
+            text = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            raise STTUnavailableError(f"transcription timed out after {self.timeout:g}s")
+        finally:
+            self.pending -= 1
+        if not text:
+            raise SpeechNotRecognizedError("no speech recognized")
+        return text
+
+    async def _dispatch(self) -> None:
+        """
+        Form a batch whenever a worker is free: the first waiting request plus
+        whatever arrives within the window. With other workers idle, the batch
+        only takes its share of the queue and does not wait for more.
+        """
+        while True:
+            await self.free_workers.acquire()
+            batch = [await self.queue.get()]
+            idle = self.workers - self.active_batches  # including this one
+            limit = self.batch_size
+            if idle > 1:
+                limit = min(limit, math.ceil((1 + self.queue.qsize()) / idle))
+            deadline = self.loop.time() + self.batch_window
+            while len(batch) < limit:
+                remaining = deadline - self.loop.time()
+                if self.queue.empty() and (remaining <= 0 or idle > 1):
+                    break
+                try:
+                    batch.append(self.queue.get_nowait() if not self.queue.empty()
+                                 else await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            # Requests cancelled while queued (client went away) are dropped
+            batch = [item for item in batch if not item[2].done()]
+            if batch:
+                self.active_batches += 1
+                asyncio.create_task(self._run_batch(batch))
+            else:
+                self.free_workers.release()
+
+    async def _run_batch(self, batch: List[Tuple[bytes, int, asyncio.Future]]) -> None:
+        self.batches += 1
+        try:
+            texts = await self.loop.run_in_executor(
+                self._executor(), stt_worker.transcribe_batch, [(frames, rate) for frames, rate, _ in batch]
+            )
+            results: List[Any] = list(texts)
+        except BrokenProcessPool:
+            # A worker died (OOM kill / crash) - start a fresh pool for the next batch
+            self.restarts += 1
+            self.failures += len(batch)
+            executor, self.executor = self.executor, None
+            executor.shutdown(wait=False, cancel_futures=True)
+            print("[LUKTHAN Voice] Vosk worker crashed, pool restarted")
+            results = [STTUnavailableError("speech recognition worker crashed")] * len(batch)
+        except Exception as e:
+            self.failures += len(batch)
+            results = [STTUnavailableError(str(e))] * len(batch)
+        finally:
+            self.active_batches -= 1
+            self.free_workers.release()
+
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def shutdown(self) -> None:
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            self.dispatcher = None
+        self.loop = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "available": self.available,
+            "workers": self.workers,
+            "busy_workers": self.active_batches,
+            "pending": self.pending,
+            "requests": self.requests,
+            "batches": self.batches,
+            "average_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "restarts": self.restarts,
+        }
+
+
+def _create_backend():
+    if STT_BACKEND == "vosk":
+        backend = VoskSTTBackend(VOSK_MODEL_PATH, STT_WORKERS, STT_BATCH_SIZE, STT_BATCH_WINDOW_MS,
+                                 STT_MAX_PENDING, STT_TIMEOUT)
+        if backend.available:
+            return backend
+        print(f"[LUKTHAN Voice] WARNING: STT_BACKEND=vosk but "
+              f"{'no model at VOSK_MODEL_PATH' if VOSK_SUPPORT else 'vosk is not installed'}, using google")
+    return GoogleSTTBackend()
+
+
+# Process-wide speech-to-text backend
+stt_backend = _create_backend()
@@ -0,0 +1,37 @@
+"""
+Worker-process side of the vosk speech-to-text backend.
+
+Kept apart from services/speech_to_text so pool workers import only vosk,
+not the rest of the application.
+"""
+from typing import List, Tuple
+import json
+
+import vosk
+
+# PCM bytes fed to the recognizer per call
+_FEED_BYTES = 64 * 1024
+
+# Loaded once per process by the pool initializer
+_model = None
+
+
+def load_model(model_path: str) -> None:
+    global _model
+    vosk.SetLogLevel(-1)
+    _model = vosk.Model(model_path)
+
+
+def ping() -> bool:
+    return _model is not None
+
+
+def transcribe_batch(items: List[Tuple[bytes, int]]) -> List[str]:
+    """Transcribe each (pcm, sample_rate) with the loaded model."""
+    texts = []
+    for frames, sample_rate in items:
+        recognizer = vosk.KaldiRecognizer(_model, sample_rate)
+        for start in range(0, len(frames), _FEED_BYTES):
+            recognizer.AcceptWaveform(frames[start:start + _FEED_BYTES])
+        texts.append(json.loads(recognizer.FinalResult()).get("text", ""))
+    return texts
@@ -1,16 +1,29 @@
-from pydub import AudioSegment
-import speech_recognition as sr
+import asyncio
+import os
+
+from services.audio_converter import audio_converter, AudioConversionError, AudioConverterBusyError
+from services.speech_to_text import stt_backend, SpeechNotRecognizedError, STTUnavailableError, STTBusyError
+
 
 class VoiceProcessor:
-    def __init__(self):
-        self.recognizer = sr.Recognizer()
+    """Transcription outside the HTTP router, through the same decoder and speech-to-text backend."""
 
-    def transcribe_audio(self, audio_file_path: str) -> dict:
+    def __init__(self, backend=None):
+        self.backend = backend or stt_backend
+
+    async def transcribe(self, data: bytes, suffix: str = ".wav") -> dict:
         try:
-            audio = AudioSegment.from_wav(audio_file_path)
-            with sr.AudioFile(audio_file_path) as source:
-                audio_data = self.recognizer.record(source)
-                transcription = self.recognizer.recognize_google(audio_data)
+            audio = await audio_converter.decode(data, suffix)
+            transcription = await self.backend.transcribe(audio)
             return {"transcription": transcription, "success": True}
-        except Exception as e:
-            return {"transcription": str(e), "success": False}
\ No newline at end of file
+        except SpeechNotRecognizedError:
+            return {"transcription": "Could not understand audio", "success": False}
+        except (AudioConversionError, AudioConverterBusyError, STTUnavailableError, STTBusyError) as e:
+            return {"transcription": str(e), "success": False}
+
+    def transcribe_audio(self, audio_file_path: str) -> dict:
+        """Synchronous variant for scripts (not for use inside a running event loop)."""
+        with open(audio_file_path, "rb") as f:
+            data = f.read()
+        suffix = os.path.splitext(audio_file_path)[1].lower() or ".wav"
+        return asyncio.run(self.transcribe(data, suffix))
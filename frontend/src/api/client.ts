@@ -17,11 +17,22 @@ export interface ChatRequest {
   file_type?: string | null;
   settings: Settings;
   guided_context?: Record<string, any>;
+  conversation_id?: string | null;
 }
 
+// Conversation id issued by the backend; sent with every message so each
+// browser tab keeps its own guided-mode history
+let conversationId: string | null = null;
+
 export interface FileUploadResponse {
   content: string;
   file_type: string;
+  // PDFs only: character range of each extracted page within content
+  pages?: { page: number; start: number; end: number }[];
+  page_count?: number;
+  truncated?: boolean;
+  sha256?: string;
+  cached?: boolean; // Served from the server's extraction cache
 }
 
 export interface VoiceTranscriptionResponse {
@@ -31,7 +42,13 @@ export interface VoiceTranscriptionResponse {
 
 // Main chat function - uses the intelligent endpoint
 export const sendMessage = async (request: ChatRequest): Promise<AgentResponse> => {
-  const response = await apiClient.post<AgentResponse>('/prompts/chat', request);
+  const response = await apiClient.post<AgentResponse>('/prompts/chat', {
+    ...request,
+    conversation_id: request.conversation_id ?? conversationId,
+  });
+  if (response.data.conversation_id) {
+    conversationId = response.data.conversation_id;
+  }
   return response.data;
 };
 
@@ -48,7 +65,30 @@ export const optimizePrompt = async (request: ChatRequest): Promise<AgentRespons
   };
 };
 
+const sha256Hex = async (file: File): Promise<string | null> => {
+  // crypto.subtle is only available in secure contexts (https / localhost)
+  if (!window.crypto?.subtle) return null;
+  const digest = await window.crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+};
+
+// File types whose extracted text the server caches by content hash
+const CACHED_UPLOAD_PATTERN = /\.(pdf|docx|png|jpe?g|gif|webp)$/i;
+
 export const uploadFile = async (file: File): Promise<FileUploadResponse> => {
+  // Hash-first: skip the upload when the server already extracted this file
+  const hash = CACHED_UPLOAD_PATTERN.test(file.name) ? await sha256Hex(file).catch(() => null) : null;
+  if (hash) {
+    try {
+      const cached = await apiClient.post<FileUploadResponse>('/files/upload', null, {
+        params: { sha256: hash },
+      });
+      return cached.data;
+    } catch (err: any) {
+      if (err.response?.status !== 404) throw err;
+    }
+  }
+
   const formData = new FormData();
   formData.append('file', file);
 
@@ -80,11 +120,33 @@ export interface HistoryItem {
   task_type: string;
   quality_score: number;
   created_at: string;
+  latest_version?: {
+    id: number;
+    label: string;
+    optimized_prompt: string;
+    created_at: string;
+  } | null;
 }
 
 export interface HistoryResponse {
   sessions: HistoryItem[];
   total: number;
+  next_cursor?: string | null;
+}
+
+export interface SearchResult {
+  id: number;
+  domain: string;
+  task_type: string;
+  quality_score: number;
+  created_at: string;
+  snippet: string; // Matched terms wrapped in **
+  score: number | null;
+}
+
+export interface SearchResponse {
+  results: SearchResult[];
+  next_offset?: number | null;
 }
 
 export interface SessionDetail {
@@ -105,8 +167,20 @@ export interface SessionDetail {
 }
 
 // History API functions
-export const getHistory = async (limit: number = 20): Promise<HistoryResponse> => {
-  const response = await apiClient.get<HistoryResponse>(`/prompts/history?limit=${limit}`);
+export const getHistory = async (limit: number = 20, cursor?: string | null): Promise<HistoryResponse> => {
+  const response = await apiClient.get<HistoryResponse>('/prompts/history', {
+    params: cursor ? { limit, cursor } : { limit },
+  });
+  return response.data;
+};
+
+export const searchHistory = async (
+  q: string,
+  options: { domain?: string; task_type?: string; limit?: number; offset?: number } = {}
+): Promise<SearchResponse> => {
+  const response = await apiClient.get<SearchResponse>('/prompts/history/search', {
+    params: { q, ...options },
+  });
   return response.data;
 };
 
@@ -124,7 +198,10 @@ export const clearHistory = async (): Promise<void> => {
 };
 
 export const resetConversation = async (): Promise<{ success: boolean; message: string }> => {
-  const response = await apiClient.post<{ success: boolean; message: string }>('/prompts/reset-conversation');
+  const response = await apiClient.post<{ success: boolean; message: string }>('/prompts/reset-conversation', {
+    conversation_id: conversationId,
+  });
+  conversationId = null;
   return response.data;
 };
 
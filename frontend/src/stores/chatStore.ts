@@ -21,6 +21,9 @@ export interface AgentResponse {
   optimized_prompt?: string;
   task_type?: string;
 
+  // Conversation id issued by the backend (send back with the next message)
+  conversation_id?: string;
+
   // Common fields
   quality_score: number;
   domain: string;
@@ -52,6 +52,12 @@ export interface OptimizedPromptResponse {
 export interface FileUploadResponse {
   content: string;
   file_type: string;
+  // PDFs only: character range of each extracted page within content
+  pages?: { page: number; start: number; end: number }[];
+  page_count?: number;
+  truncated?: boolean;
+  sha256?: string;
+  cached?: boolean; // Served from the server's extraction cache
 }
 
 export interface VoiceTranscriptionResponse {